@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "authentification"
+
+    def ready(self):
+        # Enregistrement des signaux (suggestions d'abonnement)
+        from . import signals  # noqa: F401
@@ -0,0 +1,68 @@
+"""Recherche des noms d'utilisateur au fil de la saisie.
+
+Les noms commençant par la recherche sont trouvés par un intervalle sur
+``lower(username)`` (``>= préfixe`` et ``< préfixe suivant``), servi par
+l'index ``user_username_lower_idx`` dans l'ordre alphabétique : seules les
+lignes retournées sont lues. Un ``LIKE`` ne profiterait pas de l'index sous
+SQLite, ni sous PostgreSQL avec une collation autre que « C ».
+
+Lorsque les préfixes ne suffisent pas à remplir la liste, les noms qui
+contiennent la recherche sont ajoutés à la suite. Cette seconde requête
+parcourt la table : pendant la saisie, elle n'est faite qu'à partir de
+``USERNAME_AUTOCOMPLETE_INFIX_MIN`` caractères (« li » ne propose donc pas
+« alice ») ; la recherche validée de la page d'abonnement la fait quelle
+que soit la longueur de la recherche.
+"""
+
+from django.conf import settings
+from django.db.models.functions import Lower
+
+from .models import User
+
+
+def _candidates(exclude_ids):
+    return (
+        User.objects.filter(is_active=True, is_superuser=False)
+        .exclude(pk__in=exclude_ids)
+        .annotate(username_lower=Lower("username"))
+        .only("pk", "username")
+    )
+
+
+def match_usernames(query, limit=None, exclude_ids=(), infix_min=None):
+    """Retourne au plus ``limit`` utilisateurs dont le nom commence par
+    ``query`` (par ordre alphabétique), puis dont le nom le contient si
+    ``query`` a au moins ``infix_min`` caractères
+    (``USERNAME_AUTOCOMPLETE_INFIX_MIN`` par défaut).
+
+    Un nom égal à la recherche est donc toujours le premier résultat.
+    """
+
+    limit = limit or settings.USERNAME_AUTOCOMPLETE_LIMIT
+    if infix_min is None:
+        infix_min = settings.USERNAME_AUTOCOMPLETE_INFIX_MIN
+    prefix = query.strip().lower()
+    if not prefix:
+        return []
+
+    # Premier texte qui suit tous ceux qui commencent par le préfixe
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    users = list(
+        _candidates(exclude_ids)
+        .filter(
+            username_lower__gte=prefix,
+            username_lower__lt=upper,
+            # Garde-fou pour les collations qui n'ordonnent pas les textes
+            # caractère par caractère
+            username_lower__startswith=prefix,
+        )
+        .order_by("username_lower")[:limit]
+    )
+
+    if len(users) < limit and len(prefix) >= infix_min:
+        users += (
+            _candidates([*exclude_ids, *(user.pk for user in users)])
+            .filter(username_lower__contains=prefix)
+            .order_by("username_lower")[:limit - len(users)]
+        )
+    return users
@@ -0,0 +1,44 @@
+"""Authentification avec mise en cache des utilisateurs connectés.
+
+``AuthenticationMiddleware`` recharge l'utilisateur de la session à chaque
+requête (``backend.get_user``). ``CachedModelBackend`` lit cet utilisateur
+dans le cache ; ``django.contrib.auth.get_user`` vérifie toujours
+l'empreinte du mot de passe enregistrée dans la session.
+
+L'entrée est supprimée à chaque sauvegarde ou suppression de l'utilisateur
+(voir ``authentification.signals``). Les compteurs (``User.COUNTER_FIELDS``)
+sont modifiés par des UPDATE sans signal : ceux de ``request.user`` peuvent
+donc dater de ``USER_CACHE_TIMEOUT`` secondes et ne doivent pas être
+affichés (la page d'abonnement relit l'utilisateur affiché).
+"""
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def invalidate_user(user_id):
+    """Supprime l'utilisateur ``user_id`` du cache, une fois la transaction
+    validée."""
+
+    transaction.on_commit(lambda: cache.delete(_cache_key(user_id)))
+
+
+class CachedModelBackend(ModelBackend):
+    """``ModelBackend`` dont ``get_user`` lit d'abord le cache."""
+
+    def get_user(self, user_id):
+        key = _cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        elif not self.user_can_authenticate(user):
+            return None
+        return user
@@ -0,0 +1,24 @@
+"""Compteurs dénormalisés des utilisateurs (abonnés, abonnements,
+critiques, billets).
+
+Les compteurs sont modifiés par des UPDATE atomiques (``F()``), qui ne
+peuvent pas perdre d'écriture concurrente. Ils sont tenus à jour par les
+signaux de ``authentification.signals`` et ``review.signals`` ; la commande
+``recount_users`` les recalcule.
+"""
+
+from django.db.models import F
+
+from .models import User
+
+
+def add_to_counter(user_ids, field, delta):
+    """Ajoute ``delta`` au compteur ``field`` des utilisateurs ``user_ids``.
+
+    Un compteur n'est jamais rendu négatif.
+    """
+
+    users = User.objects.filter(pk__in=user_ids)
+    if delta < 0:
+        users = users.filter(**{f"{field}__gte": -delta})
+    users.update(**{field: F(field) + delta})
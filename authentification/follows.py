@@ -0,0 +1,120 @@
+"""Abonnements et désabonnements en masse.
+
+Les noms d'utilisateur sont résolus en une requête, les abonnements sont
+insérés par lots (``INSERT`` qui ignore les abonnements existants) et les
+désabonnements supprimés par un seul ``delete()`` filtré. L'insertion
+n'envoyant pas de signal ``post_save``, le signal ``follows_created`` est
+envoyé à la place : les
+applications qui maintiennent des données dérivées des abonnements (flux,
+caches, compteurs) y réagissent comme à ``post_save``.
+
+Les données dérivées ne doivent être mises à jour qu'une fois par
+abonnement, même si deux requêtes abonnent (ou désabonnent) en même temps
+le même utilisateur : les abonnements créés sont ceux que l'INSERT a
+réellement insérés (``RETURNING``), et les abonnements supprimés sont
+verrouillés avant la suppression.
+"""
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.constants import OnConflict
+
+from .models import User, UserFollows
+from .signals import follows_created
+
+FollowResult = namedtuple("FollowResult", ["changed", "not_found"])
+
+
+def _resolve(user, usernames):
+    """Retourne ``({id: nom}, noms introuvables)`` pour ``usernames``, sans
+    ``user`` lui-même."""
+
+    usernames = list(dict.fromkeys(usernames))
+    ids = dict(
+        User.objects.filter(username__in=usernames)
+        .exclude(pk=user.pk)
+        .values_list("username", "pk")
+    )
+    # Dans l'ordre de la demande
+    found = {ids[name]: name for name in usernames if name in ids}
+    return found, [name for name in usernames if name not in ids]
+
+
+def _insert_follows(user, followed_ids):
+    """Insère les abonnements de ``user`` aux utilisateurs
+    ``followed_ids``, en ignorant ceux qui existent déjà.
+
+    Returns:
+        list: Les identifiants des utilisateurs dont l'abonnement a
+        effectivement été inséré.
+    """
+
+    connection = connections[router.db_for_write(UserFollows)]
+    opts = UserFollows._meta
+    fields = [opts.get_field("user"), opts.get_field("followed_user")]
+    quote = connection.ops.quote_name
+    insert = connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)
+    suffix = connection.ops.on_conflict_suffix_sql(
+        fields, OnConflict.IGNORE, None, fields)
+    returning, _ = connection.ops.return_insert_columns([fields[1]])
+    columns = ", ".join(quote(field.column) for field in fields)
+
+    inserted = []
+    batch_size = settings.FOLLOW_BULK_BATCH_SIZE
+    with connection.cursor() as cursor:
+        for start in range(0, len(followed_ids), batch_size):
+            batch = followed_ids[start:start + batch_size]
+            values = ", ".join(["(%s, %s)"] * len(batch))
+            cursor.execute(
+                f"{insert} {quote(opts.db_table)} ({columns}) "
+                f"VALUES {values} {suffix} {returning}",
+                [value for pk in batch for value in (user.pk, pk)],
+            )
+            inserted.extend(row[0] for row in cursor.fetchall())
+    return inserted
+
+
+@transaction.atomic
+def follow_users(user, usernames):
+    """Abonne ``user`` aux utilisateurs ``usernames``.
+
+    Returns:
+        FollowResult: Les noms des nouveaux abonnements et les noms
+        introuvables (les abonnements existants sont ignorés).
+    """
+
+    found, not_found = _resolve(user, usernames)
+    inserted = set(_insert_follows(user, list(found)))
+    # Dans l'ordre de la demande
+    new_ids = [pk for pk in found if pk in inserted]
+    if new_ids:
+        follows_created.send(
+            sender=UserFollows, user_id=user.pk, followed_user_ids=new_ids)
+    return FollowResult([found[pk] for pk in new_ids], not_found)
+
+
+@transaction.atomic
+def unfollow_users(user, usernames):
+    """Désabonne ``user`` des utilisateurs ``usernames``.
+
+    La suppression envoie le signal ``post_delete`` de chaque abonnement.
+
+    Returns:
+        FollowResult: Les noms des abonnements supprimés et les noms
+        introuvables.
+    """
+
+    found, not_found = _resolve(user, usernames)
+    # Les abonnements sont verrouillés (sous PostgreSQL) : une suppression
+    # concurrente attend la fin de celle-ci et ne les retrouve plus, leurs
+    # signaux ne sont donc envoyés qu'une fois
+    locked = dict(
+        UserFollows.objects.select_for_update()
+        .filter(user=user, followed_user_id__in=found)
+        .values_list("pk", "followed_user_id")
+    )
+    UserFollows.objects.filter(pk__in=locked).delete()
+    return FollowResult(
+        [found[pk] for pk in locked.values()], not_found)
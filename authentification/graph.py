@@ -0,0 +1,211 @@
+"""Index en mémoire du graphe des abonnements, propre au processus.
+
+Pour chaque utilisateur, les identifiants des utilisateurs qu'il suit et de
+ceux qui le suivent sont rangés dans des tableaux triés ``array('q')``
+(8 octets par identifiant, sans objet Python par arc) ; l'appartenance se
+vérifie par dichotomie, en O(log n).
+
+L'index est chargé depuis ``UserFollows`` au premier accès, puis tenu à jour
+par les signaux d'abonnement (après la validation de la transaction). Les
+écritures faites par les autres processus n'envoient pas de signal dans
+celui-ci : l'index est donc entièrement rechargé toutes les
+``FOLLOW_GRAPH_RESYNC_INTERVAL`` secondes, par un seul thread, pendant que
+les autres lisent l'état précédent. Il est toujours chargé depuis la base
+principale ; un utilisateur qui vient d'écrire lit ses abonnements dans la
+base (voir ``utilities.routers``), l'écriture ayant pu passer par un autre
+processus.
+
+Les tableaux ne sont jamais modifiés en place (copie à chaque écriture) :
+un tableau retourné reste cohérent pendant sa lecture.
+"""
+
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from utilities.routers import primary_reads, reads_own_writes
+
+from .models import UserFollows
+
+_EMPTY = array("q")
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+class FollowGraph:
+    """Listes d'adjacence des abonnements, dans les deux sens."""
+
+    def __init__(self):
+        self._following = {}
+        self._followers = {}
+        self._loaded_at = None
+        # Écritures reçues pendant un chargement, rejouées après celui-ci
+        self._journal = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    @staticmethod
+    def build(edges):
+        """Construit les listes d'adjacence à partir d'arcs
+        ``(abonné, suivi)`` triés par abonné puis par suivi.
+
+        Returns:
+            tuple: ``(abonnements, abonnés)``, deux dictionnaires
+            ``{id: array('q') trié}``.
+        """
+
+        following, followers = {}, {}
+        for user_id, followed_id in edges:
+            ids = following.get(user_id)
+            if ids is None:
+                ids = following[user_id] = array("q")
+            ids.append(followed_id)
+            # Les abonnés arrivent par identifiant croissant : leurs
+            # tableaux sont triés eux aussi
+            ids = followers.get(followed_id)
+            if ids is None:
+                ids = followers[followed_id] = array("q")
+            ids.append(user_id)
+        return following, followers
+
+    @classmethod
+    def from_edges(cls, edges):
+        """Retourne un index construit à partir d'arcs triés, sans accès à
+        la base et jamais rechargé (bancs de mesure)."""
+
+        graph = cls()
+        graph._following, graph._followers = cls.build(edges)
+        graph._loaded_at = float("inf")
+        return graph
+
+    def load(self):
+        """Charge (ou recharge) l'index depuis la base.
+
+        Returns:
+            int: Le nombre d'abonnements chargés.
+        """
+
+        with self._lock:
+            self._journal = []
+        try:
+            # L'index sert bien après le délai de réplication : il n'est
+            # pas chargé depuis un réplica
+            with primary_reads():
+                edges = (
+                    UserFollows.objects.order_by(
+                        "user_id", "followed_user_id")
+                    .values_list("user_id", "followed_user_id")
+                    .iterator(chunk_size=settings.FOLLOW_GRAPH_CHUNK_SIZE)
+                )
+                following, followers = self.build(edges)
+        finally:
+            with self._lock:
+                journal, self._journal = self._journal, None
+
+        with self._lock:
+            self._following, self._followers = following, followers
+            for change in journal:
+                self._apply(*change)
+            self._loaded_at = time.monotonic()
+        return sum(len(ids) for ids in following.values())
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None:
+            with self._load_lock:
+                if self._loaded_at is None:
+                    self.load()
+        elif (time.monotonic() - self._loaded_at
+                > settings.FOLLOW_GRAPH_RESYNC_INTERVAL):
+            # Un seul thread recharge ; les autres lisent l'état courant
+            if self._load_lock.acquire(blocking=False):
+                try:
+                    self.load()
+                finally:
+                    self._load_lock.release()
+
+    def reset(self):
+        """Oublie l'index : il sera rechargé au prochain accès."""
+
+        with self._lock:
+            self._following, self._followers = {}, {}
+            self._loaded_at = None
+
+    # Écritures (appelées par authentification.signals)
+
+    def _apply(self, added, user_id, followed_id):
+        for index, key, value in (
+                (self._following, user_id, followed_id),
+                (self._followers, followed_id, user_id)):
+            ids = array("q", index.get(key, _EMPTY))
+            if added and not _contains(ids, value):
+                insort(ids, value)
+            elif not added and _contains(ids, value):
+                del ids[bisect_left(ids, value)]
+            if ids:
+                index[key] = ids
+            else:
+                index.pop(key, None)
+
+    def _record(self, added, user_id, followed_id):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((added, user_id, followed_id))
+            # Un index non chargé lira l'abonnement dans la base
+            if self._loaded_at is not None:
+                self._apply(added, user_id, followed_id)
+
+    def add(self, user_id, followed_id):
+        self._record(True, user_id, followed_id)
+
+    def remove(self, user_id, followed_id):
+        self._record(False, user_id, followed_id)
+
+    # Lectures
+
+    def following(self, user_id):
+        """Identifiants triés des utilisateurs suivis par ``user_id``
+        (tableau en lecture seule).
+
+        Pour un utilisateur qui vient d'écrire, ils sont lus dans la base :
+        son abonnement a pu être enregistré par un autre processus.
+        """
+
+        if reads_own_writes():
+            return array("q", UserFollows.objects.filter(
+                user_id=user_id).order_by("followed_user_id").values_list(
+                "followed_user_id", flat=True))
+        self._ensure_loaded()
+        return self._following.get(user_id, _EMPTY)
+
+    def followers(self, user_id):
+        """Identifiants triés des abonnés de ``user_id`` (tableau en lecture
+        seule)."""
+
+        self._ensure_loaded()
+        return self._followers.get(user_id, _EMPTY)
+
+    def is_following(self, user_id, followed_id):
+        return _contains(self.following(user_id), followed_id)
+
+    def follower_count(self, user_id):
+        return len(self.followers(user_id))
+
+    def memory_size(self):
+        """Taille approximative de l'index en mémoire, en octets."""
+
+        size = 0
+        for index in (self._following, self._followers):
+            size += sys.getsizeof(index)
+            size += sum(sys.getsizeof(key) + sys.getsizeof(ids)
+                        for key, ids in index.items())
+        return size
+
+
+follow_graph = FollowGraph()
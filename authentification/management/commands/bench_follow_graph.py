@@ -0,0 +1,87 @@
+import gc
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from authentification.graph import FollowGraph
+
+
+def _edges(rng, users, total):
+    """Retourne ``total`` abonnements distincts ``(abonné, suivi)`` entre
+    ``users`` utilisateurs, triés ; les utilisateurs suivis sont tirés selon
+    une loi de puissance (quelques comptes très suivis)."""
+
+    edges = set()
+    while len(edges) < total:
+        user_id = rng.randrange(1, users + 1)
+        followed_id = min(int(rng.paretovariate(1.2)), users)
+        if user_id != followed_id:
+            edges.add((user_id, followed_id))
+    return sorted(edges)
+
+
+def _sets(edges):
+    """Représentation naïve, pour comparaison : des ensembles Python."""
+
+    following, followers = {}, {}
+    for user_id, followed_id in edges:
+        following.setdefault(user_id, set()).add(followed_id)
+        followers.setdefault(followed_id, set()).add(user_id)
+    return following, followers
+
+
+def _measure(build, edges):
+    """Retourne ``(résultat, mémoire allouée en Mo, durée en s)``."""
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(edges)
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size / 1024 / 1024, elapsed
+
+
+class Command(BaseCommand):
+    """Mesure l'empreinte mémoire de l'index des abonnements
+    (``authentification.graph``) sur un graphe généré, comparée à des
+    ensembles Python, ainsi que la durée d'un test d'appartenance."""
+
+    help = "Report the memory footprint of the in-memory follow graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--edges", type=int, default=1_000_000,
+            help="Number of follows generated (default: 1000000).",
+        )
+        parser.add_argument(
+            "--users", type=int, default=100_000,
+            help="Number of users (default: 100000).",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        edges = _edges(rng, options["users"], options["edges"])
+        self.stdout.write(
+            f"{len(edges)} follows between {options['users']} users.")
+
+        graph, graph_mb, graph_time = _measure(FollowGraph.from_edges, edges)
+        _, sets_mb, sets_time = _measure(_sets, edges)
+        self.stdout.write(
+            f"array('q') index: {graph_mb:8.1f} MB "
+            f"({graph.memory_size() / 1024 / 1024:.1f} MB by getsizeof), "
+            f"built in {graph_time:.2f}s\n"
+            f"set() index:      {sets_mb:8.1f} MB, built in {sets_time:.2f}s"
+        )
+
+        probes = [rng.choice(edges) for _ in range(100_000)]
+        start = time.perf_counter()
+        for user_id, followed_id in probes:
+            graph.is_following(user_id, followed_id)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"is_following: {elapsed / len(probes) * 1e6:.2f} µs per check")
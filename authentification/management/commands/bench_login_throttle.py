@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from authentification.models import User
+
+# Adresses des attaquants, une par phase pour que les tentatives d'une phase
+# ne comptent pas dans la suivante (plage réservée à la documentation,
+# RFC 5737) : les compteurs laissés dans le cache ne bloquent aucun client
+# réel
+ATTACKER_NETWORK = "203.0.113"
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+    """Mesure la latence de la page des flux (p50, p99) pendant qu'un
+    attaquant envoie des tentatives de connexion en continu, sans puis avec
+    la limitation des tentatives (``authentification.throttling``).
+
+    Le lecteur et sa session sont créés pour la mesure puis supprimés.
+    """
+
+    help = ("Measure feed latency while the login endpoint is under attack, "
+            "with and without login throttling.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--attackers", type=int, default=4,
+            help="Number of concurrent attacking threads (default: 4).",
+        )
+        parser.add_argument(
+            "--rate", type=float, default=20,
+            help="Login attempts per second sent by all the attackers "
+                 "together (default: 20).",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200,
+            help="Number of feed requests per phase (default: 200).",
+        )
+
+    def handle(self, *args, **options):
+        # Les réponses 429 des attaquants ne sont pas journalisées
+        logging.getLogger("django.request").setLevel(logging.ERROR)
+
+        reader = User.objects.create_user(
+            f"bench_login_{uuid.uuid4().hex[:8]}")
+        try:
+            client = Client(HTTP_HOST="127.0.0.1")
+            client.force_login(reader)
+            # Première page : remplit le cache du flux
+            client.get(reverse("review:feeds_page"))
+
+            # L'attaque limitée n'est mesurée qu'une fois l'attaquant bloqué
+            phases = [
+                ("idle", 0, False, {}),
+                ("attack, no throttling", options["attackers"], False, {
+                    "LOGIN_THROTTLE_IP_LIMIT": float("inf"),
+                    "LOGIN_THROTTLE_USERNAME_LIMIT": float("inf"),
+                }),
+                ("attack, throttled", options["attackers"], True, {}),
+            ]
+            self.stdout.write(
+                f"{'phase':<24} {'p50 (ms)':>9} {'p99 (ms)':>9} "
+                f"{'hashed':>7} {'rejected':>9}")
+            for index, (label, attackers, blocked, overrides) in enumerate(
+                    phases, start=1):
+                with override_settings(**overrides):
+                    latencies, hashed, rejected = self.phase(
+                        client, attackers, options["rate"],
+                        options["requests"], blocked,
+                        f"{ATTACKER_NETWORK}.{index}")
+                self.stdout.write(
+                    f"{label:<24} {_percentile(latencies, 50):>9.1f} "
+                    f"{_percentile(latencies, 99):>9.1f} "
+                    f"{hashed:>7} {rejected:>9}")
+        finally:
+            reader.delete()
+
+    def phase(self, client, attackers, rate, requests, blocked, address):
+        """Mesure ``requests`` pages des flux pendant que ``attackers``
+        threads envoient ``rate`` tentatives de connexion par seconde depuis
+        ``address`` (une fois la première tentative refusée si
+        ``blocked``).
+
+        Returns:
+            tuple: ``(latences en ms, tentatives hachées depuis le début de
+            la phase, tentatives refusées pendant la mesure)``. Avec la
+            limitation, les tentatives hachées ne dépassent pas
+            ``LOGIN_THROTTLE_IP_LIMIT``, même simultanées.
+        """
+
+        stop = threading.Event()
+        statuses = []
+        threads = [
+            threading.Thread(
+                target=self.attack,
+                args=(stop, statuses, attackers / rate, address))
+            for _ in range(attackers)
+        ]
+        for thread in threads:
+            thread.start()
+        # Laisse l'attaque s'installer
+        time.sleep(0.5 if attackers else 0)
+        deadline = time.monotonic() + 120
+        while blocked and 429 not in statuses and time.monotonic() < deadline:
+            time.sleep(0.1)
+        skipped = len(statuses)
+
+        url = reverse("review:feeds_page")
+        latencies = []
+        try:
+            for _ in range(requests):
+                start = time.perf_counter()
+                client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        return (latencies, statuses.count(200),
+                statuses[skipped:].count(429))
+
+    @staticmethod
+    def attack(stop, statuses, interval, address):
+        """Envoie une tentative de connexion (nom au hasard) toutes les
+        ``interval`` secondes jusqu'à ``stop`` ; une tentative en retard
+        part aussitôt, comme d'un attaquant qui ouvre une connexion de
+        plus."""
+
+        client = Client(HTTP_HOST="127.0.0.1", REMOTE_ADDR=address)
+        url = reverse("authentification:login")
+        next_attempt = time.monotonic()
+        try:
+            while not stop.wait(max(0, next_attempt - time.monotonic())):
+                next_attempt += interval
+                response = client.post(url, {
+                    "username": uuid.uuid4().hex[:12],
+                    "password": "wrong-password",
+                })
+                statuses.append(response.status_code)
+        finally:
+            connections.close_all()
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from authentification.models import User, UserFollows
+from review.models import Review, Ticket
+
+
+def _count(model, field):
+    """Nombre de lignes de ``model`` dont ``field`` désigne l'utilisateur."""
+
+    rows = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), Value(0))
+
+
+class Command(BaseCommand):
+    """Recalcule les compteurs des utilisateurs (abonnés, abonnements,
+    critiques et billets), par tranches d'identifiants."""
+
+    help = "Recount the counters of every user and repair the wrong ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=5000,
+            help="Number of user ids updated per transaction "
+                 "(default: 5000).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        counted = {
+            "follower_count": _count(UserFollows, "followed_user"),
+            "following_count": _count(UserFollows, "user"),
+            "review_count": _count(Review, "user"),
+            "ticket_count": _count(Ticket, "user"),
+        }
+        wrong = Q()
+        for field, expression in counted.items():
+            wrong |= ~Q(**{field: expression})
+        last_id = User.objects.aggregate(last=Max("pk"))["last"] or 0
+
+        repaired = 0
+        for start in range(0, last_id, batch_size):
+            with transaction.atomic():
+                # Seuls les utilisateurs dont un compteur est faux sont écrits
+                repaired += (
+                    User.objects.filter(
+                        pk__gt=start, pk__lte=start + batch_size)
+                    .filter(wrong)
+                    .update(**counted)
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"{repaired} users repaired."))
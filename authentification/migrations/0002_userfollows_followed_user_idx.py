@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentification", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="userfollows",
+            options={
+                "verbose_name": "UserFollow",
+                "verbose_name_plural": "UserFollows",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="userfollows",
+            index=models.Index(
+                fields=["followed_user", "user"], name="userfollows_followed_user_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(model, field):
+    """Nombre de lignes de ``model`` dont ``field`` désigne l'utilisateur."""
+
+    rows = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), Value(0))
+
+
+def count_users(apps, schema_editor):
+    """Initialise les compteurs des utilisateurs existants."""
+
+    User = apps.get_model("authentification", "User")
+    UserFollows = apps.get_model("authentification", "UserFollows")
+    Review = apps.get_model("review", "Review")
+    Ticket = apps.get_model("review", "Ticket")
+    User.objects.update(
+        follower_count=_count(UserFollows, "followed_user"),
+        following_count=_count(UserFollows, "user"),
+        review_count=_count(Review, "user"),
+        ticket_count=_count(Ticket, "user"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentification", "0003_user_username_lower_idx"),
+        ("review", "0009_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="follower_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="number of followers"
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="following_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="number of followed users"
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="review_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="number of reviews"
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="ticket_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="number of tickets"
+            ),
+        ),
+        migrations.RunPython(count_users, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 
 
@@ -8,7 +9,38 @@ class User(AbstractUser):
     de la classe AbstractUser.
     """
 
-    pass
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Recherche des noms d'utilisateur par préfixe, sans tenir compte
+            # de la casse (voir authentification.autocomplete)
+            models.Index(Lower("username"), name="user_username_lower_idx"),
+        ]
+
+    # Compteurs maintenus par des UPDATE atomiques à chaque écriture (voir
+    # authentification.counters), jamais par une sauvegarde ordinaire
+    COUNTER_FIELDS = (
+        "follower_count", "following_count", "review_count", "ticket_count")
+
+    follower_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("number of followers"))
+    following_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("number of followed users"))
+    review_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("number of reviews"))
+    ticket_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("number of tickets"))
+
+    def save(self, *args, **kwargs):
+        # Une sauvegarde ordinaire ne doit pas écraser les compteurs, qui ont
+        # pu changer depuis le chargement
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
 
 class UserFollows(models.Model):
@@ -19,6 +51,13 @@ class UserFollows(models.Model):
         verbose_name = "UserFollow"
         verbose_name_plural = "UserFollows"
         unique_together = ["user", "followed_user"]
+        indexes = [
+            # Abonnés d'un utilisateur (index couvrant, sans accès à la table)
+            models.Index(
+                fields=["followed_user", "user"],
+                name="userfollows_followed_user_idx",
+            ),
+        ]
 
     # Utilisateur qui effectue le suivi
     user = models.ForeignKey(
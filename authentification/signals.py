@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .backends import invalidate_user
+from .counters import add_to_counter
+from .graph import follow_graph
+from .models import User, UserFollows
+from .suggestions import invalidate_suggestions
+
+# Envoyé après la création d'abonnements en masse (voir
+# authentification.follows), arguments : user_id, followed_user_ids
+follows_created = Signal()
+
+
+# Les suggestions d'un utilisateur changent avec ses abonnements ; celles de
+# ses abonnés expirent avec le cache
+@receiver(post_save, sender=UserFollows)
+@receiver(post_delete, sender=UserFollows)
+def follow_changed(sender, instance, **kwargs):
+    invalidate_suggestions(instance.user_id)
+
+
+@receiver(follows_created)
+def follows_bulk_created(sender, user_id, **kwargs):
+    invalidate_suggestions(user_id)
+
+
+# Compteurs d'abonnés et d'abonnements (voir authentification.counters)
+
+
+@receiver(post_save, sender=UserFollows)
+def follow_counted(sender, instance, created, **kwargs):
+    if created:
+        add_to_counter([instance.user_id], "following_count", 1)
+        add_to_counter([instance.followed_user_id], "follower_count", 1)
+
+
+@receiver(post_delete, sender=UserFollows)
+def unfollow_counted(sender, instance, **kwargs):
+    add_to_counter([instance.user_id], "following_count", -1)
+    add_to_counter([instance.followed_user_id], "follower_count", -1)
+
+
+@receiver(follows_created)
+def follows_bulk_counted(sender, user_id, followed_user_ids, **kwargs):
+    add_to_counter([user_id], "following_count", len(followed_user_ids))
+    add_to_counter(followed_user_ids, "follower_count", 1)
+
+
+# Index en mémoire des abonnements (voir authentification.graph), mis à jour
+# une fois l'écriture validée
+
+
+@receiver(post_save, sender=UserFollows)
+def follow_indexed(sender, instance, created, **kwargs):
+    if created:
+        edge = (instance.user_id, instance.followed_user_id)
+        transaction.on_commit(lambda: follow_graph.add(*edge))
+
+
+@receiver(post_delete, sender=UserFollows)
+def unfollow_indexed(sender, instance, **kwargs):
+    edge = (instance.user_id, instance.followed_user_id)
+    transaction.on_commit(lambda: follow_graph.remove(*edge))
+
+
+@receiver(follows_created)
+def follows_bulk_indexed(sender, user_id, followed_user_ids, **kwargs):
+    def add_edges():
+        for followed_user_id in followed_user_ids:
+            follow_graph.add(user_id, followed_user_id)
+
+    transaction.on_commit(add_edges)
+
+
+# Utilisateurs connectés en cache (voir authentification.backends)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
@@ -0,0 +1,87 @@
+"""Suggestions d'utilisateurs à suivre (« amis d'amis »).
+
+Un utilisateur est suggéré lorsqu'il est suivi par des utilisateurs que je
+suis ; les suggestions sont classées par nombre de ces abonnés en commun.
+Elles sont calculées en une requête d'agrégation sur ``UserFollows`` et
+mises en cache par utilisateur : la page d'abonnement ne lit qu'une page de
+suggestions, quel que soit le nombre d'utilisateurs.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count
+
+from .models import User, UserFollows
+
+
+def _cache_key(user_id):
+    return f"follow:suggestions:{user_id}"
+
+
+def suggestions_queryset(user):
+    """Retourne la requête d'agrégation des suggestions de ``user`` : des
+    lignes ``(id de l'utilisateur, nombre d'abonnés en commun)``."""
+
+    followed = UserFollows.objects.filter(user=user).values("followed_user")
+    return (
+        UserFollows.objects.filter(user__in=followed)
+        .exclude(followed_user=user)
+        .exclude(followed_user__in=followed)
+        .exclude(followed_user__is_superuser=True)
+        .values("followed_user")
+        .annotate(mutual=Count("user"))
+        .order_by("-mutual", "followed_user")
+        .values_list("followed_user", "mutual")
+    )
+
+
+def compute_suggestions(user, limit=None):
+    """Retourne les ``limit`` meilleures suggestions de ``user``."""
+
+    limit = limit or settings.FOLLOW_SUGGESTIONS_LIMIT
+    return list(suggestions_queryset(user)[:limit])
+
+
+def get_suggestions(user):
+    """Retourne les suggestions de ``user``, depuis le cache si possible."""
+
+    key = _cache_key(user.pk)
+    suggestions = cache.get(key)
+    if suggestions is None:
+        suggestions = compute_suggestions(user)
+        cache.set(
+            key, suggestions, timeout=settings.FOLLOW_SUGGESTIONS_TIMEOUT)
+    return suggestions
+
+
+def get_suggestions_page(user, number=1):
+    """Retourne la page ``number`` des suggestions de ``user``.
+
+    Chaque élément de la page est un utilisateur, dont l'attribut
+    ``mutual`` donne le nombre d'abonnés en commun.
+    """
+
+    paginator = Paginator(
+        get_suggestions(user), settings.FOLLOW_SUGGESTIONS_PAGE_SIZE)
+    page = paginator.get_page(number)
+
+    users = User.objects.only("pk", "username").in_bulk(
+        [user_id for user_id, _ in page.object_list])
+    suggested = []
+    for user_id, mutual in page.object_list:
+        # L'utilisateur a pu être supprimé depuis le calcul
+        if user_id in users:
+            users[user_id].mutual = mutual
+            suggested.append(users[user_id])
+    page.object_list = suggested
+    return page
+
+
+def invalidate_suggestions(user_id):
+    """Supprime du cache les suggestions de l'utilisateur ``user_id``, une
+    fois la transaction en cours validée."""
+
+    key = _cache_key(user_id)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -1,3 +1,402 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.db.models.functions import Lower
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from review.models import FeedEntry, Review, Ticket
+
+from .follows import follow_users, unfollow_users
+from .graph import FollowGraph, follow_graph
+from .models import User, UserFollows
+from .suggestions import get_suggestions_page
+from .throttling import cancel_attempt, reserve_attempt, settle_attempt
+
+
+class AboPageQueryBudgetTests(TestCase):
+    """Vérifie que la page d'abonnement exécute un nombre constant de
+    requêtes, quel que soit le nombre d'abonnements affichés."""
+
+    # session, utilisateur, utilisateur demandé, suggestions, utilisateurs
+    # suivis et abonnés (lus dans l'index des abonnements)
+    budget = 5
+
+    def setUp(self):
+        cache.clear()
+        follow_graph.reset()
+
+    def test_abo_page_query_budget(self):
+        for size in (2, 12):
+            with self.subTest(size=size):
+                user = User.objects.create(username=f"reader_{size}")
+                for index in range(size):
+                    other = User.objects.create(
+                        username=f"{user.username}_other_{index}")
+                    UserFollows.objects.create(user=user, followed_user=other)
+                    UserFollows.objects.create(user=other, followed_user=user)
+                self.client.force_login(user)
+                follow_graph.load()
+
+                url = reverse("authentification:abo_page", args=[user.username])
+                with self.assertNumQueries(self.budget):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, f"{user.username}_other_0", 2)
+
+
+class UsernameAutocompleteTests(TestCase):
+    """Vérifie le classement de l'autocomplétion des noms d'utilisateur."""
+
+    def test_prefix_matches_come_first(self):
+        for username in ("Bobby", "alibob", "bob", "Bobette", "robert"):
+            User.objects.create(username=username)
+        reader = User.objects.create(username="bob_reader")
+        self.client.force_login(reader)
+
+        response = self.client.get(
+            reverse("authentification:username_autocomplete"), {"q": "BOB"})
+        self.assertEqual(
+            response.json()["usernames"],
+            ["bob", "Bobby", "Bobette", "alibob"],
+        )
+
+    def test_short_queries_match_substrings_on_search_only(self):
+        for username in ("malik", "alice", "lina"):
+            User.objects.create(username=username)
+        reader = User.objects.create(username="reader")
+        self.client.force_login(reader)
+
+        # Pendant la saisie, seuls les préfixes sont proposés sous
+        # USERNAME_AUTOCOMPLETE_INFIX_MIN caractères
+        url = reverse("authentification:username_autocomplete")
+        for query, usernames in (("LI", ["lina"]), ("al", ["alice"]),
+                                 ("lik", ["malik"])):
+            with self.subTest(query=query):
+                response = self.client.get(url, {"q": query})
+                self.assertEqual(response.json()["usernames"], usernames)
+
+        # La recherche validée propose aussi les noms qui contiennent le
+        # terme, même court
+        response = self.client.post(
+            reverse("authentification:abo_page", args=[reader.username]),
+            {"search": "ic", "search_user_id": "True"})
+        self.assertEqual(response.context["searched_user_resp"].username,
+                         "alice")
+
+    def test_prefix_lookup_uses_index(self):
+        queryset = (
+            User.objects.annotate(username_lower=Lower("username"))
+            .filter(username_lower__gte="bob", username_lower__lt="boc")
+        )
+        self.assertIn("user_username_lower_idx", queryset.explain())
+
+
+class FollowSuggestionsTests(TestCase):
+    """Vérifie le classement et la mise en cache des suggestions."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_suggestions_are_ranked_by_mutual_follows(self):
+        user = User.objects.create(username="me")
+        friends = [
+            User.objects.create(username=f"friend_{index}")
+            for index in range(3)
+        ]
+        popular = User.objects.create(username="popular")
+        known = User.objects.create(username="known")
+        for friend in friends:
+            UserFollows.objects.create(user=user, followed_user=friend)
+            UserFollows.objects.create(user=friend, followed_user=popular)
+            UserFollows.objects.create(user=friend, followed_user=user)
+        UserFollows.objects.create(user=friends[0], followed_user=known)
+        UserFollows.objects.create(user=friends[0], followed_user=friends[1])
+
+        page = get_suggestions_page(user)
+        self.assertEqual(
+            [(suggested, suggested.mutual) for suggested in page],
+            [(popular, 3), (known, 1)],
+        )
+
+        # Depuis le cache : seule la page est lue
+        with self.assertNumQueries(1):
+            get_suggestions_page(user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserFollows.objects.create(user=user, followed_user=popular)
+        self.assertEqual(list(get_suggestions_page(user)), [known])
+
+
+class BulkFollowTests(TestCase):
+    """Vérifie les abonnements en masse et leurs effets sur le flux."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bulk_follow_and_unfollow(self):
+        user = User.objects.create(username="onboarding")
+        authors = [
+            User.objects.create(username=f"author_{index}")
+            for index in range(3)
+        ]
+        Ticket.objects.create(title="Ticket", user=authors[0])
+        UserFollows.objects.create(user=user, followed_user=authors[2])
+        self.client.force_login(user)
+        url = reverse("authentification:bulk_follow")
+
+        response = self.client.post(url, {
+            "follow": ["author_0", "author_1", "author_2", "nobody",
+                       "onboarding"],
+        }, content_type="application/json")
+        self.assertEqual(response.json(), {
+            "followed": ["author_0", "author_1"],
+            "unfollowed": [],
+            "not_found": ["nobody", "onboarding"],
+        })
+        self.assertEqual(user.following.count(), 3)
+        # Publications des nouveaux abonnements recopiées dans le flux
+        self.assertEqual(
+            FeedEntry.objects.filter(owner=user, author=authors[0]).count(),
+            1)
+
+        response = self.client.post(
+            url, {"unfollow": ["author_0", "author_2"]},
+            content_type="application/json")
+        self.assertEqual(
+            response.json()["unfollowed"], ["author_0", "author_2"])
+        self.assertEqual(
+            list(user.following.values_list(
+                "followed_user__username", flat=True)),
+            ["author_1"],
+        )
+        self.assertFalse(FeedEntry.objects.filter(
+            owner=user, author=authors[0]).exists())
+
+        response = self.client.post(
+            url, "not json", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_follow_rejects_strings(self):
+        user = User.objects.create(username="onboarding")
+        User.objects.create(username="a")
+        self.client.force_login(user)
+
+        response = self.client.post(
+            reverse("authentification:bulk_follow"), {"follow": "a"},
+            content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(user.following.exists())
+
+    def test_existing_follows_are_not_counted_twice(self):
+        user = User.objects.create(username="racing")
+        authors = [
+            User.objects.create(username=f"author_{index}")
+            for index in range(2)
+        ]
+        # Abonnement inséré par une requête concurrente, sans signaux
+        UserFollows.objects.bulk_create(
+            [UserFollows(user=user, followed_user=authors[0])])
+
+        result = follow_users(user, ["author_0", "author_1"])
+        self.assertEqual(result.changed, ["author_1"])
+        user.refresh_from_db()
+        authors[0].refresh_from_db()
+        self.assertEqual(user.following_count, 1)
+        self.assertEqual(authors[0].follower_count, 0)
+
+        result = unfollow_users(user, ["author_0", "author_1", "author_1"])
+        self.assertEqual(result.changed, ["author_0", "author_1"])
+        self.assertFalse(user.following.exists())
+
+
+class UserCountersTests(TestCase):
+    """Vérifie les compteurs dénormalisés des utilisateurs."""
+
+    def counters(self, user):
+        user.refresh_from_db()
+        return [getattr(user, field) for field in User.COUNTER_FIELDS]
+
+    def test_counters_follow_writes(self):
+        user = User.objects.create(username="counted")
+        others = [
+            User.objects.create(username=f"other_{index}")
+            for index in range(3)
+        ]
+        follow_users(user, [other.username for other in others])
+        UserFollows.objects.create(user=others[0], followed_user=user)
+        ticket = Ticket.objects.create(title="Ticket", user=user)
+        Review.objects.create(
+            ticket=ticket, rating=5, headline="Review", user=user)
+        # Une sauvegarde d'une instance périmée n'écrase pas les compteurs
+        stale = User.objects.get(pk=user.pk)
+        Review.objects.create(
+            ticket=ticket, rating=4, headline="Other", user=user)
+        stale.save()
+
+        # abonnés, abonnements, critiques, billets
+        self.assertEqual(self.counters(user), [1, 3, 2, 1])
+        self.assertEqual(self.counters(others[1]), [1, 0, 0, 0])
+
+        unfollow_users(user, ["other_1"])
+        ticket.delete()
+        self.assertEqual(self.counters(user), [1, 2, 0, 0])
+        self.assertEqual(self.counters(others[1]), [0, 0, 0, 0])
+
+
+class FollowGraphTests(TestCase):
+    """Vérifie l'index en mémoire des abonnements."""
+
+    def test_graph_follows_writes(self):
+        graph = FollowGraph()
+        users = [
+            User.objects.create(username=f"node_{index}")
+            for index in range(4)
+        ]
+        a, b, c, d = (user.pk for user in users)
+        UserFollows.objects.create(user=users[0], followed_user=users[2])
+        UserFollows.objects.create(user=users[1], followed_user=users[2])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(list(graph.followers(c)), [a, b])
+        self.assertTrue(graph.is_following(a, c))
+        self.assertFalse(graph.is_following(c, a))
+
+        graph.add(a, d)
+        graph.add(a, b)
+        graph.remove(b, c)
+        self.assertEqual(list(graph.following(a)), [b, c, d])
+        self.assertEqual(list(graph.followers(c)), [a])
+        self.assertEqual(graph.follower_count(d), 1)
+
+    def test_signals_update_the_graph_after_commit(self):
+        follow_graph.reset()
+        user, other = (
+            User.objects.create(username=name) for name in ("x", "y"))
+        follow_graph.load()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            follow_users(user, ["y"])
+        self.assertTrue(follow_graph.is_following(user.pk, other.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            unfollow_users(user, ["y"])
+        self.assertFalse(follow_graph.is_following(user.pk, other.pk))
+        follow_graph.reset()
+
+
+@override_settings(
+    AUTHENTICATION_BACKENDS=["authentification.backends.CachedModelBackend"],
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+)
+class CachedUserTests(TestCase):
+    """Vérifie que l'utilisateur connecté est lu dans le cache et que son
+    entrée est supprimée lorsqu'il est modifié."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("cached", password="s3cret-pw")
+        self.client.login(username="cached", password="s3cret-pw")
+
+    def test_session_user_is_cached_and_invalidated(self):
+        url = reverse("authentification:username_autocomplete")
+        self.client.get(url, {"q": "ca"})
+        # Ni session ni utilisateur lus dans la base : seule la recherche
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"q": "ca"})
+        self.assertEqual(response.status_code, 200)
+
+        # Le changement de mot de passe invalide l'entrée et la session
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("an0ther-pw")
+            self.user.save()
+        response = self.client.get(url, {"q": "ca"})
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(
+    LOGIN_THROTTLE_WINDOW=60,
+    LOGIN_THROTTLE_IP_LIMIT=4,
+    LOGIN_THROTTLE_USERNAME_LIMIT=2,
+)
+class LoginThrottleTests(TestCase):
+    """Vérifie que les tentatives de connexion au-delà des limites sont
+    refusées avant le hachage du mot de passe."""
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user("target", password="s3cret-pw")
+        self.url = reverse("authentification:login")
+
+    def attempt(self, username, password="wrong-pw"):
+        return self.client.post(
+            self.url, {"username": username, "password": password})
+
+    def test_failed_logins_are_throttled_by_username_and_ip(self):
+        with mock.patch("authentification.views.authenticate",
+                        wraps=authenticate) as authenticate_mock:
+            self.assertEqual(self.attempt("target").status_code, 200)
+            self.assertEqual(self.attempt("TARGET").status_code, 200)
+            response = self.attempt("target", "s3cret-pw")
+            self.assertEqual(response.status_code, 429)
+            self.assertGreater(int(response["Retry-After"]), 0)
+            self.assertEqual(authenticate_mock.call_count, 2)
+
+            # Les autres noms restent ouverts jusqu'à la limite de l'adresse
+            self.assertEqual(self.attempt("other").status_code, 200)
+            self.assertEqual(self.attempt("another").status_code, 200)
+            self.assertEqual(self.attempt("third").status_code, 429)
+            self.assertEqual(authenticate_mock.call_count, 4)
+
+    def test_concurrent_attempts_are_counted_before_hashing(self):
+        statuses = []
+
+        def authenticate_slowly(**credentials):
+            # Deux autres tentatives arrivent pendant le hachage de la
+            # première : une seule peut encore être hachée
+            if authenticate_mock.call_count == 1:
+                statuses.extend(
+                    self.attempt("target").status_code for _ in range(2))
+            return None
+
+        with mock.patch("authentification.views.authenticate",
+                        side_effect=authenticate_slowly) as authenticate_mock:
+            self.assertEqual(self.attempt("target").status_code, 200)
+        self.assertEqual(statuses, [200, 429])
+        self.assertEqual(authenticate_mock.call_count, 2)
+
+    def test_reservations_and_sliding_window(self):
+        request = RequestFactory().post(self.url)
+
+        def retry_after(username, now):
+            # Délai d'une tentative, rendue aussitôt si elle est autorisée
+            reservation = reserve_attempt(request, username, now=now)
+            cancel_attempt(reservation)
+            return reservation.retry_after
+
+        # Réservations simultanées : la troisième dépasse la limite et
+        # n'est pas comptée
+        reservations = [
+            reserve_attempt(request, "target", now=90) for _ in range(3)]
+        self.assertEqual(
+            [reservation.retry_after for reservation in reservations],
+            [None, None, 30])
+        for reservation in reservations[:2]:
+            settle_attempt(reservation, success=False)
+        self.assertEqual(retry_after("target", now=90), 30)
+
+        # Fenêtre suivante : 2 * 54,5 / 60 = 1,82 échec compte encore ; un
+        # nouvel échec bloque jusqu'à ce que la part de la fenêtre
+        # précédente passe sous 1
+        self.assertIsNone(retry_after("target", now=125.5))
+        settle_attempt(
+            reserve_attempt(request, "target", now=125.5), success=False)
+        self.assertEqual(retry_after("target", now=125.5), 25)
+        self.assertEqual(retry_after("target", now=149.5), 1)
+        self.assertIsNone(retry_after("target", now=150.5))
+
+        # Un succès ne compte que pour l'adresse
+        settle_attempt(
+            reserve_attempt(request, "other", now=125.5), success=True)
+        self.assertIsNone(retry_after("other", now=125.5))
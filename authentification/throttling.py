@@ -0,0 +1,156 @@
+"""Limitation des tentatives de connexion, par adresse IP et par nom
+d'utilisateur.
+
+Chaque tentative coûte un hachage PBKDF2 complet : une rafale de tentatives
+occupe le processeur au détriment des autres pages. Les tentatives sont
+comptées dans le cache (partagé entre les processus) par fenêtres fixes de
+``LOGIN_THROTTLE_WINDOW`` secondes ; le débit est estimé sur une fenêtre
+glissante en pondérant la fenêtre précédente par la part qui en reste :
+
+    débit = précédente * (1 - écoulé / fenêtre) + courante
+
+Avant tout hachage, la tentative est réservée : les compteurs sont
+incrémentés de façon atomique (``cache.incr``) et la tentative n'est
+autorisée que si les tentatives déjà comptées restent sous la limite. Des
+tentatives simultanées obtiennent ainsi des rangs distincts, et seules les
+premières sont hachées. Une tentative refusée est décomptée. Toutes les
+tentatives comptent pour l'adresse IP, seuls les échecs pour le nom
+d'utilisateur (qu'un attaquant ne peut ainsi bloquer que jusqu'à la fin de
+la fenêtre) : la réservation du nom est rendue après un succès.
+"""
+
+import hashlib
+import math
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+IP = "ip"
+USERNAME = "username"
+
+# Résultat de reserve_attempt : délai à attendre (None si la tentative est
+# autorisée) et clés incrémentées, par portée
+Reservation = namedtuple("Reservation", ["retry_after", "keys"])
+
+
+def _ident(scope, value):
+    # Les noms saisis peuvent contenir des caractères refusés dans les clés
+    # de certains caches (Memcached) : ils sont hachés
+    if scope == USERNAME:
+        value = hashlib.blake2b(
+            value.lower().encode(), digest_size=16).hexdigest()
+    return value
+
+
+def _cache_key(scope, value, index):
+    return f"login:throttle:{scope}:{_ident(scope, value)}:{index}"
+
+
+def _client_ip(request):
+    # Derrière un proxy, REMOTE_ADDR doit être renseigné par celui-ci
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _limits(request, username):
+    """Retourne les compteurs concernés ``(portée, valeur, limite)``."""
+
+    limits = [(IP, _client_ip(request), settings.LOGIN_THROTTLE_IP_LIMIT)]
+    if username:
+        limits.append(
+            (USERNAME, username, settings.LOGIN_THROTTLE_USERNAME_LIMIT))
+    return limits
+
+
+def _wait(previous, current, elapsed, limit, window):
+    """Retourne le délai avant une nouvelle tentative, ou ``None`` si
+    ``current`` tentatives dans la fenêtre courante et ``previous`` dans la
+    précédente restent sous ``limit``."""
+
+    rate = previous * (1 - elapsed / window) + current
+    if rate < limit:
+        return None
+    # Délai avant que la part de la fenêtre précédente (ou, à défaut, la
+    # fenêtre courante) ne suffise plus à bloquer
+    if current < limit and previous:
+        return math.floor((rate - limit) / previous * window) + 1
+    return max(1, math.ceil(window - elapsed))
+
+
+def _increment(key, window):
+    """Incrémente le compteur ``key`` et retourne sa nouvelle valeur."""
+
+    # Les deux fenêtres lues doivent rester dans le cache
+    cache.add(key, 0, 2 * window)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Entrée expirée entre add() et incr()
+        cache.set(key, 1, 2 * window)
+        return 1
+
+
+def _decrement(key):
+    try:
+        cache.decr(key)
+    except ValueError:
+        # Entrée expirée entre-temps : rien à décompter
+        pass
+
+
+def reserve_attempt(request, username, now=None):
+    """Compte une tentative avant le hachage du mot de passe.
+
+    Returns:
+        Reservation: Si ``retry_after`` n'est pas None, la tentative est
+        refusée (et n'est pas comptée) ; sinon ``settle_attempt`` doit être
+        appelée avec le résultat de l'authentification, ou
+        ``cancel_attempt`` si le mot de passe n'est pas vérifié.
+    """
+
+    now = time.time() if now is None else now
+    window = settings.LOGIN_THROTTLE_WINDOW
+    index, elapsed = divmod(now, window)
+    limits = _limits(request, username)
+
+    previous_keys = {
+        scope: _cache_key(scope, value, int(index) - 1)
+        for scope, value, _ in limits
+    }
+    previous_counts = cache.get_many(list(previous_keys.values()))
+
+    keys = {}
+    wait = None
+    for scope, value, limit in limits:
+        key = _cache_key(scope, value, int(index))
+        keys[scope] = key
+        # Rang de la tentative : les tentatives simultanées en obtiennent
+        # chacune un différent
+        current = _increment(key, window) - 1
+        previous = previous_counts.get(previous_keys[scope], 0)
+        wait = _wait(previous, current, elapsed, limit, window)
+        if wait is not None:
+            break
+
+    if wait is not None:
+        for key in keys.values():
+            _decrement(key)
+        return Reservation(wait, {})
+    return Reservation(None, keys)
+
+
+def settle_attempt(reservation, success):
+    """Conserve ou rend la réservation d'une tentative selon son résultat :
+    un succès ne compte pas pour le nom d'utilisateur."""
+
+    if success and USERNAME in reservation.keys:
+        _decrement(reservation.keys[USERNAME])
+
+
+def cancel_attempt(reservation):
+    """Rend la réservation d'une tentative dont le mot de passe n'a pas été
+    vérifié (formulaire invalide)."""
+
+    for key in reservation.keys.values():
+        _decrement(key)
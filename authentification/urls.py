@@ -1,7 +1,8 @@
 from django.urls import path
 
 from .views import (
-    signup_page_view, login_page_view, logout_page_view, abo_page_view)
+    signup_page_view, login_page_view, logout_page_view, abo_page_view,
+    username_autocomplete_view, bulk_follow_view)
 
 app_name = "authentification"
 
@@ -10,4 +11,7 @@ urlpatterns = [
     path("logout/", logout_page_view, name="logout"),
     path("signup/", signup_page_view, name="register"),
     path("abo/<str:user>/", abo_page_view, name="abo_page"),
+    path("users/autocomplete/", username_autocomplete_view,
+         name="username_autocomplete"),
+    path("users/follows/", bulk_follow_view, name="bulk_follow"),
 ]
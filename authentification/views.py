@@ -1,14 +1,25 @@
 # Importation des modules Django nécessaires
+import json
+
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
-from django.db import IntegrityError
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
+from django.views.decorators.http import require_POST
+
+from utilities.routers import replica_reads
 
 # Importation des formulaires et modèles de l'application
+from .autocomplete import match_usernames
+from .follows import follow_users, unfollow_users
 from .forms import SignupForm, LoginForm, SearchUser, FollowUserButton
+from .graph import follow_graph
 from .models import User, UserFollows
+from .suggestions import get_suggestions_page
+from .throttling import cancel_attempt, reserve_attempt, settle_attempt
 
 
 def signup_page_view(request):
@@ -45,6 +56,19 @@ def login_page_view(request):
         # Création du formulaire de connexion avec les données de la requête
         form = LoginForm(request.POST)
 
+        # Trop de tentatives pour cette adresse ou ce nom : refus avant le
+        # hachage du mot de passe, sans rendu de gabarit. La tentative est
+        # comptée dès maintenant, pour que des tentatives simultanées ne
+        # soient pas toutes hachées (voir authentification.throttling)
+        username = request.POST.get("username", "")
+        reservation = reserve_attempt(request, username)
+        if reservation.retry_after is not None:
+            response = HttpResponse(
+                "Too many login attempts. Please try again later.",
+                content_type="text/plain", status=429)
+            response["Retry-After"] = str(reservation.retry_after)
+            return response
+
         # Si le formulaire est valide
         if form.is_valid():
             # Authentification de l'utilisateur
@@ -52,6 +76,7 @@ def login_page_view(request):
                 username=form.cleaned_data["username"],
                 password=form.cleaned_data["password"],
             )
+            settle_attempt(reservation, success=user is not None)
 
             # Si l'authentification est réussie
             if user is not None:
@@ -64,6 +89,10 @@ def login_page_view(request):
                 # Affichage d'un message d'erreur si l'authentification échoue
                 messages.error(request, "Invalid username or password!")
 
+        else:
+            # Aucun mot de passe vérifié : la tentative n'est pas comptée
+            cancel_attempt(reservation)
+
     else:
         # Si la requête n'est pas de type POST, initialisation du formulaire
         form = LoginForm()
@@ -81,6 +110,7 @@ def logout_page_view(request):
 
 # Page d'abonnement
 @login_required
+@replica_reads
 def abo_page_view(request, user):
     """Vue de la page d'abonnement avec la logique de suivi et de
     désabonnement, affichage des utilisateurs suivis par request.user.
@@ -104,25 +134,17 @@ def abo_page_view(request, user):
                 # Récupération de l'utilisateur à suivre
                 to_be_followed_user = flwUserBtn.cleaned_data[
                     "searched_to_follow"]
-                try:
-                    # Création d'une relation de suivi entre les utilisateurs
-                    user_to_follow = User.objects.get(
-                        username=to_be_followed_user)
-                    # fait référence au gestionnaire d'objets (objects)
-                    # associé au modèle UserFollows pour crée une nouvelle
-                    # instance
-                    UserFollows.objects.create(
-                        user=request.user, followed_user=user_to_follow,
-                    )
-                except User.DoesNotExist:
+                # Création de la relation de suivi (une requête pour trouver
+                # l'utilisateur, une pour vérifier l'abonnement existant)
+                result = follow_users(request.user, [to_be_followed_user])
+                if result.not_found:
                     # Affichage d'un message d'erreur si l'utilisateur
                     # n'existe pas
                     messages.error(
                         request,
                         "User does not exist. Please choose another name."
                     )
-
-                except IntegrityError:
+                elif not result.changed:
                     # Affichage d'un message d'erreur si la relation de suivi
                     # existe déjà
                     messages.error(request,
@@ -138,13 +160,10 @@ def abo_page_view(request, user):
             # Récupérer l'ID de l'utilisateur à ne plus suivre depuis la
             # requête POST
             user_id = request.POST.get("unfollow")
-            # Obtenir l'objet User correspondant à cet ID
-            user_to_unfollow = User.objects.get(id=user_id)
             # Supprimer l'objet UserFollows correspondant à l'utilisateur
             # actuel et l'utilisateur à ne plus suivre
-            UserFollows.objects.get(
-                user=request.user, followed_user=user_to_unfollow
-            ).delete()
+            UserFollows.objects.filter(
+                user=request.user, followed_user_id=user_id).delete()
 
         # Sinon, si la clé "search" est présente dans la requête POST
         elif "search" in request.POST:
@@ -156,10 +175,14 @@ def abo_page_view(request, user):
                 # Récupération du terme de recherche à partir des données
                 # netoyées du formulaire
                 query = search_form.cleaned_data['search']
-                # Recherche d'un utilisateur dont le nom d'utilisateur
-                # contient le terme de recherche (insensible à la casse)
-                searched_user = User.objects.filter(
-                    username__icontains=query).first()
+                # Recherche de l'utilisateur dont le nom correspond le mieux
+                # au terme de recherche (insensible à la casse) : nom égal,
+                # puis commençant par le terme, puis le contenant (même
+                # pour un terme court, la recherche n'étant faite qu'une fois)
+                matches = match_usernames(
+                    query, limit=1, exclude_ids=[request.user.pk],
+                    infix_min=1)
+                searched_user = matches[0] if matches else None
                 # Si un utilisateur correspondant est trouvé
                 if searched_user:
                     # Stocker l'utilisateur recherché dans une variable de
@@ -177,27 +200,28 @@ def abo_page_view(request, user):
                         "User does not exist. Please choose another name."
                     )
 
-    # Récupérer tous les utilisateurs suivis par l'utilisateur actuel
-    followed_users = request.user.following.all()
-    # Récupérer tous les utilisateurs qui suivent l'utilisateur actuel
-    followed_by_others = UserFollows.objects.filter(followed_user=request.user)
-
-    # Filtrage des utilisateurs disponibles pour le suivi (éviter de se suivre
-    # soi-même ou les superutilisateurs)
-    users = (
-        # Exclusion des superutilisateurs
-        User.objects.filter(is_superuser=False)
-        # Exclusion des utilisateurs déjà suivis par l'utilisateur actuel
-        .exclude(id__in=request.user.following.values_list(
-                "followed_user_id", flat=True)  # renvoie une liste plate
-                # (une seule liste d'IDs) plutôt qu'une liste de tuples.
-        )
-        .exclude(id=request.user.id)
-    )
+    # Utilisateurs suivis par l'utilisateur actuel et utilisateurs qui le
+    # suivent, lus dans l'index en mémoire des abonnements, puis chargés en
+    # une seule requête
+    followed_ids = follow_graph.following(request.user.pk)
+    follower_ids = follow_graph.followers(request.user.pk)
+    users_by_id = User.objects.only("pk", "username").in_bulk(
+        {*followed_ids, *follower_ids})
+    followed_users = [
+        users_by_id[pk] for pk in followed_ids if pk in users_by_id]
+    followed_by_others = [
+        users_by_id[pk] for pk in follower_ids if pk in users_by_id]
+
+    # Suggestions d'utilisateurs à suivre (amis d'amis), paginées, sur la
+    # page d'abonnement de l'utilisateur actuel
+    suggestions = None
+    if requested_user == request.user:
+        suggestions = get_suggestions_page(
+            request.user, request.GET.get("suggestions_page"))
 
     # Construction du contexte contenant les users pour le rendu de la page
     context = {
-        "users": users,
+        "suggestions": suggestions,
         'search_form': search_form,
         'searched_user_resp': searched_user_resp,
         'searched_user_btn': searched_user_resp_btn,
@@ -208,3 +232,61 @@ def abo_page_view(request, user):
 
     # Rendu de la page d'abonnement
     return render(request, "abo/abo_page.html", context)
+
+
+# Autocomplétion des noms d'utilisateur (page d'abonnement)
+@login_required
+def username_autocomplete_view(request):
+    """Retourne au format JSON les noms d'utilisateur correspondant à
+    ``?q=``, ceux qui commencent par la recherche en premier."""
+
+    users = match_usernames(
+        request.GET.get("q", ""), exclude_ids=[request.user.pk])
+    return JsonResponse({"usernames": [user.username for user in users]})
+
+
+# Abonnements et désabonnements en masse
+@login_required
+@require_POST
+def bulk_follow_view(request):
+    """Abonne et désabonne l'utilisateur actuel de plusieurs utilisateurs à
+    la fois, en une transaction.
+
+    Le corps de la requête est un objet JSON
+    ``{"follow": [noms...], "unfollow": [noms...]}`` ; la réponse donne les
+    noms effectivement suivis, ne plus suivis et introuvables.
+    """
+
+    try:
+        data = json.loads(request.body)
+        follow = data.get("follow", [])
+        unfollow = data.get("unfollow", [])
+    except (ValueError, AttributeError):
+        return JsonResponse({"error": "Invalid JSON body."}, status=400)
+
+    # Une chaîne serait parcourue caractère par caractère
+    if not (isinstance(follow, list) and isinstance(unfollow, list)):
+        return JsonResponse(
+            {"error": "follow and unfollow must be lists of usernames."},
+            status=400)
+
+    usernames = [*follow, *unfollow]
+    if not all(isinstance(name, str) for name in usernames):
+        return JsonResponse(
+            {"error": "Usernames must be strings."}, status=400)
+    if len(usernames) > settings.FOLLOW_BULK_LIMIT:
+        return JsonResponse(
+            {"error": f"At most {settings.FOLLOW_BULK_LIMIT} usernames "
+                      "per request."},
+            status=400,
+        )
+
+    with transaction.atomic():
+        followed = follow_users(request.user, follow)
+        unfollowed = unfollow_users(request.user, unfollow)
+
+    return JsonResponse({
+        "followed": followed.changed,
+        "unfollowed": unfollowed.changed,
+        "not_found": sorted({*followed.not_found, *unfollowed.not_found}),
+    })
@@ -0,0 +1,113 @@
+"""Configuration de la base de données par variables d'environnement.
+
+``LITREVU_DB_ENGINE`` choisit le moteur : ``sqlite`` (par défaut) ou
+``postgresql``.
+
+SQLite : ``LITREVU_DB_NAME`` (chemin du fichier). Les réglages
+``SQLITE_PRAGMAS`` sont appliqués à chaque nouvelle connexion (voir
+``utilities.db``) ; ``LITREVU_SQLITE_TUNING=0`` revient au journal par
+défaut de SQLite.
+
+PostgreSQL : ``LITREVU_DB_NAME``, ``LITREVU_DB_USER``,
+``LITREVU_DB_PASSWORD``, ``LITREVU_DB_HOST``, ``LITREVU_DB_PORT``, et
+``LITREVU_DB_CONN_MAX_AGE`` (durée de vie des connexions persistantes, en
+secondes ; 0 pour une connexion par requête). Derrière un pooler en mode
+transaction (PgBouncer), ``LITREVU_DB_DISABLE_SERVER_SIDE_CURSORS=1``
+désactive les curseurs serveur de ``QuerySet.iterator()``.
+
+Réplicas en lecture : ``LITREVU_DB_REPLICAS``, liste séparée par des
+virgules de fichiers SQLite ou d'hôtes PostgreSQL, déclarés comme
+``replica_1``, ``replica_2``… (voir ``utilities.routers``).
+"""
+
+
+def _flag(environ, name, default):
+    return environ.get(name, default).lower() in ("1", "true", "yes", "on")
+
+
+def database_config(environ, base_dir):
+    """Retourne la configuration de la base ``default`` décrite par
+    ``environ``."""
+
+    engine = environ.get("LITREVU_DB_ENGINE", "sqlite")
+
+    if engine == "postgresql":
+        return {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": environ.get("LITREVU_DB_NAME", "litrevu"),
+            "USER": environ.get("LITREVU_DB_USER", ""),
+            "PASSWORD": environ.get("LITREVU_DB_PASSWORD", ""),
+            "HOST": environ.get("LITREVU_DB_HOST", ""),
+            "PORT": environ.get("LITREVU_DB_PORT", ""),
+            # Connexions réutilisées d'une requête à l'autre, vérifiées
+            # avant réutilisation (redémarrage du serveur, coupure réseau)
+            "CONN_MAX_AGE": int(environ.get("LITREVU_DB_CONN_MAX_AGE", 600)),
+            "CONN_HEALTH_CHECKS": True,
+            "DISABLE_SERVER_SIDE_CURSORS": _flag(
+                environ, "LITREVU_DB_DISABLE_SERVER_SIDE_CURSORS", "0"),
+            "OPTIONS": {
+                "connect_timeout": 5,
+            },
+        }
+
+    if engine == "sqlite":
+        return {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": environ.get("LITREVU_DB_NAME", base_dir / "db.sqlite3"),
+            "OPTIONS": {
+                # Attente (en secondes) d'un verrou tenu par un autre
+                # écrivain avant l'erreur « database is locked »
+                "timeout": 5,
+            },
+        }
+
+    raise ValueError(f"Unsupported LITREVU_DB_ENGINE: {engine!r}")
+
+
+def replica_configs(environ, primary):
+    """Retourne la configuration des réplicas de ``primary`` listés par
+    ``LITREVU_DB_REPLICAS`` : ``{alias: configuration}``."""
+
+    # Un réplica SQLite est un autre fichier, un réplica PostgreSQL un autre
+    # serveur avec les mêmes identifiants
+    key = "HOST" if primary["ENGINE"].endswith("postgresql") else "NAME"
+    locations = [
+        location.strip()
+        for location in environ.get("LITREVU_DB_REPLICAS", "").split(",")
+        if location.strip()
+    ]
+    return {
+        f"replica_{index}": {
+            **primary,
+            key: location,
+            # Sous test, les réplicas lisent la base de test de default
+            "TEST": {"MIRROR": "default"},
+        }
+        for index, location in enumerate(locations, 1)
+    }
+
+
+# Réglages SQLite appliqués à chaque connexion :
+# - journal WAL : les lectures ne sont plus bloquées par une écriture ;
+# - synchronous=NORMAL : sans risque de corruption en WAL, seule la
+#   dernière transaction peut être perdue en cas de coupure de courant ;
+# - busy_timeout : attente d'un verrou, en millisecondes ;
+# - cache_size (négatif : en Kio) et mmap_size (en octets) : cache de pages
+#   et lecture du fichier par projection en mémoire.
+TUNED_SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def sqlite_pragmas(environ):
+    """Retourne les réglages SQLite à appliquer (aucun si
+    ``LITREVU_SQLITE_TUNING=0``)."""
+
+    if _flag(environ, "LITREVU_SQLITE_TUNING", "1"):
+        return dict(TUNED_SQLITE_PRAGMAS)
+    return {}
@@ -16,6 +16,8 @@ import os.path
 from django.contrib.messages import constants as messages
 from pathlib import Path
 
+from .database import database_config, replica_configs, sqlite_pragmas
+
 # load the .env file:
 # load_dotenv()
 
@@ -65,6 +67,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "utilities.middleware.PrimaryStickinessMiddleware",
 ]
 
 ROOT_URLCONF = "litrevu.urls"
@@ -91,10 +94,38 @@ WSGI_APPLICATION = "litrevu.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Choix et réglages de la base par variables d'environnement (voir
+# litrevu/database.py) : SQLite par défaut, PostgreSQL en production
 DATABASES = {
+    "default": database_config(os.environ, BASE_DIR),
+}
+DATABASES.update(replica_configs(os.environ, DATABASES["default"]))
+
+# Lectures des pages flux, publications et abonnements envoyées aux
+# réplicas, écritures à la base principale (voir utilities.routers)
+DATABASE_ROUTERS = ["utilities.routers.PrimaryReplicaRouter"]
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+
+# Durée (en secondes) pendant laquelle un utilisateur qui vient d'écrire lit
+# la base principale (délai de réplication maximal attendu)
+REPLICA_STICKY_SECONDS = 10
+
+# Réglages appliqués à chaque connexion SQLite (journal WAL, etc.)
+SQLITE_PRAGMAS = sqlite_pragmas(os.environ)
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Sur un serveur seul, sans Redis, FileBasedCache partage le cache entre
+# plusieurs processus :
+#     "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+#     "LOCATION": BASE_DIR / "cache",
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
     }
 }
 
@@ -141,6 +172,17 @@ MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "utilities/media/")
 
 
+# Traitement des images des billets en arrière-plan : "thread" (pool de
+# threads), "process" (pool de processus) ou "sync" (immédiat, pour les tests)
+IMAGE_PROCESSING = "thread"
+IMAGE_WORKERS = 2
+
+# Limites des images envoyées, vérifiées avant tout décodage : taille du
+# fichier (en octets) et nombre de pixels
+IMAGE_MAX_UPLOAD_SIZE = 15 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -151,6 +193,60 @@ AUTH_USER_MODEL = "authentification.User"
 LOGIN_URL = "authentification:login"
 LOGIN_REDIRECT_URL = "review:feeds_page"
 
+# Nombre de publications par page du flux
+FEED_PAGE_SIZE = 20
+
+# Au-delà de ce nombre d'abonnés, les publications d'un auteur ne sont plus
+# recopiées dans le flux de chaque abonné mais lues à l'affichage
+FEED_FANOUT_LIMIT = 10000
+
+# Taille des lots d'insertion des entrées du flux
+FEED_FANOUT_BATCH_SIZE = 1000
+
+# Durée de vie (en secondes) des pages du flux en cache
+FEED_CACHE_TIMEOUT = 300
+
+# Nombre de résultats par page de la recherche, et nombre de pages maximal
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGES = 50
+
+# Billets les mieux notés : nombre minimal de critiques pour être classé, et
+# nombre de billets par page
+TOP_RATED_MIN_REVIEWS = 3
+TOP_RATED_PAGE_SIZE = 20
+
+# Nombre de noms proposés par l'autocomplétion des utilisateurs, et longueur
+# minimale d'une recherche pour proposer aussi les noms qui la contiennent
+USERNAME_AUTOCOMPLETE_LIMIT = 10
+USERNAME_AUTOCOMPLETE_INFIX_MIN = 3
+
+# Suggestions d'utilisateurs à suivre : nombre de suggestions calculées,
+# nombre par page et durée de vie (en secondes) dans le cache
+FOLLOW_SUGGESTIONS_LIMIT = 100
+FOLLOW_SUGGESTIONS_PAGE_SIZE = 10
+FOLLOW_SUGGESTIONS_TIMEOUT = 600
+
+# Abonnements en masse : nombre maximal de noms par requête et taille des
+# lots d'insertion
+FOLLOW_BULK_LIMIT = 1000
+FOLLOW_BULK_BATCH_SIZE = 500
+
+# Index en mémoire des abonnements : intervalle (en secondes) entre deux
+# rechargements complets depuis la base, et taille des lots de lecture
+FOLLOW_GRAPH_RESYNC_INTERVAL = 60
+FOLLOW_GRAPH_CHUNK_SIZE = 10000
+
+# Durée de vie (en secondes) des utilisateurs connectés dans le cache (voir
+# authentification.backends et litrevu.settings_production)
+USER_CACHE_TIMEOUT = 300
+
+# Limitation des tentatives de connexion (voir authentification.throttling) :
+# durée de la fenêtre glissante (en secondes), tentatives par adresse IP et
+# échecs par nom d'utilisateur dans cette fenêtre
+LOGIN_THROTTLE_WINDOW = 300
+LOGIN_THROTTLE_IP_LIMIT = 30
+LOGIN_THROTTLE_USERNAME_LIMIT = 5
+
 
 # for django messages framework:
 MESSAGE_TAGS = {
@@ -0,0 +1,44 @@
+"""Profil de production de litrevu.
+
+Reprend ``litrevu.settings`` et réduit les accès à la base par requête :
+
+* sessions ``cached_db`` : lues dans le cache, écrites dans le cache et dans
+  la base seulement lorsqu'elles changent (connexion, déconnexion) ;
+* messages dans un cookie signé : ``messages.success(...)`` ne modifie
+  jamais la session ;
+* utilisateur connecté lu dans le cache (``CachedModelBackend``) au lieu
+  d'une requête par page.
+
+Le cache doit être partagé entre les processus (``FileBasedCache`` sur un
+serveur seul, Redis ou Memcached sinon) pour que la suppression d'une
+session ou d'un utilisateur soit vue par tous.
+
+Utilisation : ``DJANGO_SETTINGS_MODULE=litrevu.settings_production``.
+``python manage.py bench_request_queries`` compare le nombre de requêtes
+par page avec celui de ``litrevu.settings``.
+"""
+
+from .settings import *  # noqa: F401, F403
+from .settings import BASE_DIR
+
+DEBUG = False
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache",
+        "OPTIONS": {
+            "MAX_ENTRIES": 100000,
+        },
+    }
+}
+
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+MESSAGE_STORAGE = "django.contrib.messages.storage.cookie.CookieStorage"
+
+# Les sessions ouvertes avec ModelBackend restent valides (sans cache)
+AUTHENTICATION_BACKENDS = [
+    "authentification.backends.CachedModelBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
@@ -0,0 +1,153 @@
+"""Cache des pages du flux, par utilisateur.
+
+Les pages sont mises en cache sous une clé qui contient la version du flux
+de l'utilisateur, ainsi que celle de chaque auteur qu'il lit en mode
+« pull ». Une écriture remplace ces versions par un jeton neuf : les pages
+déjà en cache ne sont plus jamais lues et expirent d'elles-mêmes. Aucune
+suppression ni parcours de clés n'est nécessaire, ce qui fonctionne avec
+``LocMemCache`` comme avec ``FileBasedCache``.
+
+Une page absente du cache est calculée là où vont les lectures de la
+requête. Une page lue sur un réplica peut être en retard sur le changement
+de version qui l'a invalidée : elle n'est gardée que
+``REPLICA_STICKY_SECONDS`` (le délai de réplication toléré) au lieu de
+``FEED_CACHE_TIMEOUT``, et sous une autre clé que les pages lues sur la
+base principale, que seules lisent les requêtes d'un utilisateur qui vient
+d'écrire (voir ``utilities.routers``).
+"""
+
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from authentification.models import UserFollows
+from utilities.routers import reads_from_replica
+
+from . import feeds
+from .models import Review, Ticket
+
+HITS_KEY = "feed:stats:hits"
+MISSES_KEY = "feed:stats:misses"
+
+
+def _feed_version_key(user_id):
+    return f"feed:version:{user_id}"
+
+
+def _author_version_key(user_id):
+    return f"feed:author:{user_id}"
+
+
+def _versions(keys):
+    """Retourne les versions associées à ``keys``, en créant celles qui
+    n'existent pas encore."""
+
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def _count(key):
+    """Incrémente le compteur ``key``."""
+
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Le compteur a été évincé entre les deux appels
+            cache.add(key, 1, timeout=None)
+
+
+def get_feed_page(user, cursor=None, older=True, size=None):
+    """Retourne une ``FeedPage`` du flux de ``user``, depuis le cache si
+    possible (voir ``review.feeds.get_feed_page``)."""
+
+    authors = feeds.pull_authors(user)
+    versions = _versions(
+        [_feed_version_key(user.pk)]
+        + [_author_version_key(author) for author in authors]
+    )
+    replica = reads_from_replica()
+    page_key = md5(":".join([
+        *versions, cursor or "", str(older), str(size), str(replica),
+    ]).encode()).hexdigest()
+    key = f"feed:page:{user.pk}:{page_key}"
+
+    page = cache.get(key)
+    if page is not None:
+        _count(HITS_KEY)
+        return page
+
+    _count(MISSES_KEY)
+    page = feeds.get_feed_page(user, cursor, older, size, authors=authors)
+    timeout = settings.FEED_CACHE_TIMEOUT
+    if replica:
+        timeout = min(timeout, settings.REPLICA_STICKY_SECONDS)
+    cache.set(key, page, timeout=timeout)
+    return page
+
+
+def _bump(keys):
+    """Remplace les versions ``keys`` par des jetons neufs, une fois la
+    transaction en cours validée (pour ne pas remettre en cache un état
+    antérieur à l'écriture)."""
+
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(
+            {key: uuid4().hex for key in keys}, timeout=None))
+
+
+def invalidate_feeds(user_ids):
+    """Invalide le flux des utilisateurs ``user_ids``."""
+
+    _bump(_feed_version_key(user_id) for user_id in set(user_ids))
+
+
+def invalidate_authors(author_ids):
+    """Invalide le flux de chaque auteur de ``author_ids`` et de ses
+    abonnés. Pour un auteur lu en mode « pull », seule sa version d'auteur
+    change : elle fait partie de la clé de cache de tous ses abonnés."""
+
+    author_ids = set(author_ids)
+    user_ids = set(author_ids)
+    for author_id in author_ids:
+        followers = UserFollows.objects.filter(followed_user_id=author_id)
+        if followers.count() >= settings.FEED_FANOUT_LIMIT:
+            _bump([_author_version_key(author_id)])
+        else:
+            user_ids.update(followers.values_list("user_id", flat=True))
+    invalidate_feeds(user_ids)
+
+
+def invalidate_ticket(ticket_id):
+    """Invalide les flux où le billet apparaît, seul ou dans une critique."""
+
+    tickets = Ticket.objects.filter(pk=ticket_id)
+    reviews = Review.objects.filter(ticket_id=ticket_id)
+    invalidate_authors([
+        *tickets.values_list("user_id", flat=True),
+        *reviews.values_list("user_id", flat=True),
+    ])
+
+
+def stats():
+    """Retourne les compteurs de succès et d'échecs du cache."""
+
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {
+        "hits": counters.get(HITS_KEY, 0),
+        "misses": counters.get(MISSES_KEY, 0),
+    }
+
+
+def reset_stats():
+    """Remet à zéro les compteurs du cache."""
+
+    cache.delete_many([HITS_KEY, MISSES_KEY])
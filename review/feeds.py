@@ -0,0 +1,539 @@
+"""Construction paginée du flux (pagination par curseur, « keyset »).
+
+Le flux fusionne deux tables (critiques et billets). Au lieu de tout charger
+en Python puis de trier, une seule requête ``UNION ALL`` ordonnée par la clé
+``(time_created, type, id)`` et limitée à une page est exécutée ; seules les
+lignes de la page sont ensuite chargées en instances de modèles.
+
+Le flux est matérialisé dans ``FeedEntry`` au moment de l'écriture
+(« fan-out on write »). Les auteurs suivis par plus de ``FEED_FANOUT_LIMIT``
+utilisateurs ne sont pas recopiés chez leurs abonnés : leurs publications
+sont lues directement au moment de l'affichage (mode « pull »).
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, router, transaction
+from django.db.models import CharField, Count, F, Q, Value
+from django.db.models.constants import OnConflict
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from authentification.graph import follow_graph
+from authentification.models import UserFollows
+from utilities.routers import reads_own_writes
+
+from .models import FeedEntry, Review, Ticket
+
+REVIEW = "REVIEW"
+TICKET = "TICKET"
+
+# Une page du flux : les publications à afficher et les curseurs des pages
+# voisines (None s'il n'y a pas de page dans cette direction)
+FeedPage = namedtuple("FeedPage", ["posts", "older_cursor", "newer_cursor"])
+
+
+def encode_cursor(time_created, type_of_content, pk):
+    """Encode la clé ``(time_created, type, id)`` en un curseur opaque."""
+
+    raw = f"{time_created.isoformat()}|{type_of_content}|{pk}"
+    return urlsafe_base64_encode(raw.encode())
+
+
+def decode_cursor(cursor):
+    """Décode un curseur produit par ``encode_cursor``.
+
+    Raises:
+        ValueError: Si le curseur est invalide.
+    """
+
+    try:
+        stamp, type_of_content, pk = (
+            urlsafe_base64_decode(cursor).decode().split("|"))
+        time_created = datetime.fromisoformat(stamp)
+        pk = int(pk)
+    except (TypeError, UnicodeDecodeError) as error:
+        raise ValueError("Invalid feed cursor") from error
+
+    if type_of_content not in (REVIEW, TICKET):
+        raise ValueError("Invalid feed cursor")
+
+    return time_created, type_of_content, pk
+
+
+def _after_cursor(queryset, type_of_content, cursor, older, id_field="pk"):
+    """Filtre ``queryset`` sur les lignes situées après ``cursor`` dans le
+    sens de lecture (plus anciennes si ``older``, plus récentes sinon).
+
+    Chaque branche de l'union a un type constant : la comparaison du tuple
+    ``(time_created, type, id)`` se simplifie donc en Python.
+    """
+
+    if cursor is None:
+        return queryset
+
+    time_created, cursor_type, pk = cursor
+    lookup = "lt" if older else "gt"
+    condition = Q(**{f"time_created__{lookup}": time_created})
+
+    # À date égale, départage sur le type puis sur l'identifiant
+    if type_of_content == cursor_type:
+        condition |= Q(
+            time_created=time_created, **{f"{id_field}__{lookup}": pk})
+    elif (type_of_content < cursor_type) == older:
+        condition |= Q(time_created=time_created)
+
+    return queryset.filter(condition)
+
+
+def _feed_rows(queryset, type_of_content, cursor, older, id_field="pk"):
+    """Projette une branche du flux sur la clé ``(time_created, id, type)``.
+
+    ``id_field`` désigne le champ portant l'identifiant de la publication
+    (``object_id`` pour les entrées matérialisées).
+    """
+
+    return (
+        _after_cursor(queryset, type_of_content, cursor, older, id_field)
+        .annotate(
+            post_id=F(id_field),
+            type_of_content=Value(type_of_content, CharField()),
+        )
+        .values_list("time_created", "post_id", "type_of_content")
+        .order_by()
+    )
+
+
+def pull_authors_queryset(user):
+    """Retourne la requête des auteurs suivis par ``user`` dont les
+    publications sont lues au moment de l'affichage (mode « pull »)."""
+
+    return (
+        UserFollows.objects.filter(user=user)
+        .annotate(followers=Count("followed_user__followed_by"))
+        .filter(followers__gte=settings.FEED_FANOUT_LIMIT)
+        .values_list("followed_user", flat=True)
+    )
+
+
+def pull_authors(user):
+    """Retourne la liste des identifiants de ``pull_authors_queryset``, lus
+    dans l'index en mémoire des abonnements (sans requête), ou dans la base
+    pour un utilisateur qui vient d'écrire (voir ``utilities.routers``)."""
+
+    if reads_own_writes():
+        return list(pull_authors_queryset(user))
+    return [
+        author for author in follow_graph.following(user.pk)
+        if follow_graph.follower_count(author) >= settings.FEED_FANOUT_LIMIT
+    ]
+
+
+def feed_querysets(user):
+    """Retourne les critiques et les billets visibles dans le flux de
+    ``user`` : ses publications, celles des utilisateurs qu'il suit et les
+    critiques de ses billets. Les billets déjà critiqués sont exclus.
+
+    Ces requêtes définissent le contenu du flux ; elles servent à la
+    reconstruction des entrées matérialisées (``rebuild_feeds``).
+    """
+
+    followed = UserFollows.objects.filter(user=user).values("followed_user")
+
+    reviews = Review.objects.filter(
+        Q(user__in=followed) | Q(user=user) | Q(ticket__user=user)
+    )
+    tickets = Ticket.objects.filter(review_count=0).filter(
+        Q(user__in=followed) | Q(user=user)
+    )
+    return reviews, tickets
+
+
+def _hydrate(rows):
+    """Charge les instances correspondant aux lignes d'une page, dans
+    l'ordre de la page (deux requêtes au plus)."""
+
+    review_ids = [pk for _, pk, kind in rows if kind == REVIEW]
+    ticket_ids = [pk for _, pk, kind in rows if kind == TICKET]
+    instances = {
+        REVIEW: Review.objects.select_related(
+            "user", "ticket__user").in_bulk(review_ids)
+        if review_ids else {},
+        TICKET: Ticket.objects.select_related("user").in_bulk(ticket_ids)
+        if ticket_ids else {},
+    }
+
+    posts = []
+    for _, pk, kind in rows:
+        post = instances[kind].get(pk)
+        # La publication a pu être supprimée entre les deux requêtes
+        if post is not None:
+            post.type_of_content = kind
+            posts.append(post)
+    return posts
+
+
+def feed_rows_queryset(user, key=None, older=True, size=None, authors=None):
+    """Retourne la requête ``UNION ALL`` d'une page du flux de ``user`` :
+    ``size + 1`` lignes ``(time_created, id, type)`` après la clé ``key``.
+
+    ``authors`` désigne les auteurs lus en mode « pull » (calculés par
+    ``pull_authors`` si None).
+    """
+
+    size = size or settings.FEED_PAGE_SIZE
+    if authors is None:
+        authors = pull_authors(user)
+
+    # Entrées matérialisées, hors auteurs lus en mode « pull » (leurs
+    # anciennes entrées éventuelles sont ignorées pour éviter les doublons)
+    entries = FeedEntry.objects.filter(owner=user).exclude(
+        author__in=authors)
+    branches = [
+        _feed_rows(
+            entries.filter(content_type=ContentType.objects.get_for_model(
+                model)),
+            kind, key, older, id_field="object_id",
+        )
+        for kind, model in ((REVIEW, Review), (TICKET, Ticket))
+    ]
+    if authors:
+        branches += [
+            _feed_rows(Review.objects.filter(user__in=authors), REVIEW, key,
+                       older),
+            _feed_rows(
+                Ticket.objects.filter(user__in=authors, review_count=0),
+                TICKET, key, older,
+            ),
+        ]
+    rows = branches[0].union(*branches[1:], all=True)
+
+    ordering = ("time_created", "type_of_content", "post_id")
+    if older:
+        ordering = tuple(f"-{field}" for field in ordering)
+
+    # Une ligne de plus que la taille de page indique s'il reste une page
+    return rows.order_by(*ordering)[: size + 1]
+
+
+def get_feed_page(user, cursor=None, older=True, size=None, authors=None):
+    """Retourne une ``FeedPage`` du flux de ``user``.
+
+    Args:
+        user: L'utilisateur dont on construit le flux.
+        cursor: Curseur opaque de départ (None pour la première page).
+        older: Lire vers les publications plus anciennes que ``cursor``
+            (True) ou plus récentes (False).
+        size: Nombre de publications par page (``FEED_PAGE_SIZE`` par
+            défaut).
+        authors: Auteurs lus en mode « pull », s'ils sont déjà connus.
+
+    Raises:
+        ValueError: Si le curseur est invalide.
+    """
+
+    size = size or settings.FEED_PAGE_SIZE
+    key = decode_cursor(cursor) if cursor else None
+
+    rows = list(feed_rows_queryset(user, key, older, size, authors))
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if not older:
+        rows.reverse()
+
+    older_cursor = newer_cursor = None
+    if rows:
+        first_time, first_pk, first_kind = rows[0]
+        last_time, last_pk, last_kind = rows[-1]
+        if has_more or not older:
+            older_cursor = encode_cursor(last_time, last_kind, last_pk)
+        if key is not None and (older or has_more):
+            newer_cursor = encode_cursor(first_time, first_kind, first_pk)
+
+    return FeedPage(_hydrate(rows), older_cursor, newer_cursor)
+
+
+# Matérialisation du flux (« fan-out on write »)
+
+
+def _audience(author_id, *extra_ids):
+    """Retourne les propriétaires de flux d'une publication de l'auteur :
+    l'auteur, ``extra_ids`` et ses abonnés, sauf si l'auteur est lu en mode
+    « pull »."""
+
+    owners = {author_id, *extra_ids}
+    followers = UserFollows.objects.filter(followed_user_id=author_id)
+    if followers.count() < settings.FEED_FANOUT_LIMIT:
+        owners.update(followers.values_list("user_id", flat=True))
+    return owners
+
+
+def _write_entries(owner_ids, post, author_id):
+    """Insère ``post`` dans le flux de chaque propriétaire, par lots."""
+
+    content_type = ContentType.objects.get_for_model(post)
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                owner_id=owner_id,
+                author_id=author_id,
+                content_type=content_type,
+                object_id=post.pk,
+                time_created=post.time_created,
+            )
+            for owner_id in owner_ids
+        ),
+        batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_post(post):
+    """Retire ``post`` de tous les flux."""
+
+    FeedEntry.objects.filter(
+        content_type=ContentType.objects.get_for_model(post),
+        object_id=post.pk,
+    ).delete()
+
+
+@transaction.atomic
+def fan_out_review(review):
+    """Publie une critique dans les flux et retire son billet, désormais
+    critiqué, des flux où il apparaissait."""
+
+    ticket = review.ticket
+    _write_entries(
+        _audience(review.user_id, ticket.user_id), review, review.user_id)
+    remove_post(ticket)
+
+
+@transaction.atomic
+def fan_out_ticket(ticket):
+    """Publie un billet sans critique dans les flux."""
+
+    if ticket.review_count == 0:
+        _write_entries(_audience(ticket.user_id), ticket, ticket.user_id)
+
+
+@transaction.atomic
+def retract_review(review):
+    """Retire une critique supprimée des flux ; si son billet n'a plus de
+    critique, il réapparaît dans les flux."""
+
+    remove_post(review)
+    ticket = Ticket.objects.filter(pk=review.ticket_id).first()
+    if ticket is not None:
+        fan_out_ticket(ticket)
+
+
+@transaction.atomic
+def move_review(review, previous_ticket_id):
+    """Met à jour les flux après le déplacement d'une critique vers un
+    autre billet ; l'ancien billet peut redevenir sans critique."""
+
+    remove_post(review)
+    fan_out_review(review)
+    previous = Ticket.objects.filter(pk=previous_ticket_id).first()
+    if previous is not None:
+        fan_out_ticket(previous)
+
+
+def _author_entries(owner_id, author_id):
+    """Construit les entrées des publications de l'auteur visibles par un
+    abonné : ses critiques et ses billets sans critique."""
+
+    review_type = ContentType.objects.get_for_model(Review)
+    ticket_type = ContentType.objects.get_for_model(Ticket)
+    reviews = Review.objects.filter(user_id=author_id).values_list(
+        "pk", "time_created")
+    tickets = Ticket.objects.filter(
+        user_id=author_id, review_count=0
+    ).values_list("pk", "time_created")
+
+    for content_type, rows in ((review_type, reviews), (ticket_type, tickets)):
+        for pk, time_created in rows.iterator(
+                chunk_size=settings.FEED_FANOUT_BATCH_SIZE):
+            yield FeedEntry(
+                owner_id=owner_id,
+                author_id=author_id,
+                content_type=content_type,
+                object_id=pk,
+                time_created=time_created,
+            )
+
+
+@transaction.atomic
+def fan_in(owner_ids, author_id):
+    """Recopie les publications de l'auteur dans le flux de nouveaux
+    abonnés, sauf si l'auteur est lu en mode « pull »."""
+
+    if (UserFollows.objects.filter(followed_user_id=author_id).count()
+            >= settings.FEED_FANOUT_LIMIT):
+        return
+
+    for owner_id in owner_ids:
+        FeedEntry.objects.bulk_create(
+            _author_entries(owner_id, author_id),
+            batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+@transaction.atomic
+def fan_out_unfollow(owner_id, author_id):
+    """Retire les publications de l'auteur du flux d'un ancien abonné, à
+    l'exception des critiques portant sur les billets de celui-ci."""
+
+    FeedEntry.objects.filter(owner_id=owner_id, author_id=author_id).exclude(
+        content_type=ContentType.objects.get_for_model(Review),
+        object_id__in=Review.objects.filter(
+            user_id=author_id, ticket__user_id=owner_id
+        ).values("pk"),
+    ).delete()
+
+    # L'auteur repasse sous le seuil du mode « pull » : ses abonnés
+    # récupèrent ses publications dans leur flux matérialisé
+    followers = UserFollows.objects.filter(followed_user_id=author_id)
+    if followers.count() == settings.FEED_FANOUT_LIMIT - 1:
+        fan_in(followers.values_list("user_id", flat=True), author_id)
+
+
+def rebuild_feed(user):
+    """Reconstruit entièrement le flux matérialisé de ``user``.
+
+    Returns:
+        int: Le nombre d'entrées écrites.
+    """
+
+    authors = pull_authors(user)
+    reviews, tickets = feed_querysets(user)
+    # Les critiques des billets de l'utilisateur sont toujours écrites,
+    # comme par fan_out_review : elles restent dans le flux s'il cesse de
+    # suivre leur auteur
+    reviews = reviews.exclude(Q(user__in=authors) & ~Q(ticket__user=user))
+    tickets = tickets.exclude(user__in=authors)
+    written = 0
+
+    with transaction.atomic():
+        FeedEntry.objects.filter(owner=user).delete()
+        for model, queryset in ((Review, reviews), (Ticket, tickets)):
+            content_type = ContentType.objects.get_for_model(model)
+            rows = queryset.values_list(
+                "pk", "user_id", "time_created"
+            ).iterator(chunk_size=settings.FEED_FANOUT_BATCH_SIZE)
+            written += len(FeedEntry.objects.bulk_create(
+                (
+                    FeedEntry(
+                        owner=user,
+                        author_id=author_id,
+                        content_type=content_type,
+                        object_id=pk,
+                        time_created=time_created,
+                    )
+                    for pk, author_id, time_created in rows
+                ),
+                batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+            ))
+    return written
+
+
+# Colonnes écrites par ``_insert_entries``, dans l'ordre du SELECT
+ENTRY_FIELDS = ("owner", "author", "content_type", "object_id",
+                "time_created")
+
+
+def _insert_entries(queryset, owner, content_type, using):
+    """Copie les publications de ``queryset`` dans ``FeedEntry`` par un
+    seul ``INSERT … SELECT`` exécuté par la base, sans charger de ligne en
+    Python. ``owner`` désigne le propriétaire du flux (un chemin de champ
+    de ``queryset``) ; les entrées déjà présentes sont ignorées.
+
+    Returns:
+        int: Le nombre d'entrées écrites.
+    """
+
+    connection = connections[using]
+    # Uniquement des annotations : le SELECT suit leur ordre
+    rows = (
+        queryset.using(using)
+        .order_by()
+        .annotate(
+            entry_owner=F(owner),
+            entry_author=F("user_id"),
+            entry_type=Value(content_type.pk),
+            entry_object=F("pk"),
+            entry_time=F("time_created"),
+        )
+        .values("entry_owner", "entry_author", "entry_type", "entry_object",
+                "entry_time")
+    )
+    sql, params = rows.query.sql_with_params()
+
+    fields = [FeedEntry._meta.get_field(name) for name in ENTRY_FIELDS]
+    unique_fields = [FeedEntry._meta.get_field(name)
+                     for name in ("owner", "content_type", "object_id")]
+    columns = ", ".join(
+        connection.ops.quote_name(field.column) for field in fields)
+    insert = connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)
+    suffix = connection.ops.on_conflict_suffix_sql(
+        fields, OnConflict.IGNORE, None, unique_fields)
+    table = connection.ops.quote_name(FeedEntry._meta.db_table)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"{insert} {table} ({columns}) {sql} {suffix}", params)
+        return cursor.rowcount
+
+
+def rebuild_feeds_in_bulk(first_id, last_id):
+    """Reconstruit les flux des utilisateurs d'identifiant compris entre
+    ``first_id`` et ``last_id``, par des ``INSERT … SELECT`` (une requête
+    par branche de ``feed_querysets`` pour toute la tranche).
+
+    Le contenu est celui de ``rebuild_feed`` ; les auteurs lus en mode
+    « pull » sont comptés par la base plutôt que lus dans l'index en
+    mémoire. Ils ne sont exclus que de la branche des utilisateurs suivis :
+    les critiques des billets du propriétaire sont toujours écrites.
+
+    Returns:
+        int: Le nombre d'entrées écrites.
+    """
+
+    owners = (first_id, last_id)
+    authors = list(
+        UserFollows.objects.values("followed_user")
+        .annotate(followers=Count("pk"))
+        .filter(followers__gte=settings.FEED_FANOUT_LIMIT)
+        .values_list("followed_user", flat=True)
+    )
+    review_type = ContentType.objects.get_for_model(Review)
+    ticket_type = ContentType.objects.get_for_model(Ticket)
+    tickets = Ticket.objects.filter(review_count=0)
+
+    branches = [
+        # Publications des utilisateurs suivis, hors mode « pull »
+        (Review.objects.filter(user__followed_by__user__id__range=owners)
+         .exclude(user__in=authors),
+         "user__followed_by__user", review_type),
+        (tickets.filter(user__followed_by__user__id__range=owners)
+         .exclude(user__in=authors),
+         "user__followed_by__user", ticket_type),
+        # Publications de l'utilisateur
+        (Review.objects.filter(user__id__range=owners), "user", review_type),
+        (tickets.filter(user__id__range=owners), "user", ticket_type),
+        # Critiques de ses billets, quel que soit leur auteur
+        (Review.objects.filter(ticket__user__id__range=owners),
+         "ticket__user", review_type),
+    ]
+
+    using = router.db_for_write(FeedEntry)
+    with transaction.atomic(using=using):
+        FeedEntry.objects.using(using).filter(
+            owner__id__range=owners).delete()
+        return sum(
+            _insert_entries(queryset, owner, content_type, using)
+            for queryset, owner, content_type in branches
+        )
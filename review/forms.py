@@ -1,5 +1,7 @@
 from django import forms
+from django.conf import settings
 
+from .imaging import ImageTooLarge, check_dimensions, check_file_size
 from .models import Ticket, Review
 
 
@@ -8,6 +10,22 @@ class TicketForm(forms.ModelForm):
         model = Ticket
         fields = ("title", "description", "image")
 
+    # Refus des images trop lourdes d'après leur taille et leur en-tête,
+    # avant tout décodage des pixels
+    def clean_image(self):
+        image = self.cleaned_data["image"]
+
+        # Seul un nouvel envoi porte l'en-tête lu par Pillow (image.image)
+        header = getattr(image, "image", None)
+        if header is not None:
+            try:
+                check_file_size(image.size, settings.IMAGE_MAX_UPLOAD_SIZE)
+                check_dimensions(header.size, settings.IMAGE_MAX_PIXELS)
+            except ImageTooLarge as error:
+                raise forms.ValidationError(str(error))
+
+        return image
+
 
 class ReviewForm(forms.ModelForm):
     class Meta:
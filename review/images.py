@@ -0,0 +1,227 @@
+"""Traitement des images des billets en dehors du cycle de la requête.
+
+Les images envoyées sont déclinées en plusieurs tailles et formats par un
+pool de travailleurs du processus (threads ou processus selon
+``IMAGE_PROCESSING``), une fois la transaction validée. L'original est
+conservé, ce qui permet de produire de nouvelles déclinaisons plus tard.
+Le billet reste à l'état « pending » jusqu'à la fin du traitement, ce qui
+permet aux gabarits d'afficher une image d'attente. En mode ``sync``
+(tests), le traitement est exécuté immédiatement. Une image déjà traitée
+pour un autre billet n'est pas traitée à nouveau. Une image restée
+« pending » après l'arrêt de son processus est traitée à nouveau par la
+commande ``requeue_images``.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from pilkit.processors import ResizeToFit
+
+from . import feed_cache
+from .imaging import ImageTooLarge, decode_image
+from .models import Ticket
+
+logger = logging.getLogger(__name__)
+
+# Déclinaisons produites pour chaque image : taille maximale (largeur,
+# hauteur), sans agrandissement
+RENDITION_SIZES = {
+    "thumb": (120, 180),
+    "card": (250, 375),
+    "card_2x": (500, 750),
+}
+
+# Formats de chaque déclinaison : extension -> (format Pillow, options)
+RENDITION_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _save_rendition(img, image_format, options, extension):
+    """Enregistre ``img`` sous un nom dérivé de son contenu.
+
+    Le nom change dès que le contenu change : les fichiers peuvent être mis
+    en cache indéfiniment par les navigateurs.
+    """
+
+    buffer = io.BytesIO()
+    img.save(buffer, image_format, **options)
+    content = buffer.getvalue()
+
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    name = f"renditions/{digest[:2]}/{digest}.{extension}"
+    if default_storage.exists(name):
+        # Fichier réutilisé : sa date est rafraîchie pour que gc_media ne le
+        # supprime pas avant que le billet ne le référence (gc_media ne
+        # parcourt que MEDIA_ROOT, donc les stockages qui ont un chemin local)
+        try:
+            path = default_storage.path(name)
+        except NotImplementedError:
+            pass
+        else:
+            os.utime(path)
+    else:
+        name = default_storage.save(name, ContentFile(content))
+    return name
+
+
+def make_renditions(path, max_pixels, max_bytes):
+    """Produit les déclinaisons de l'image originale ``path``.
+
+    Exécutée dans un travailleur : cette fonction n'accède pas à la base.
+    L'original est décodé une seule fois, à la taille de la plus grande
+    déclinaison (voir ``review.imaging``).
+
+    Returns:
+        dict: Les déclinaisons, au format de ``Ticket.renditions``.
+
+    Raises:
+        ImageTooLarge: Si l'image dépasse les limites configurées.
+    """
+
+    largest = max(RENDITION_SIZES.values())
+    original = decode_image(path, largest, max_pixels, max_bytes)
+
+    renditions = {}
+    for label, (width, height) in RENDITION_SIZES.items():
+        img = ResizeToFit(width, height, upscale=False).process(original)
+        rendition = {"width": img.width, "height": img.height}
+        for extension, (image_format, options) in RENDITION_FORMATS.items():
+            rendition[extension] = _save_rendition(
+                img, image_format, options, extension)
+        renditions[label] = rendition
+    return renditions
+
+
+def _get_executor():
+    """Crée, au premier appel, le pool de travailleurs du processus."""
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if settings.IMAGE_PROCESSING == "process":
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS)
+            else:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS,
+                    thread_name_prefix="ticket-image",
+                )
+        return _executor
+
+
+def _finish(ticket_id, name, renditions=None, error=None):
+    """Enregistre le résultat du traitement de l'image ``name``."""
+
+    state = Ticket.ImageState.READY
+    if error is not None:
+        logger.error("Processing of %s failed", name, exc_info=error)
+        state = Ticket.ImageState.FAILED
+
+    # L'image a pu être remplacée entre-temps : seul le traitement de
+    # l'image courante met à jour le billet
+    if Ticket.objects.filter(pk=ticket_id, image=name).update(
+            image_state=state, renditions=renditions or {}):
+        feed_cache.invalidate_ticket(ticket_id)
+
+
+def _done(ticket_id, name, future):
+    """Rappel exécuté à la fin d'un traitement en arrière-plan."""
+
+    close_old_connections()
+    try:
+        error = future.exception()
+        _finish(ticket_id, name,
+                renditions=None if error else future.result(), error=error)
+    finally:
+        close_old_connections()
+
+
+def _submit(ticket_id, name, path):
+    future = _get_executor().submit(
+        make_renditions, path, settings.IMAGE_MAX_PIXELS,
+        settings.IMAGE_MAX_UPLOAD_SIZE,
+    )
+    future.add_done_callback(
+        lambda future: _done(ticket_id, name, future))
+
+
+def _reusable_renditions(ticket_id, name):
+    """Retourne les déclinaisons d'une image identique déjà traitée pour
+    un autre billet (même contenu, donc même nom, voir review.storage)."""
+
+    return (
+        Ticket.objects.filter(
+            image=name, image_state=Ticket.ImageState.READY)
+        .exclude(pk=ticket_id)
+        .exclude(renditions={})
+        .values_list("renditions", flat=True)
+        .first()
+    )
+
+
+def process_renditions(ticket_id, name, path):
+    """Traite immédiatement l'image ``name`` du billet ``ticket_id`` et
+    enregistre le résultat (« ready » ou « failed »)."""
+
+    renditions = _reusable_renditions(ticket_id, name)
+    if not renditions:
+        try:
+            renditions = make_renditions(
+                path, settings.IMAGE_MAX_PIXELS,
+                settings.IMAGE_MAX_UPLOAD_SIZE,
+            )
+        except (OSError, ImageTooLarge) as error:
+            _finish(ticket_id, name, error=error)
+            return
+    _finish(ticket_id, name, renditions=renditions)
+
+
+def schedule_renditions(ticket):
+    """Programme le traitement de l'image du billet après la validation de
+    la transaction en cours."""
+
+    ticket_id, name, path = ticket.pk, ticket.image.name, ticket.image.path
+
+    if settings.IMAGE_PROCESSING == "sync":
+        process_renditions(ticket_id, name, path)
+        return
+
+    renditions = _reusable_renditions(ticket_id, name)
+    if renditions:
+        _finish(ticket_id, name, renditions=renditions)
+        return
+
+    transaction.on_commit(lambda: _submit(ticket_id, name, path))
+
+
+def stale_pending_tickets(max_age):
+    """Retourne les billets dont l'image attend son traitement depuis plus
+    de ``max_age`` (un ``timedelta``).
+
+    Le pool de travailleurs est propre au processus : une image dont le
+    processus s'est arrêté avant la fin du traitement reste « pending ».
+    """
+
+    return (
+        Ticket.objects.filter(image_state=Ticket.ImageState.PENDING)
+        .exclude(image="").exclude(image__isnull=True)
+        .filter(
+            Q(image_queued_at__lt=timezone.now() - max_age)
+            # Billets mis en attente avant l'ajout de la date
+            | Q(image_queued_at__isnull=True))
+    )
@@ -0,0 +1,88 @@
+"""Décodage des images envoyées, à mémoire bornée.
+
+Ce module ne dépend que de Pillow (il est utilisé dans les travailleurs du
+pool d'images et par le banc de mesure ``bench_image_decode``).
+
+Une image JPEG de 50 mégapixels occupe environ 150 Mo une fois décodée. Le
+décodage est donc précédé de contrôles sur l'en-tête (taille du fichier,
+nombre de pixels) et, pour le JPEG, réduit dès la lecture grâce au mode
+« draft » de Pillow, qui décode directement à 1/2, 1/4 ou 1/8 de la taille.
+"""
+
+import os
+
+from PIL import Image, ImageOps
+
+# Orientations EXIF qui échangent largeur et hauteur
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+_ORIENTATION_TAG = 0x0112
+
+
+class ImageTooLarge(ValueError):
+    """L'image dépasse la taille de fichier ou le nombre de pixels autorisé."""
+
+
+def check_file_size(size, max_bytes):
+    """Vérifie qu'un fichier de ``size`` octets ne dépasse pas la limite.
+
+    Raises:
+        ImageTooLarge: Si le fichier est trop volumineux.
+    """
+
+    if max_bytes and size > max_bytes:
+        raise ImageTooLarge(
+            f"The file is too large ({size} bytes, "
+            f"maximum {max_bytes} bytes)."
+        )
+
+
+def check_dimensions(dimensions, max_pixels):
+    """Vérifie que des dimensions ``(largeur, hauteur)`` ne dépassent pas
+    ``max_pixels`` (protection contre les « bombes de décompression »).
+
+    Raises:
+        ImageTooLarge: Si l'image a trop de pixels.
+    """
+
+    width, height = dimensions
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLarge(
+            f"The image is too large ({width}x{height} pixels, "
+            f"maximum {max_pixels} pixels)."
+        )
+
+
+def decode_image(path, target_size, max_pixels, max_bytes=None):
+    """Décode l'image ``path`` en RGB, orientée selon ses données EXIF, à une
+    taille au moins égale à ``target_size`` lorsque le format le permet.
+
+    Les limites sont vérifiées sur l'en-tête, avant tout décodage.
+
+    Raises:
+        ImageTooLarge: Si l'image dépasse ``max_bytes`` ou ``max_pixels``.
+        OSError: Si le fichier n'est pas une image valide.
+    """
+
+    check_file_size(os.path.getsize(path), max_bytes)
+
+    try:
+        img = Image.open(path)
+    except Image.DecompressionBombError as error:
+        # Au-delà du double de sa propre limite, Pillow refuse l'image dès
+        # la lecture de l'en-tête
+        raise ImageTooLarge(str(error)) from error
+
+    with img:
+        check_dimensions(img.size, max_pixels)
+
+        if img.format == "JPEG":
+            # Taille demandée dans le sens de stockage de l'image
+            width, height = target_size
+            if img.getexif().get(_ORIENTATION_TAG) in _TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+            img.draft("RGB", (width, height))
+
+        decoded = ImageOps.exif_transpose(img)
+        if decoded.mode != "RGB":
+            decoded = decoded.convert("RGB")
+        return decoded
@@ -0,0 +1,110 @@
+import math
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from review.imaging import ImageTooLarge, decode_image
+
+# Taille de décodage demandée au pipeline (plus grande déclinaison)
+TARGET_SIZE = (500, 750)
+
+
+def _memory_kb():
+    """Retourne ``(mémoire résidente, pic de mémoire résidente)`` du
+    processus, en kilo-octets.
+
+    Sous Linux, le pic est lu dans ``/proc/self/status`` (VmHWM) : à la
+    différence de ``ru_maxrss``, il n'hérite pas du processus parent.
+    """
+
+    try:
+        with open("/proc/self/status") as status:
+            values = dict(
+                line.split(":", 1) for line in status if ":" in line)
+        return (int(values["VmRSS"].split()[0]),
+                int(values["VmHWM"].split()[0]))
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak, peak
+
+
+def _measure(path, mode, max_pixels, max_bytes):
+    """Décode ``path`` dans un processus neuf et retourne
+    ``(pic de mémoire supplémentaire en Mo, durée en s, statut)``."""
+
+    before, _ = _memory_kb()
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        if mode == "full":
+            # Décodage complet, comme Image.open(...).convert() sans draft
+            with Image.open(path) as img:
+                img.convert("RGB")
+        else:
+            decode_image(path, TARGET_SIZE, max_pixels, max_bytes)
+    except ImageTooLarge:
+        status = "rejected"
+    elapsed = time.perf_counter() - start
+    _, peak = _memory_kb()
+    return max(peak - before, 0) / 1024, elapsed, status
+
+
+def _make_jpeg(directory, megapixels):
+    """Crée une image JPEG portrait (2:3) de ``megapixels`` mégapixels."""
+
+    width = int(math.sqrt(megapixels * 1_000_000 * 2 / 3))
+    height = int(width * 3 / 2)
+    path = os.path.join(directory, f"{megapixels}mp.jpg")
+    gradient = Image.linear_gradient("L").resize((width, height))
+    Image.merge("RGB", (gradient, gradient.transpose(
+        Image.Transpose.FLIP_TOP_BOTTOM), gradient)).save(
+            path, "JPEG", quality=90)
+    return path
+
+
+class Command(BaseCommand):
+    """Mesure le pic de mémoire du décodage des images envoyées, avec et
+    sans le pipeline à mémoire bornée (``review.imaging``).
+
+    Chaque décodage a lieu dans un processus neuf, pour que le pic mesuré
+    ne concerne que lui.
+    """
+
+    help = "Report peak RSS per upload size for full and bounded decoding."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--megapixels", type=int, nargs="+", default=[2, 12, 24, 50],
+            help="Image sizes to test, in megapixels "
+                 "(default: 2 12 24 50).",
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context("spawn")
+        limits = (settings.IMAGE_MAX_PIXELS, settings.IMAGE_MAX_UPLOAD_SIZE)
+
+        self.stdout.write(
+            f"{'MP':>4} {'file (MB)':>10} {'full (MB)':>10} {'time (s)':>9} "
+            f"{'bounded (MB)':>13} {'time (s)':>9}  status"
+        )
+        with tempfile.TemporaryDirectory() as directory, \
+                context.Pool(processes=1, maxtasksperchild=1) as pool:
+            for megapixels in options["megapixels"]:
+                path = _make_jpeg(directory, megapixels)
+                full_mb, full_time, _ = pool.apply(
+                    _measure, (path, "full", *limits))
+                bounded_mb, bounded_time, status = pool.apply(
+                    _measure, (path, "bounded", *limits))
+
+                self.stdout.write(
+                    f"{megapixels:>4} "
+                    f"{os.path.getsize(path) / 1024 / 1024:>10.1f} "
+                    f"{full_mb:>10.1f} {full_time:>9.3f} "
+                    f"{bounded_mb:>13.1f} {bounded_time:>9.3f}  {status}"
+                )
@@ -0,0 +1,149 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from authentification.models import User
+from review.models import Review, Ticket
+from review.search import search
+
+# Vocabulaire du corpus généré
+WORDS = (
+    "roman policier fantastique histoire amour guerre paix voyage mer "
+    "montagne enfance mémoires poésie fleurs mal geisha trône verre dieu "
+    "étoiles egypte trilogie prince sang portrait femme suspense enquête "
+    "dragon royaume secret lettre jardin hiver été nuit lumière ombre "
+    "philosophie science ville campagne famille exil révolution empire"
+).split()
+
+SYLLABLES = (
+    "ba be bi bo ca ce da de fa fi la le li lo ma me mi na ne ni "
+    "pa pe po ra re ri ro sa se si ta te ti to va ve vi"
+).split()
+
+QUERIES = (
+    "geisha", "trône verre", "mémoires", "prin", "nuit lumière", "absent",
+)
+
+
+def _vocabulary(rng, size):
+    """Retourne ``size`` mots (ceux de ``WORDS`` puis des mots inventés) et
+    leurs poids cumulés, selon une loi de Zipf : quelques mots sont très
+    fréquents, la plupart sont rares."""
+
+    words = list(WORDS)
+    while len(words) < size:
+        words.append("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    rng.shuffle(words)
+
+    weights, total = [], 0
+    for rank in range(1, size + 1):
+        total += 1 / rank
+        weights.append(total)
+    return words, weights
+
+
+def _sentence(rng, vocabulary, size):
+    words, weights = vocabulary
+    words = rng.choices(words, cum_weights=weights, k=size)
+    return " ".join(words).capitalize()
+
+
+class Command(BaseCommand):
+    """Compare la recherche plein texte (``review.search``) à une recherche
+    ``icontains`` sur un corpus généré.
+
+    Le corpus est créé dans une transaction annulée à la fin de la mesure :
+    la base n'est pas modifiée.
+    """
+
+    help = "Benchmark full-text search against icontains on a seeded corpus."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tickets", type=int, default=20000,
+            help="Number of tickets generated (default: 20000).",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20,
+            help="Number of runs per query (default: 20).",
+        )
+        parser.add_argument(
+            "--vocabulary", type=int, default=20000,
+            help="Number of distinct words in the corpus (default: 20000).",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            vocabulary = _vocabulary(rng, options["vocabulary"])
+            self.seed(rng, vocabulary, options["tickets"])
+            self.stdout.write(
+                f"{'query':<15} {'fts (ms)':>9} {'icontains (ms)':>15}")
+            for query in QUERIES:
+                fts = self.measure(
+                    lambda: search(query), options["repeat"])
+                naive = self.measure(
+                    lambda: self.icontains(query), options["repeat"])
+                self.stdout.write(
+                    f"{query:<15} {fts:>9.2f} {naive:>15.2f}")
+            transaction.set_rollback(True)
+
+    def seed(self, rng, vocabulary, total):
+        """Crée ``total`` billets et autant de critiques (l'index de
+        recherche est alimenté par les déclencheurs de la base)."""
+
+        user = User.objects.create(username=f"bench_search_{rng.random()}")
+        tickets = Ticket.objects.bulk_create(
+            [
+                Ticket(
+                    title=_sentence(rng, vocabulary, 3),
+                    description=_sentence(rng, vocabulary, 40),
+                    user=user,
+                )
+                for _ in range(total)
+            ],
+            batch_size=1000,
+        )
+        Review.objects.bulk_create(
+            [
+                Review(
+                    ticket=ticket, rating=rng.randint(0, 5),
+                    headline=_sentence(rng, vocabulary, 4),
+                    body=_sentence(rng, vocabulary, 60),
+                    user=user,
+                )
+                for ticket in tickets
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(f"{total} tickets and {total} reviews generated.")
+
+    @staticmethod
+    def icontains(query):
+        """Recherche naïve équivalente : chaque mot dans un titre ou un
+        texte, sans classement."""
+
+        tickets = Ticket.objects.all()
+        reviews = Review.objects.all()
+        for word in query.split():
+            tickets = tickets.filter(
+                Q(title__icontains=word) | Q(description__icontains=word))
+            reviews = reviews.filter(
+                Q(headline__icontains=word) | Q(body__icontains=word))
+        return list(tickets[:20]) + list(reviews[:20])
+
+    @staticmethod
+    def measure(function, repeat):
+        """Retourne la durée médiane de ``function``, en millisecondes."""
+
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            durations.append((time.perf_counter() - start) * 1000)
+        return statistics.median(durations)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from review import feed_cache
+
+
+class Command(BaseCommand):
+    """Affiche les compteurs de succès et d'échecs du cache des flux.
+
+    Les compteurs sont stockés dans le cache : avec ``LocMemCache``, ils
+    sont propres à chaque processus et ne sont pas visibles d'ici.
+    """
+
+    help = "Show the hit/miss counters of the feed cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true",
+            help="Reset the counters after displaying them.",
+        )
+
+    def handle(self, *args, **options):
+        counters = feed_cache.stats()
+        total = counters["hits"] + counters["misses"]
+        ratio = counters["hits"] / total if total else 0
+
+        self.stdout.write(
+            f"hits: {counters['hits']}\n"
+            f"misses: {counters['misses']}\n"
+            f"hit ratio: {ratio:.1%}"
+        )
+
+        if options["reset"]:
+            feed_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,147 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from review.models import ImageBlob, Ticket
+
+# Dossiers de MEDIA_ROOT où sont rangées les images des billets et leurs
+# déclinaisons (voir review.storage et review.images)
+MEDIA_DIRECTORIES = ("images", "renditions")
+
+
+def referenced_names(chunk_size):
+    """Retourne l'ensemble des fichiers référencés par la base : images des
+    billets, déclinaisons et fichiers dont un ``ImageBlob`` compte encore
+    des références (envoi en cours d'enregistrement)."""
+
+    names = set()
+    tickets = Ticket.objects.exclude(image="").exclude(image__isnull=True)
+    names.update(
+        tickets.values_list("image", flat=True).iterator(
+            chunk_size=chunk_size))
+
+    renditions = Ticket.objects.exclude(renditions={})
+    for ticket_renditions in renditions.values_list(
+            "renditions", flat=True).iterator(chunk_size=chunk_size):
+        for rendition in ticket_renditions.values():
+            names.update(
+                value for value in rendition.values()
+                if isinstance(value, str))
+
+    names.update(
+        ImageBlob.objects.filter(ref_count__gt=0)
+        .values_list("name", flat=True).iterator(chunk_size=chunk_size))
+    return names
+
+
+def scan_files(root, directory):
+    """Parcourt ``root/directory`` avec ``os.scandir`` et produit, pour
+    chaque fichier, ``(nom relatif à root, os.stat_result)``."""
+
+    pending = [os.path.join(root, directory)]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    name = os.path.relpath(entry.path, root)
+                    yield name.replace(os.sep, "/"), entry.stat()
+
+
+class Command(BaseCommand):
+    """Supprime les fichiers de ``MEDIA_ROOT`` (images des billets et
+    déclinaisons) qui ne sont plus référencés par aucun billet.
+
+    Seuls les fichiers plus anciens que le délai de grâce sont supprimés,
+    pour épargner les envois et les traitements en cours.
+    """
+
+    help = "Delete unreferenced ticket images and renditions from MEDIA_ROOT."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours", type=float, default=24,
+            help="Only delete files older than this (default: 24).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Number of files deleted per transaction (default: 500).",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Report what would be deleted without deleting anything.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        self.dry_run = options["dry_run"]
+        self.cutoff = time.time() - options["grace_hours"] * 3600
+
+        referenced = referenced_names(batch_size)
+        self.stdout.write(f"{len(referenced)} referenced files.")
+
+        self.deleted = self.reclaimed = scanned = 0
+        batch = []
+        for directory in MEDIA_DIRECTORIES:
+            for name, stat in scan_files(settings.MEDIA_ROOT, directory):
+                scanned += 1
+                if name in referenced or stat.st_mtime > self.cutoff:
+                    continue
+                batch.append(name)
+                if len(batch) >= batch_size:
+                    self.delete_batch(batch)
+                    batch = []
+        if batch:
+            self.delete_batch(batch)
+
+        action = "would be deleted" if self.dry_run else "deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{scanned} files scanned, {self.deleted} {action}, "
+            f"{self.reclaimed} bytes "
+            f"({self.reclaimed / 1024 / 1024:.1f} MB) reclaimed."
+        ))
+
+    def delete_batch(self, names):
+        """Supprime les fichiers ``names``, en verrouillant leurs
+        ``ImageBlob`` pour ne pas supprimer un fichier qu'un envoi
+        concurrent vient de réutiliser."""
+
+        with transaction.atomic():
+            blobs = dict(
+                ImageBlob.objects.select_for_update()
+                .filter(name__in=names)
+                .values_list("name", "ref_count")
+            )
+            deleted = []
+            for name in names:
+                if blobs.get(name, 0) > 0:
+                    continue
+                path = os.path.join(settings.MEDIA_ROOT, name)
+                try:
+                    stat = os.stat(path)
+                    # Réutilisé depuis le parcours
+                    if stat.st_mtime > self.cutoff:
+                        continue
+                    if not self.dry_run:
+                        os.remove(path)
+                except FileNotFoundError:
+                    continue
+                deleted.append(name)
+                self.reclaimed += stat.st_size
+
+            if not self.dry_run:
+                ImageBlob.objects.filter(
+                    name__in=deleted, ref_count=0).delete()
+
+        self.deleted += len(deleted)
+        self.stdout.write(
+            f"{self.deleted} files {'found' if self.dry_run else 'deleted'}"
+            "...")
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+
+from authentification.models import User
+from review.feeds import rebuild_feed, rebuild_feeds_in_bulk
+
+
+class Command(BaseCommand):
+    """Reconstruit les flux matérialisés (FeedEntry) des utilisateurs.
+
+    À lancer après la migration qui crée la table, ou pour réparer des flux
+    après un changement de ``FEED_FANOUT_LIMIT``. Sans nom d'utilisateur,
+    les flux sont reconstruits par tranches d'identifiants, en quelques
+    ``INSERT … SELECT`` par tranche (voir ``rebuild_feeds_in_bulk``).
+    """
+
+    help = "Rebuild the materialized feed of every user, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames", nargs="*",
+            help="Only rebuild the feeds of these users.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Number of users loaded per query (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        if options["usernames"]:
+            total_users, total_entries = self.rebuild_users(
+                options["usernames"], options["batch_size"])
+        else:
+            total_users, total_entries = self.rebuild_all(
+                options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total_users} feeds rebuilt, {total_entries} entries written."
+        ))
+
+    def rebuild_users(self, usernames, batch_size):
+        users = User.objects.filter(username__in=usernames).order_by("pk")
+        total_users = total_entries = 0
+        for user in users.iterator(chunk_size=batch_size):
+            total_entries += rebuild_feed(user)
+            total_users += 1
+        return total_users, total_entries
+
+    def rebuild_all(self, batch_size):
+        user_ids = User.objects.order_by("pk").values_list("pk", flat=True)
+        total_users = total_entries = 0
+        batch = []
+        for user_id in user_ids.iterator(chunk_size=batch_size):
+            batch.append(user_id)
+            if len(batch) == batch_size:
+                total_entries += rebuild_feeds_in_bulk(batch[0], batch[-1])
+                total_users += len(batch)
+                batch = []
+                self.stdout.write(f"{total_users} feeds rebuilt...")
+        if batch:
+            total_entries += rebuild_feeds_in_bulk(batch[0], batch[-1])
+            total_users += len(batch)
+        return total_users, total_entries
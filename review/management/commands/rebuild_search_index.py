@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from review.search import rebuild_index
+
+
+class Command(BaseCommand):
+    """Reconstruit l'index de recherche plein texte des billets et des
+    critiques (table FTS5 sous SQLite, index GIN sous PostgreSQL).
+
+    L'index est tenu à jour par la base elle-même ; la commande sert après
+    une restauration ou une modification directe des tables.
+    """
+
+    help = "Rebuild the full-text search index of tickets and reviews."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed = rebuild_index()
+
+        self.stdout.write(self.style.SUCCESS(f"{indexed} posts indexed."))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from review.models import Review, Ticket
+from review.ratings import FIELDS, compute_aggregates, empty_aggregates
+
+
+class Command(BaseCommand):
+    """Recalcule le nombre de critiques (``Ticket.review_count``) et les
+    agrégats des notes (``review.ratings``) de tous les billets, par
+    tranches d'identifiants."""
+
+    help = ("Recount the reviews of every ticket and repair review_count "
+            "and the rating aggregates.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=5000,
+            help="Number of ticket ids updated per transaction "
+                 "(default: 5000).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = Ticket.objects.aggregate(last=Max("pk"))["last"] or 0
+
+        repaired = 0
+        for start in range(0, last_id, batch_size):
+            with transaction.atomic():
+                repaired += self.repair(start, start + batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{repaired} tickets repaired."))
+
+    @staticmethod
+    def repair(start, end):
+        """Répare les billets d'identifiant ``start < id <= end``.
+
+        Les billets sont verrouillés pendant le calcul (sous PostgreSQL) :
+        une critique écrite en même temps attend la fin de la tranche.
+        """
+
+        tickets = list(
+            Ticket.objects.select_for_update()
+            .filter(pk__gt=start, pk__lte=end)
+            .only(*FIELDS)
+        )
+        aggregates = compute_aggregates(
+            Review.objects.filter(ticket_id__gt=start, ticket_id__lte=end))
+
+        # Seuls les billets dont un agrégat est faux sont écrits
+        wrong = []
+        for ticket in tickets:
+            expected = aggregates.get(ticket.pk) or empty_aggregates()
+            if any(getattr(ticket, field) != value
+                   for field, value in expected.items()):
+                for field, value in expected.items():
+                    setattr(ticket, field, value)
+                wrong.append(ticket)
+        Ticket.objects.bulk_update(wrong, FIELDS)
+        return len(wrong)
@@ -0,0 +1,128 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from review import feed_cache
+from review.images import make_renditions
+from review.imaging import ImageTooLarge
+from review.models import Review, Ticket
+
+
+def _process(path, max_pixels, max_bytes):
+    """Produit les déclinaisons de ``path`` dans un processus du pool.
+
+    Returns:
+        tuple: ``(déclinaisons, None)`` ou ``(None, message d'erreur)``.
+    """
+
+    try:
+        return make_renditions(path, max_pixels, max_bytes), None
+    except (OSError, ImageTooLarge) as error:
+        return None, str(error)
+
+
+class Command(BaseCommand):
+    """Produit à nouveau les déclinaisons des images de tous les billets,
+    par exemple après un changement de ``review.images.RENDITION_SIZES``.
+
+    Les images sont traitées par un pool de processus, par lots dans
+    l'ordre des identifiants ; chaque lot est écrit avec ``bulk_update``.
+    Le dernier identifiant traité est affiché après chaque lot : la commande
+    peut reprendre à partir de lui avec ``--after-id``.
+    """
+
+    help = "Regenerate the renditions of every ticket image in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=200,
+            help="Number of tickets processed and written per batch "
+                 "(default: 200).",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="Number of worker processes (default: CPU count).",
+        )
+        parser.add_argument(
+            "--after-id", type=int, default=0,
+            help="Resume after this ticket id (printed after each batch).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        tickets = (
+            Ticket.objects.filter(pk__gt=options["after_id"])
+            .exclude(image="").exclude(image__isnull=True)
+            .order_by("pk")
+            .only("pk", "user_id", "image")
+            .iterator(chunk_size=batch_size)
+        )
+
+        self.processed = self.failed = 0
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            while batch := list(islice(tickets, batch_size)):
+                self.process_batch(pool, batch)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{self.processed} images processed "
+                    f"({self.processed / elapsed:.1f} images/s), "
+                    f"last id {batch[-1].pk}..."
+                )
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.processed} images processed, {self.failed} failed, "
+            f"in {elapsed:.1f}s "
+            f"({self.processed / elapsed if elapsed else 0:.1f} images/s)."
+        ))
+
+    def process_batch(self, pool, batch):
+        # Les billets qui partagent une image (même contenu, voir
+        # review.storage) ne la font traiter qu'une fois
+        names = list(dict.fromkeys(ticket.image.name for ticket in batch))
+        paths = [Ticket.image.field.storage.path(name) for name in names]
+        results = dict(zip(names, pool.map(
+            _process, paths,
+            repeat(settings.IMAGE_MAX_PIXELS),
+            repeat(settings.IMAGE_MAX_UPLOAD_SIZE),
+        )))
+
+        updated = []
+        for ticket in batch:
+            renditions, error = results[ticket.image.name]
+            if error is not None:
+                self.stderr.write(f"Ticket {ticket.pk}: {error}")
+                self.failed += 1
+                continue
+            ticket.renditions = renditions
+            ticket.image_state = Ticket.ImageState.READY
+            updated.append(ticket)
+
+        with transaction.atomic():
+            # Une image remplacée pendant le traitement est laissée au
+            # traitement de la nouvelle image
+            current = dict(
+                Ticket.objects.filter(pk__in=[t.pk for t in updated])
+                .values_list("pk", "image")
+            )
+            updated = [
+                ticket for ticket in updated
+                if current.get(ticket.pk) == ticket.image.name
+            ]
+            Ticket.objects.bulk_update(
+                updated, ["renditions", "image_state"])
+
+            ticket_ids = [ticket.pk for ticket in updated]
+            feed_cache.invalidate_authors({
+                *(ticket.user_id for ticket in updated),
+                *Review.objects.filter(ticket_id__in=ticket_ids)
+                .values_list("user_id", flat=True),
+            })
+
+        self.processed += len(updated)
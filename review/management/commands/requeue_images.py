@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from review.images import process_renditions, stale_pending_tickets
+
+
+class Command(BaseCommand):
+    """Traite les images restées « pending » depuis plus de
+    ``--older-than`` minutes, perdues par un travailleur arrêté avant la
+    fin de leur traitement (redémarrage, arrêt du processus).
+
+    Les images sont traitées dans ce processus, dans l'ordre des
+    identifiants ; une image illisible passe à l'état « failed ».
+    """
+
+    help = ("Process again the ticket images still pending after "
+            "--older-than minutes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=float, default=15,
+            help="Minimum age, in minutes, of the pending images "
+                 "(default: 15).",
+        )
+
+    def handle(self, *args, **options):
+        tickets = list(
+            stale_pending_tickets(timedelta(minutes=options["older_than"]))
+            .order_by("pk")
+            .only("pk", "image")
+        )
+
+        for ticket in tickets:
+            process_renditions(ticket.pk, ticket.image.name, ticket.image.path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(tickets)} pending images processed."))
@@ -0,0 +1,93 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("review", "0002_alter_review_ticket"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="review",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reviews",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="author of review",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="ticket",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="tickets",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="creator of ticket",
+            ),
+        ),
+        migrations.CreateModel(
+            name="FeedEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "object_id",
+                    models.PositiveBigIntegerField(verbose_name="id of post"),
+                ),
+                ("time_created", models.DateTimeField(verbose_name="post created at")),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="author of post",
+                    ),
+                ),
+                (
+                    "content_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="contenttypes.contenttype",
+                        verbose_name="type of post",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_entries",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="owner of feed",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "FeedEntry",
+                "verbose_name_plural": "FeedEntries",
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "content_type", "-time_created", "-object_id"],
+                        name="feed_entry_owner_time_idx",
+                    )
+                ],
+                "unique_together": {("owner", "content_type", "object_id")},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:33
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_reviews(apps, schema_editor):
+    """Initialise le nombre de critiques des billets existants."""
+
+    Ticket = apps.get_model("review", "Ticket")
+    Review = apps.get_model("review", "Review")
+    reviews = (
+        Review.objects.filter(ticket=OuterRef("pk"))
+        .values("ticket")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Ticket.objects.update(review_count=Coalesce(Subquery(reviews), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("review", "0004_user_time_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticket",
+            name="review_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="number of reviews"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ticket",
+            index=models.Index(
+                fields=["user", "review_count", "-time_created"],
+                name="ticket_user_unreviewed_idx",
+            ),
+        ),
+        migrations.RunPython(count_reviews, migrations.RunPython.noop),
+    ]
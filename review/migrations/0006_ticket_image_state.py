@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("review", "0005_ticket_review_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticket",
+            name="image_state",
+            field=models.CharField(
+                choices=[
+                    ("pending", "processing"),
+                    ("ready", "ready"),
+                    ("failed", "failed"),
+                ],
+                default="ready",
+                editable=False,
+                max_length=8,
+                verbose_name="image processing state",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("review", "0006_ticket_image_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticket",
+            name="renditions",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                verbose_name="image renditions",
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:41
+
+from django.db import migrations, models
+import review.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("review", "0007_ticket_renditions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=255, unique=True, verbose_name="file name"
+                    ),
+                ),
+                ("size", models.PositiveBigIntegerField(verbose_name="size in bytes")),
+                (
+                    "ref_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="number of references"
+                    ),
+                ),
+                (
+                    "time_created",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="blob created at"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="ticket",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                db_index=True,
+                null=True,
+                storage=review.models.image_storage,
+                upload_to="images",
+                verbose_name="image",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+from review import search
+
+
+def create_search_index(apps, schema_editor):
+    """Crée l'index de recherche (FTS5 ou tsvector) et y ajoute les
+    publications existantes."""
+
+    search.create_index(schema_editor)
+
+    # Indexation des publications existantes
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(
+            "INSERT INTO review_search (rowid, title, body) "
+            "SELECT 2 * id, title, description FROM review_ticket")
+        schema_editor.execute(
+            "INSERT INTO review_search (rowid, title, body) "
+            "SELECT 2 * id + 1, headline, body FROM review_review")
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("review", "0008_image_blob"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
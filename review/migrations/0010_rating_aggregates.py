@@ -0,0 +1,109 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:54
+
+from django.db import migrations, models
+from django.db.models import (
+    Count, F, FloatField, OuterRef, Subquery, Sum, Value)
+from django.db.models.functions import Cast, Coalesce
+
+from review import search
+
+
+def _aggregate(Review, aggregate, **filters):
+    """Agrégat des critiques de chaque billet (0 sans critique)."""
+
+    rows = (
+        Review.objects.filter(ticket=OuterRef("pk"), **filters)
+        .values("ticket")
+        .annotate(total=aggregate)
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), Value(0))
+
+
+def compute_ratings(apps, schema_editor):
+    """Initialise les agrégats des notes des billets existants."""
+
+    Review = apps.get_model("review", "Review")
+    Ticket = apps.get_model("review", "Ticket")
+    Ticket.objects.update(
+        rating_sum=_aggregate(Review, Sum("rating")),
+        **{
+            f"rating_{rating}_count": _aggregate(
+                Review, Count("pk"), rating=rating)
+            for rating in range(6)
+        },
+    )
+    # review_count est déjà tenu à jour (migration 0005)
+    Ticket.objects.filter(review_count__gt=0).update(
+        rating_avg=Cast(F("rating_sum"), FloatField()) / F("review_count"))
+
+
+def restore_search_triggers(apps, schema_editor):
+    """SQLite reconstruit la table review_ticket pour ajouter les champs, ce
+    qui supprime ses déclencheurs : ceux de la recherche sont recréés (les
+    lignes de l'index, de même rowid, restent valables)."""
+
+    search.create_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("review", "0009_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticket",
+            name="rating_0_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="ticket",
+            name="rating_1_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="ticket",
+            name="rating_2_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="ticket",
+            name="rating_3_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="ticket",
+            name="rating_4_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="ticket",
+            name="rating_5_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="ticket",
+            name="rating_avg",
+            field=models.FloatField(
+                editable=False, null=True, verbose_name="average rating"
+            ),
+        ),
+        migrations.AddField(
+            model_name="ticket",
+            name="rating_sum",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="sum of ratings"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ticket",
+            index=models.Index(
+                fields=["-rating_avg", "-review_count"], name="ticket_rating_avg_idx"
+            ),
+        ),
+        migrations.RunPython(
+            restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(compute_ratings, migrations.RunPython.noop),
+    ]
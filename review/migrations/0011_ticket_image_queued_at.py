@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("review", "0010_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticket",
+            name="image_queued_at",
+            field=models.DateTimeField(
+                editable=False, null=True, verbose_name="image queued at"
+            ),
+        ),
+    ]
@@ -1,12 +1,73 @@
+from django.contrib.contenttypes.models import ContentType
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from PIL import Image
+
+
+def image_storage():
+    """Stockage des images des billets, dédupliqué par contenu."""
+
+    from .storage import ContentAddressedStorage
+
+    return ContentAddressedStorage()
+
+
+class ImageBlob(models.Model):
+    """A stored image file, shared by every ticket uploading the same
+    content (see ``review.storage``)."""
+
+    name = models.CharField(
+        max_length=255, unique=True, verbose_name=_("file name"))
+    size = models.PositiveBigIntegerField(verbose_name=_("size in bytes"))
+    # Nombre de billets qui référencent le fichier
+    ref_count = models.PositiveIntegerField(
+        default=0, verbose_name=_("number of references"))
+    time_created = models.DateTimeField(
+        auto_now_add=True, verbose_name=_("blob created at")
+    )
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
 
 
 class Ticket(models.Model):
     """A ticket is related to a Review."""
 
+    class Meta:
+        indexes = [
+            # Billets d'un utilisateur, du plus récent au plus ancien
+            models.Index(
+                fields=["user", "-time_created"], name="ticket_user_time_idx"
+            ),
+            # Billets sans critique d'un utilisateur (flux)
+            models.Index(
+                fields=["user", "review_count", "-time_created"],
+                name="ticket_user_unreviewed_idx",
+            ),
+            # Billets les mieux notés (review.ratings)
+            models.Index(
+                fields=["-rating_avg", "-review_count"],
+                name="ticket_rating_avg_idx",
+            ),
+        ]
+
+    class ImageState(models.TextChoices):
+        PENDING = "pending", _("processing")
+        READY = "ready", _("ready")
+        FAILED = "failed", _("failed")
+
+    # Champs maintenus par des UPDATE ciblés (compteurs, traitement de
+    # l'image en arrière-plan) : une sauvegarde ordinaire ne les écrit pas
+    BACKGROUND_FIELDS = (
+        "review_count", "rating_sum", "rating_avg", "rating_0_count",
+        "rating_1_count", "rating_2_count", "rating_3_count",
+        "rating_4_count", "rating_5_count", "image_state", "renditions",
+        "image_queued_at",
+    )
+    # Champs réinitialisés lors du remplacement de l'image
+    IMAGE_FIELDS = ("image_state", "renditions", "image_queued_at")
+
     title = models.CharField(max_length=128, verbose_name=_("title of ticket"))
     description = models.TextField(
         max_length=2048, verbose_name=_(
@@ -19,27 +80,117 @@ class Ticket(models.Model):
         verbose_name=_("creator of ticket"),
     )
     image = models.ImageField(
-        upload_to="images", verbose_name=_("image"), blank=True, null=True
+        upload_to="images",
+        storage=image_storage,
+        db_index=True,
+        verbose_name=_("image"),
+        blank=True,
+        null=True,
     )
     time_created = models.DateTimeField(
         auto_now_add=True, verbose_name=_("ticket created at")
     )
+    review_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("number of reviews")
+    )
+    # Notes des critiques, maintenues avec review_count (review.ratings)
+    rating_sum = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("sum of ratings")
+    )
+    rating_avg = models.FloatField(
+        null=True, editable=False, verbose_name=_("average rating")
+    )
+    rating_0_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+    image_state = models.CharField(
+        max_length=8,
+        choices=ImageState.choices,
+        default=ImageState.READY,
+        editable=False,
+        verbose_name=_("image processing state"),
+    )
+    # Date de la mise en attente de l'image : une image encore « pending »
+    # longtemps après a été perdue par son travailleur (voir la commande
+    # requeue_images)
+    image_queued_at = models.DateTimeField(
+        null=True, editable=False, verbose_name=_("image queued at")
+    )
+    # Déclinaisons de l'image par taille : {"card": {"width": ..., "height":
+    # ..., "webp": <nom>, "jpeg": <nom>}, ...} (voir review.images)
+    renditions = models.JSONField(
+        default=dict, blank=True, editable=False,
+        verbose_name=_("image renditions"),
+    )
 
     def __str__(self):
         return str(self.title)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Image enregistrée, pour détecter son remplacement
+        instance._loaded_image = str(instance.__dict__.get("image") or "")
+        return instance
+
+    @property
+    def rating_distribution(self):
+        """Nombre de critiques par note, de 0 à 5."""
+
+        return [getattr(self, f"rating_{rating}_count")
+                for rating in range(6)]
+
+    @property
+    def image_pending(self):
+        """True tant que l'image n'est pas encore traitée."""
+
+        return bool(self.image) and self.image_state == self.ImageState.PENDING
+
     def save(self, *args, **kwargs):
+        # Une nouvelle image est traitée en arrière-plan après l'écriture
+        # (voir review.images et review.signals)
+        self._image_changed = bool(self.image) and (
+            self.image.name != getattr(self, "_loaded_image", ""))
+        if self._image_changed:
+            self.image_state = self.ImageState.PENDING
+            self.renditions = {}
+            self.image_queued_at = timezone.now()
+
+        # Une sauvegarde ordinaire ne doit pas écraser les champs maintenus
+        # en arrière-plan, qui ont pu changer depuis le chargement
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and (field.name not in self.BACKGROUND_FIELDS
+                     or field.name in self.IMAGE_FIELDS
+                     and self._image_changed)
+            ]
         super().save(*args, **kwargs)
 
-        if self.image:
-            img = Image.open(self.image.path)
-            img.thumbnail((250, 375))
-            img.save(self.image.path)
+        # L'ancienne image perd une référence (même si le nouvel envoi a le
+        # même contenu, son enregistrement en a ajouté une)
+        previous_image = getattr(self, "_loaded_image", "")
+        if previous_image and (self._image_changed or not self.image):
+            self.image.storage.release(previous_image)
+        self._loaded_image = str(self.image or "")
 
 
 class Review(models.Model):
     """A Review has a rating and a ticket."""
 
+    class Meta:
+        indexes = [
+            # Critiques d'un utilisateur, de la plus récente à la plus ancienne
+            models.Index(
+                fields=["user", "-time_created"], name="review_user_time_idx"
+            ),
+        ]
+
     ticket = models.ForeignKey(
         "review.Ticket",
         on_delete=models.CASCADE,
@@ -66,3 +217,49 @@ class Review(models.Model):
 
     def __str__(self):
         return f"{self.headline}, {self.ticket}"
+
+    def save(self, *args, **kwargs):
+        # Les compteurs du billet et le flux (signaux post_save) sont mis à
+        # jour dans la même transaction que la critique
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class FeedEntry(models.Model):
+    """A post (review or ticket) materialized in the feed of a user.
+
+    Entries are written when the post is created (fan-out on write), so
+    reading a feed is a range scan on ``(owner, content_type, time_created)``.
+    """
+
+    class Meta:
+        verbose_name = "FeedEntry"
+        verbose_name_plural = "FeedEntries"
+        unique_together = ["owner", "content_type", "object_id"]
+        indexes = [
+            models.Index(
+                fields=["owner", "content_type", "-time_created", "-object_id"],
+                name="feed_entry_owner_time_idx",
+            ),
+        ]
+
+    owner = models.ForeignKey(
+        "authentification.User",
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name=_("owner of feed"),
+    )
+    author = models.ForeignKey(
+        "authentification.User",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name=_("author of post"),
+    )
+    content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, verbose_name=_("type of post")
+    )
+    object_id = models.PositiveBigIntegerField(verbose_name=_("id of post"))
+    time_created = models.DateTimeField(verbose_name=_("post created at"))
+
+    def __str__(self):
+        return f"{self.owner} - {self.content_type.model} {self.object_id}"
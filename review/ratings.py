@@ -0,0 +1,121 @@
+"""Agrégats des notes des billets, maintenus à chaque écriture.
+
+Chaque billet porte le nombre de ses critiques (``review_count``), la somme
+de leurs notes, leur répartition de 0 à 5 et leur moyenne. Ils sont modifiés
+par des UPDATE atomiques (``F()``) dans la transaction de la critique (voir
+``review.signals``) : la page des billets les mieux notés lit ces valeurs
+au lieu de calculer ``AVG()`` sur toutes les critiques.
+"""
+
+from django.conf import settings
+from django.db.models import Case, Count, F, FloatField, Q, Sum, When
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThan
+
+from .models import Ticket
+
+RATINGS = range(6)
+
+# Champs maintenus par ce module
+FIELDS = ("review_count", "rating_sum", "rating_avg") + tuple(
+    f"rating_{rating}_count" for rating in RATINGS)
+
+
+def _updates(count_delta, sum_delta, rating_deltas):
+    """Retourne les affectations d'un UPDATE qui ajoute ``count_delta``
+    critiques, ``sum_delta`` à la somme des notes et ``rating_deltas``
+    (``{note: delta}``) à leur répartition, et recalcule la moyenne.
+
+    Dans un UPDATE, les colonnes lues sont celles d'avant l'écriture : la
+    moyenne est calculée à partir des nouvelles valeurs.
+    """
+
+    count = F("review_count") + count_delta
+    total = F("rating_sum") + sum_delta
+    updates = {
+        "review_count": count,
+        "rating_sum": total,
+        "rating_avg": Case(
+            When(GreaterThan(count, 0),
+                 then=Cast(total, FloatField()) / count),
+            default=None,
+            output_field=FloatField(),
+        ),
+    }
+    for rating, delta in rating_deltas.items():
+        field = f"rating_{rating}_count"
+        updates[field] = F(field) + delta
+    return updates
+
+
+def count_review(ticket_id, delta, rating):
+    """Ajoute (``delta`` = 1) ou retire (``delta`` = -1) une critique de
+    note ``rating`` aux agrégats du billet ``ticket_id``."""
+
+    rating = int(rating)
+    tickets = Ticket.objects.filter(pk=ticket_id)
+    if delta < 0:
+        tickets = tickets.filter(
+            review_count__gte=-delta,
+            **{f"rating_{rating}_count__gte": -delta})
+    tickets.update(**_updates(delta, delta * rating, {rating: delta}))
+
+
+def change_rating(ticket_id, previous_rating, rating):
+    """Remplace une note ``previous_rating`` par ``rating`` dans les
+    agrégats du billet ``ticket_id``."""
+
+    previous_rating, rating = int(previous_rating), int(rating)
+    if previous_rating == rating:
+        return
+    Ticket.objects.filter(
+        pk=ticket_id, **{f"rating_{previous_rating}_count__gte": 1}
+    ).update(**_updates(
+        0, rating - previous_rating, {previous_rating: -1, rating: 1}))
+
+
+def top_rated_queryset(min_reviews=None):
+    """Retourne les billets les mieux notés ayant au moins ``min_reviews``
+    critiques, dans l'ordre de l'index ``ticket_rating_avg_idx``."""
+
+    if min_reviews is None:
+        min_reviews = settings.TOP_RATED_MIN_REVIEWS
+    return (
+        Ticket.objects.filter(
+            rating_avg__isnull=False, review_count__gte=min_reviews)
+        .select_related("user")
+        .order_by("-rating_avg", "-review_count")
+    )
+
+
+def compute_aggregates(reviews):
+    """Calcule les agrégats des billets à partir des critiques ``reviews``
+    (un ``QuerySet``), en une requête groupée par billet.
+
+    Returns:
+        dict: ``{id du billet: {champ: valeur}}``, pour les billets ayant
+        au moins une critique.
+    """
+
+    counts = {
+        f"rating_{rating}_count": Count("pk", filter=Q(rating=rating))
+        for rating in RATINGS
+    }
+    rows = (
+        reviews.order_by()
+        .values("ticket_id")
+        .annotate(review_count=Count("pk"), rating_sum=Sum("rating"),
+                  **counts)
+    )
+    aggregates = {}
+    for row in rows:
+        ticket_id = row.pop("ticket_id")
+        row["rating_avg"] = row["rating_sum"] / row["review_count"]
+        aggregates[ticket_id] = row
+    return aggregates
+
+
+def empty_aggregates():
+    """Agrégats d'un billet sans critique."""
+
+    return {field: None if field == "rating_avg" else 0 for field in FIELDS}
@@ -0,0 +1,257 @@
+"""Recherche plein texte dans les billets et les critiques.
+
+Sous SQLite, les titres et les textes sont copiés dans une table virtuelle
+FTS5 (``review_search``), tenue à jour par des déclencheurs SQL (voir la
+migration ``0009_search_index``) : les écritures en masse sont donc aussi
+indexées. Le ``rowid`` d'une ligne encode la publication : ``2 * id`` pour
+un billet, ``2 * id + 1`` pour une critique. Les résultats sont classés par
+BM25, en donnant plus de poids au titre qu'au texte. SQLite supprime les
+déclencheurs d'une table qu'il reconstruit (ajout d'un champ avec valeur
+par défaut, par exemple) : une migration qui modifie ``review_ticket`` ou
+``review_review`` doit les recréer avec ``create_index``.
+
+Sous PostgreSQL, chaque table porte une colonne ``search_vector``
+(``tsvector`` générée, indexée par GIN) ; le classement utilise
+``ts_rank_cd``, PostgreSQL n'ayant pas de BM25.
+
+Les requêtes sont paginées par décalage : le classement par pertinence ne
+permet pas de pagination par curseur, et le nombre de pages est limité.
+"""
+
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+
+from .feeds import REVIEW, TICKET, _hydrate
+
+SearchPage = namedtuple("SearchPage", ["posts", "page", "has_next"])
+
+# Termes retenus dans une recherche : mots, sans la syntaxe des moteurs
+_TERM = re.compile(r"\w+")
+MAX_TERMS = 8
+
+# Poids du titre et du texte dans le classement
+TITLE_WEIGHT = 4.0
+BODY_WEIGHT = 1.0
+
+SQLITE_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS review_search USING fts5(
+        title, body, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_search_ticket_insert
+    AFTER INSERT ON review_ticket BEGIN
+        INSERT INTO review_search (rowid, title, body)
+        VALUES (2 * new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_search_ticket_update
+    AFTER UPDATE OF title, description ON review_ticket BEGIN
+        DELETE FROM review_search WHERE rowid = 2 * old.id;
+        INSERT INTO review_search (rowid, title, body)
+        VALUES (2 * new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_search_ticket_delete
+    AFTER DELETE ON review_ticket BEGIN
+        DELETE FROM review_search WHERE rowid = 2 * old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_search_review_insert
+    AFTER INSERT ON review_review BEGIN
+        INSERT INTO review_search (rowid, title, body)
+        VALUES (2 * new.id + 1, new.headline, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_search_review_update
+    AFTER UPDATE OF headline, body ON review_review BEGIN
+        DELETE FROM review_search WHERE rowid = 2 * old.id + 1;
+        INSERT INTO review_search (rowid, title, body)
+        VALUES (2 * new.id + 1, new.headline, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_search_review_delete
+    AFTER DELETE ON review_review BEGIN
+        DELETE FROM review_search WHERE rowid = 2 * old.id + 1;
+    END
+    """,
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS review_search_ticket_insert",
+    "DROP TRIGGER IF EXISTS review_search_ticket_update",
+    "DROP TRIGGER IF EXISTS review_search_ticket_delete",
+    "DROP TRIGGER IF EXISTS review_search_review_insert",
+    "DROP TRIGGER IF EXISTS review_search_review_update",
+    "DROP TRIGGER IF EXISTS review_search_review_delete",
+    "DROP TABLE IF EXISTS review_search",
+]
+
+_POSTGRES_VECTOR = (
+    "setweight(to_tsvector('french', coalesce({title}, '')), 'A') || "
+    "setweight(to_tsvector('french', coalesce({body}, '')), 'B')"
+)
+
+_TICKET_VECTOR = _POSTGRES_VECTOR.format(title="title", body="description")
+_REVIEW_VECTOR = _POSTGRES_VECTOR.format(title="headline", body="body")
+
+POSTGRES_SCHEMA = [
+    f"""
+    ALTER TABLE review_ticket ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS ({_TICKET_VECTOR}) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS review_ticket_search_idx
+    ON review_ticket USING GIN (search_vector)
+    """,
+    f"""
+    ALTER TABLE review_review ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS ({_REVIEW_VECTOR}) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS review_review_search_idx
+    ON review_review USING GIN (search_vector)
+    """,
+]
+
+POSTGRES_DROP = [
+    "ALTER TABLE review_ticket DROP COLUMN IF EXISTS search_vector",
+    "ALTER TABLE review_review DROP COLUMN IF EXISTS search_vector",
+]
+
+# Poids des étiquettes D, C, B (texte) et A (titre) de PostgreSQL
+_POSTGRES_WEIGHTS = "'{0, 0, %s, 1}'::float4[]" % (
+    BODY_WEIGHT / TITLE_WEIGHT)
+
+_SQLITE_SEARCH = f"""
+    SELECT rowid FROM review_search
+    WHERE review_search MATCH %s
+    ORDER BY bm25(review_search, {TITLE_WEIGHT}, {BODY_WEIGHT}), rowid
+    LIMIT %s OFFSET %s
+"""
+
+_POSTGRES_SEARCH = f"""
+    SELECT id, kind FROM (
+        SELECT id, '{TICKET}' AS kind,
+               ts_rank_cd({_POSTGRES_WEIGHTS}, search_vector, query) AS rank
+        FROM review_ticket, to_tsquery('french', %s) AS query
+        WHERE search_vector @@ query
+        UNION ALL
+        SELECT id, '{REVIEW}' AS kind,
+               ts_rank_cd({_POSTGRES_WEIGHTS}, search_vector, query) AS rank
+        FROM review_review, to_tsquery('french', %s) AS query
+        WHERE search_vector @@ query
+    ) AS results
+    ORDER BY rank DESC, kind, id
+    LIMIT %s OFFSET %s
+"""
+
+
+def create_index(schema_editor):
+    """Crée l'index de recherche de la base de ``schema_editor``."""
+
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": SQLITE_SCHEMA, "postgresql": POSTGRES_SCHEMA}
+    for statement in statements.get(vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_index(schema_editor):
+    """Supprime l'index de recherche de la base de ``schema_editor``."""
+
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": SQLITE_DROP, "postgresql": POSTGRES_DROP}
+    for statement in statements.get(vendor, []):
+        schema_editor.execute(statement)
+
+
+def rebuild_index():
+    """Reconstruit l'index de recherche à partir des billets et des
+    critiques. Retourne le nombre de publications indexées."""
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("DELETE FROM review_search")
+            cursor.execute(
+                "INSERT INTO review_search (rowid, title, body) "
+                "SELECT 2 * id, title, description FROM review_ticket")
+            indexed = cursor.rowcount
+            cursor.execute(
+                "INSERT INTO review_search (rowid, title, body) "
+                "SELECT 2 * id + 1, headline, body FROM review_review")
+            indexed += cursor.rowcount
+            cursor.execute(
+                "INSERT INTO review_search (review_search) "
+                "VALUES ('optimize')")
+            return indexed
+
+        if connection.vendor == "postgresql":
+            # Les colonnes générées sont toujours à jour : seuls les index
+            # sont reconstruits
+            cursor.execute("REINDEX INDEX review_ticket_search_idx")
+            cursor.execute("REINDEX INDEX review_review_search_idx")
+            cursor.execute(
+                "SELECT (SELECT count(*) FROM review_ticket)"
+                " + (SELECT count(*) FROM review_review)")
+            return cursor.fetchone()[0]
+
+    raise NotImplementedError(
+        f"Full-text search is not supported on {connection.vendor}.")
+
+
+def _terms(query):
+    return _TERM.findall(query)[:MAX_TERMS]
+
+
+def _search_rows(terms, limit, offset):
+    """Retourne les lignes ``(rang, id, type)`` d'une page de résultats."""
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            # Chaque terme est cité ; le dernier est un préfixe (saisie en
+            # cours)
+            match = " ".join(f'"{term}"' for term in terms) + "*"
+            cursor.execute(_SQLITE_SEARCH, [match, limit, offset])
+            return [
+                (rank, rowid // 2, REVIEW if rowid % 2 else TICKET)
+                for rank, (rowid,) in enumerate(cursor.fetchall())
+            ]
+
+        if connection.vendor == "postgresql":
+            query = " & ".join(terms) + ":*"
+            cursor.execute(_POSTGRES_SEARCH, [query, query, limit, offset])
+            return [
+                (rank, pk, kind)
+                for rank, (pk, kind) in enumerate(cursor.fetchall())
+            ]
+
+    raise NotImplementedError(
+        f"Full-text search is not supported on {connection.vendor}.")
+
+
+def search(query, page=1, size=None):
+    """Recherche ``query`` dans les billets et les critiques.
+
+    Returns:
+        SearchPage: La page ``page`` (à partir de 1) des publications
+        trouvées, de la plus pertinente à la moins pertinente.
+    """
+
+    size = size or settings.SEARCH_PAGE_SIZE
+    page = min(max(page, 1), settings.SEARCH_MAX_PAGES)
+    terms = _terms(query)
+    if not terms:
+        return SearchPage([], page, False)
+
+    rows = _search_rows(terms, size + 1, (page - 1) * size)
+    has_next = len(rows) > size and page < settings.SEARCH_MAX_PAGES
+    return SearchPage(_hydrate(rows[:size]), page, has_next)
@@ -0,0 +1,149 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from authentification.counters import add_to_counter
+from authentification.models import UserFollows
+from authentification.signals import follows_created
+
+from . import feed_cache, feeds, images, ratings
+from .models import Review, Ticket
+
+
+# Compteurs et notes du billet, flux matérialisé (FeedEntry) à chaque
+# écriture
+
+
+@receiver(post_init, sender=Review)
+def review_loaded(sender, instance, **kwargs):
+    # Billet et note d'origine, pour détecter le déplacement d'une critique
+    # ou le changement de sa note (sans charger les champs différés)
+    instance._loaded_ticket_id = instance.__dict__.get("ticket_id")
+    instance._loaded_rating = instance.__dict__.get("rating")
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    previous_ticket_id = instance._loaded_ticket_id
+    previous_rating = instance._loaded_rating
+    # La note d'un formulaire peut être une chaîne (ChoiceField)
+    rating = int(instance.rating)
+    instance._loaded_ticket_id = instance.ticket_id
+    instance._loaded_rating = rating
+    instance._moved_from_ticket_id = None
+
+    if created:
+        ratings.count_review(instance.ticket_id, 1, rating)
+        feeds.fan_out_review(instance)
+    elif previous_ticket_id != instance.ticket_id:
+        # Critique déplacée vers un autre billet
+        instance._moved_from_ticket_id = previous_ticket_id
+        ratings.count_review(
+            previous_ticket_id, -1,
+            rating if previous_rating is None else previous_rating)
+        ratings.count_review(instance.ticket_id, 1, rating)
+        feeds.move_review(instance, previous_ticket_id)
+    elif previous_rating is not None and int(previous_rating) != rating:
+        ratings.change_rating(instance.ticket_id, previous_rating, rating)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    ratings.count_review(instance.ticket_id, -1, instance.rating)
+    feeds.retract_review(instance)
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, created, **kwargs):
+    if created:
+        feeds.fan_out_ticket(instance)
+    # Nouvelle image : déclinaisons produites en arrière-plan (voir
+    # Ticket.save)
+    if getattr(instance, "_image_changed", False):
+        images.schedule_renditions(instance)
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_deleted(sender, instance, **kwargs):
+    feeds.remove_post(instance)
+    if instance.image:
+        instance.image.storage.release(instance.image.name)
+
+
+@receiver(post_save, sender=UserFollows)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        feeds.fan_in([instance.user_id], instance.followed_user_id)
+
+
+@receiver(post_delete, sender=UserFollows)
+def follow_deleted(sender, instance, **kwargs):
+    feeds.fan_out_unfollow(instance.user_id, instance.followed_user_id)
+
+
+@receiver(follows_created)
+def follows_bulk_created(sender, user_id, followed_user_ids, **kwargs):
+    for followed_user_id in followed_user_ids:
+        feeds.fan_in([user_id], followed_user_id)
+
+
+# Invalidation du cache des flux (voir review.feed_cache)
+
+
+def _ticket_author_ids(ticket_ids):
+    return Ticket.objects.filter(pk__in=ticket_ids).values_list(
+        "user_id", flat=True)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    ticket_ids = [instance.ticket_id,
+                  getattr(instance, "_moved_from_ticket_id", None)]
+    feed_cache.invalidate_authors(
+        [instance.user_id, *_ticket_author_ids(ticket_ids)])
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def ticket_changed(sender, instance, **kwargs):
+    # Le billet est aussi affiché dans les critiques qui le concernent
+    feed_cache.invalidate_authors(
+        [instance.user_id,
+         *Review.objects.filter(ticket_id=instance.pk).values_list(
+             "user_id", flat=True)])
+
+
+@receiver(post_save, sender=UserFollows)
+@receiver(post_delete, sender=UserFollows)
+def follow_changed(sender, instance, **kwargs):
+    feed_cache.invalidate_feeds([instance.user_id])
+
+
+@receiver(follows_created)
+def follows_changed(sender, user_id, **kwargs):
+    feed_cache.invalidate_feeds([user_id])
+
+
+# Compteurs de publications des utilisateurs (voir authentification.counters)
+
+
+@receiver(post_save, sender=Review)
+def review_counted(sender, instance, created, **kwargs):
+    if created:
+        add_to_counter([instance.user_id], "review_count", 1)
+
+
+@receiver(post_delete, sender=Review)
+def review_uncounted(sender, instance, **kwargs):
+    add_to_counter([instance.user_id], "review_count", -1)
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_counted(sender, instance, created, **kwargs):
+    if created:
+        add_to_counter([instance.user_id], "ticket_count", 1)
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_uncounted(sender, instance, **kwargs):
+    add_to_counter([instance.user_id], "ticket_count", -1)
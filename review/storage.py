@@ -0,0 +1,115 @@
+"""Stockage des images des billets, adressé par contenu.
+
+Beaucoup d'utilisateurs envoient la même couverture de livre. Le fichier
+envoyé est haché (SHA-256) pendant sa copie et rangé sous un nom dérivé de
+son empreinte : un contenu déjà connu n'est pas écrit une seconde fois, et
+les billets qui le partagent pointent vers le même fichier.
+
+Chaque fichier est associé à un ``ImageBlob`` qui compte les billets qui le
+référencent. ``save()`` ajoute une référence, ``release()`` en retire une ;
+le fichier n'est supprimé que lorsqu'il n'en reste aucune. Les deux
+opérations verrouillent la ligne du ``ImageBlob``, ce qui évite de supprimer
+un fichier qu'un envoi concurrent vient de réutiliser.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Stockage sur disque qui range chaque fichier sous
+    ``<dossier>/<2 premiers caractères>/<empreinte>.<extension>``."""
+
+    def _blobs(self):
+        # Résolu à l'exécution : le modèle référence ce stockage
+        return apps.get_model("review", "ImageBlob").objects
+
+    def _lock(self, name, size):
+        """Verrouille (en la créant au besoin) la ligne du fichier ``name``.
+
+        Doit être appelée dans une transaction.
+        """
+
+        blobs = self._blobs()
+        blob = blobs.select_for_update().filter(name=name).first()
+        if blob is None:
+            try:
+                with transaction.atomic():
+                    blob = blobs.create(name=name, size=size)
+            except IntegrityError:
+                # Créée entre-temps par un envoi concurrent
+                blob = blobs.select_for_update().get(name=name)
+        return blob
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+
+        # Copie dans un fichier temporaire du même dossier, en hachant le
+        # contenu au passage (le fichier n'est lu qu'une fois)
+        digest = hashlib.sha256()
+        size = 0
+        handle, temporary_path = tempfile.mkstemp(
+            dir=self.path(directory), suffix=".part")
+        try:
+            with os.fdopen(handle, "wb") as temporary:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+                    temporary.write(chunk)
+
+            digest = digest.hexdigest()
+            name = f"{directory}/{digest[:2]}/{digest}{extension}"
+            path = self.path(name)
+
+            with transaction.atomic():
+                blob = self._lock(name, size)
+                if os.path.exists(path):
+                    os.remove(temporary_path)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(temporary_path, path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(path, self.file_permissions_mode)
+                self._blobs().filter(pk=blob.pk).update(
+                    ref_count=F("ref_count") + 1)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif dépend du contenu : il est choisi par _save()
+        return name
+
+    def release(self, name):
+        """Retire une référence au fichier ``name``.
+
+        Le fichier est supprimé après la validation de la transaction en
+        cours s'il n'est plus référencé. Les fichiers sans ``ImageBlob``
+        (envoyés avant ce stockage) ne sont jamais supprimés ici.
+        """
+
+        self._blobs().filter(name=name, ref_count__gt=0).update(
+            ref_count=F("ref_count") - 1)
+        transaction.on_commit(lambda: self._collect(name))
+
+    def _collect(self, name):
+        """Supprime le fichier ``name`` s'il n'est plus référencé."""
+
+        with transaction.atomic():
+            blob = (
+                self._blobs().select_for_update()
+                .filter(name=name, ref_count=0).first()
+            )
+            if blob is not None:
+                self.delete(name)
+                blob.delete()
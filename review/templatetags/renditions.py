@@ -0,0 +1,43 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+def _srcset(renditions, extension):
+    return ", ".join(
+        f"{default_storage.url(rendition[extension])} {rendition['width']}w"
+        for rendition in renditions.values()
+    )
+
+
+@register.simple_tag
+def ticket_picture(ticket, sizes="250px", css_class="img-fluid img-border"):
+    """Display the image of a ticket with a WebP/JPEG srcset of its
+    renditions, or the original image if it has no renditions yet."""
+
+    if not ticket.image:
+        return ""
+
+    renditions = ticket.renditions
+    if not renditions:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}">',
+            ticket.image.url, ticket.title, css_class,
+        )
+
+    # Taille par défaut, ou la plus grande des déclinaisons enregistrées si
+    # les tailles ont changé depuis leur production (avant reprocess_images)
+    card = renditions.get("card") or max(
+        renditions.values(), key=lambda rendition: rendition["width"])
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" '
+        'alt="{}" class="{}" loading="lazy">'
+        '</picture>',
+        _srcset(renditions, "webp"), sizes,
+        default_storage.url(card["jpeg"]), _srcset(renditions, "jpeg"), sizes,
+        card["width"], card["height"], ticket.title, css_class,
+    )
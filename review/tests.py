@@ -1,3 +1,1029 @@
-from django.test import TestCase
+import io
+import os
+import struct
+import tempfile
+import time
+import warnings
+import zlib
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.storage import (
+    InMemoryStorage, Storage, default_storage)
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from authentification.graph import follow_graph
+from authentification.models import User, UserFollows
+
+from . import feed_cache
+from .feeds import (
+    REVIEW, TICKET, encode_cursor, get_feed_page, rebuild_feed,
+    rebuild_feeds_in_bulk)
+from .forms import TicketForm
+from .images import RENDITION_SIZES, make_renditions
+from .imaging import ImageTooLarge, decode_image
+from .models import FeedEntry, ImageBlob, Review, Ticket
+from .search import search
+
+
+def seed_posts(user, size):
+    """Crée ``size`` auteurs suivis par ``user``, chacun avec un billet sans
+    critique et un billet critiqué, ainsi que ``size`` critiques d'autres
+    utilisateurs sur les billets de ``user``."""
+
+    for index in range(size):
+        author = User.objects.create(
+            username=f"{user.username}_author_{index}")
+        UserFollows.objects.create(user=user, followed_user=author)
+
+        Ticket.objects.create(title=f"Ticket {index}", user=author)
+        ticket = Ticket.objects.create(title=f"Reviewed {index}", user=author)
+        Review.objects.create(
+            ticket=ticket, rating=index % 6, headline=f"Review {index}",
+            user=author,
+        )
+
+        own_ticket = Ticket.objects.create(title=f"Own {index}", user=user)
+        Review.objects.create(
+            ticket=own_ticket, rating=3, headline=f"On own {index}",
+            user=author,
+        )
+        Review.objects.create(
+            ticket=own_ticket, rating=4, headline=f"Own review {index}",
+            user=user,
+        )
+
+
+class QueryBudgetTestCase(TestCase):
+    """Vérifie que le nombre de requêtes d'une vue ne dépend pas du volume
+    de données affiché (absence de requêtes N+1)."""
+
+    sizes = (2, 12)
+
+    def setUp(self):
+        cache.clear()
+        follow_graph.reset()
+
+    def assertQueryBudget(self, url_name, budget, **kwargs):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                user = User.objects.create(username=f"reader_{size}")
+                seed_posts(user, size)
+                self.client.force_login(user)
+                follow_graph.load()
+
+                with self.assertNumQueries(budget):
+                    response = self.client.get(reverse(url_name, **kwargs))
+                self.assertEqual(response.status_code, 200)
+
+
+class FeedsPageQueryBudgetTests(QueryBudgetTestCase):
+    # session, utilisateur, page du flux, critiques, billets (les auteurs en
+    # mode « pull » sont lus dans l'index des abonnements)
+    budget = 5
+
+    def test_feeds_page_query_budget(self):
+        self.assertQueryBudget("review:feeds_page", self.budget)
+
+
+class PostsPageQueryBudgetTests(QueryBudgetTestCase):
+    # session, utilisateur, critiques, billets
+    budget = 4
+
+    def test_posts_page_query_budget(self):
+        self.assertQueryBudget("review:posts_page", self.budget)
+
+
+@override_settings(FEED_PAGE_SIZE=3)
+class FeedPaginationTests(TestCase):
+    """Vérifie la pagination par curseur du flux, y compris à date égale
+    entre un billet et des critiques."""
+
+    def setUp(self):
+        cache.clear()
+        follow_graph.reset()
+        self.user = User.objects.create(username="reader")
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+        # (minutes, type) : trois publications à la minute 1, deux à la 3
+        posts = [(0, TICKET), (1, TICKET), (1, REVIEW), (1, REVIEW),
+                 (2, REVIEW), (3, TICKET), (3, REVIEW), (4, TICKET)]
+        keys = []
+        for index, (minutes, kind) in enumerate(posts):
+            created = start + timedelta(minutes=minutes)
+            ticket = Ticket.objects.create(
+                title=f"Ticket {index}", user=self.user)
+            post = ticket
+            if kind == REVIEW:
+                post = Review.objects.create(
+                    ticket=ticket, rating=3, headline=f"Review {index}",
+                    user=self.user,
+                )
+            type(post).objects.filter(pk=post.pk).update(
+                time_created=created)
+            keys.append((created, kind, post.pk))
+        rebuild_feed(self.user)
+
+        # Ordre attendu : (date, type, id) décroissant
+        self.expected = [
+            (kind, pk) for _, kind, pk in sorted(keys, reverse=True)]
+        self.client.force_login(self.user)
+
+    def get_page(self, **params):
+        response = self.client.get(reverse("review:feeds_page"), params)
+        self.assertEqual(response.status_code, 200)
+        return (
+            [(post.type_of_content, post.pk)
+             for post in response.context["posts"]],
+            response.context["older_cursor"],
+            response.context["newer_cursor"],
+        )
+
+    def test_walk_older_then_newer_without_duplicates_or_gaps(self):
+        pages = [self.get_page()]
+        self.assertIsNone(pages[0][2])
+        while pages[-1][1]:
+            pages.append(self.get_page(before=pages[-1][1]))
+
+        self.assertEqual([len(posts) for posts, _, _ in pages], [3, 3, 2])
+        self.assertEqual(
+            [post for posts, _, _ in pages for post in posts], self.expected)
+        self.assertIsNone(pages[-1][1])
+
+        # Retour vers les publications récentes depuis la dernière page
+        back = [pages[-1]]
+        while back[-1][2]:
+            back.append(self.get_page(after=back[-1][2]))
+        self.assertEqual(
+            [posts for posts, _, _ in back],
+            [posts for posts, _, _ in reversed(pages)])
+        self.assertIsNone(back[-1][2])
+
+    def test_ties_are_broken_by_type_then_id(self):
+        ticket_kind, ticket_pk = self.expected[4]
+        self.assertEqual(ticket_kind, TICKET)
+        created = Ticket.objects.get(pk=ticket_pk).time_created
+        # Un curseur sur le billet de la minute 1 : les deux critiques de la
+        # même minute viennent ensuite, puis la publication de la minute 0
+        posts, _, _ = self.get_page(
+            before=encode_cursor(created, TICKET, ticket_pk))
+        self.assertEqual(posts, self.expected[5:])
+        self.assertEqual(
+            [kind for kind, _ in self.expected[4:7]],
+            [TICKET, REVIEW, REVIEW])
+
+        posts, _, _ = self.get_page(
+            after=encode_cursor(created, TICKET, ticket_pk))
+        self.assertEqual(posts, self.expected[1:4])
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        first_page = self.get_page()
+        for cursor in ("not-a-cursor", encode_cursor(
+                datetime(2024, 1, 1, tzinfo=timezone.utc), "USER", 1)):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.get_page(before=cursor), first_page)
+
+    def test_single_page_has_no_cursors(self):
+        page = get_feed_page(self.user, size=len(self.expected))
+        self.assertEqual(
+            [(post.type_of_content, post.pk) for post in page.posts],
+            self.expected)
+        self.assertIsNone(page.older_cursor)
+        self.assertIsNone(page.newer_cursor)
+
+
+class FeedCacheTests(TestCase):
+    """Vérifie le cache des pages du flux : lecture sans requête, version
+    changée après chaque écriture validée et compteurs."""
+
+    def setUp(self):
+        cache.clear()
+        follow_graph.reset()
+        self.reader = User.objects.create(username="reader")
+        self.author = User.objects.create(username="author")
+        UserFollows.objects.create(
+            user=self.reader, followed_user=self.author)
+        Ticket.objects.create(title="Premier", user=self.author)
+        follow_graph.load()
+
+    def read(self):
+        return [
+            (post.type_of_content, post.pk)
+            for post in feed_cache.get_feed_page(self.reader).posts
+        ]
+
+    def test_second_read_is_a_hit_without_queries(self):
+        first = self.read()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.read(), first)
+        self.assertEqual(feed_cache.stats(), {"hits": 1, "misses": 1})
+
+        feed_cache.reset_stats()
+        self.assertEqual(feed_cache.stats(), {"hits": 0, "misses": 0})
+
+    def test_writes_invalidate_after_commit(self):
+        self.read()
+        other = User.objects.create(username="other")
+        ticket = Ticket.objects.get(title="Premier")
+        writes = [
+            ("ticket", lambda: Ticket.objects.create(
+                title="Nouveau", user=self.author)),
+            ("review", lambda: Review.objects.create(
+                ticket=ticket, rating=4, headline="Critique",
+                user=self.author)),
+            ("follow", lambda: UserFollows.objects.create(
+                user=self.reader, followed_user=other)),
+        ]
+        Ticket.objects.create(title="Du suivi", user=other)
+
+        for label, write in writes:
+            with self.subTest(write=label):
+                feed_cache.reset_stats()
+                with self.captureOnCommitCallbacks() as callbacks:
+                    post = write()
+                # Avant la validation, la page en cache est encore servie
+                self.read()
+                self.assertEqual(feed_cache.stats()["hits"], 1)
+
+                for callback in callbacks:
+                    callback()
+                posts = self.read()
+                self.assertEqual(feed_cache.stats()["misses"], 1)
+                if isinstance(post, UserFollows):
+                    post = Ticket.objects.get(title="Du suivi")
+                kind = REVIEW if isinstance(post, Review) else TICKET
+                self.assertIn((kind, post.pk), posts)
+
+
+def image_content(size, image_format="JPEG", color="navy", **options):
+    """Retourne le contenu d'une image unie de ``size`` pixels."""
+
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+class RemoteStorage(Storage):
+    """Stockage sans chemin local (``path()`` n'est pas implémentée), comme
+    les stockages distants ; les fichiers sont gardés en mémoire."""
+
+    def __init__(self):
+        self.files = InMemoryStorage()
+
+    def _save(self, name, content):
+        return self.files.save(name, content)
+
+    def exists(self, name):
+        return self.files.exists(name)
+
+
+class MediaTestCase(TestCase):
+    """Enregistre les fichiers envoyés dans un dossier temporaire et traite
+    les images immédiatement."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(
+            MEDIA_ROOT=media_root.name, IMAGE_PROCESSING="sync")
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create(username="uploader")
+
+    def create_ticket(self, filename, content):
+        return Ticket.objects.create(
+            title=filename, user=self.user,
+            image=SimpleUploadedFile(filename, content),
+        )
+
+
+class DeduplicatedImageTests(MediaTestCase):
+    """Vérifie qu'une même image envoyée deux fois n'est stockée et traitée
+    qu'une fois, et n'est supprimée qu'avec son dernier billet."""
+
+    def setUp(self):
+        super().setUp()
+        self.content = image_content((40, 60))
+
+    def create_ticket(self, filename):
+        return super().create_ticket(filename, self.content)
+
+    def test_same_image_is_stored_once(self):
+        first = self.create_ticket("cover.jpg")
+        second = self.create_ticket("same-cover.JPG")
+        first.refresh_from_db()
+        second.refresh_from_db()
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(second.renditions, first.renditions)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 2)
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(first.image.path)],
+        )
+
+        path = first.image.path
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ImageBlob.objects.exists())
+
+
+class RenditionTests(MediaTestCase):
+    """Vérifie les déclinaisons des images et leur affichage."""
+
+    def test_renditions_fit_each_size(self):
+        ticket = self.create_ticket("cover.jpg", image_content((1000, 1500)))
+        ticket.refresh_from_db()
+
+        self.assertEqual(set(ticket.renditions), set(RENDITION_SIZES))
+        for label, size in RENDITION_SIZES.items():
+            rendition = ticket.renditions[label]
+            self.assertEqual((rendition["width"], rendition["height"]), size)
+            for extension in ("webp", "jpeg"):
+                name = rendition[extension]
+                # Nom dérivé du contenu, rangé par préfixe
+                self.assertRegex(
+                    name, rf"^renditions/([0-9a-f]{{2}})/\1[0-9a-f]{{30}}"
+                          rf"\.{extension}$")
+                with Image.open(default_storage.path(name)) as img:
+                    self.assertEqual(img.size, size)
+                    self.assertEqual(img.format, extension.upper())
+
+    def test_small_images_are_not_upscaled(self):
+        ticket = self.create_ticket("small.jpg", image_content((40, 60)))
+        ticket.refresh_from_db()
+
+        renditions = ticket.renditions.values()
+        self.assertEqual(
+            {(rendition["width"], rendition["height"])
+             for rendition in renditions},
+            {(40, 60)})
+        # Contenus identiques : un seul fichier par format
+        self.assertEqual(
+            len({rendition["webp"] for rendition in renditions}), 1)
+
+    def test_picture_tag_lists_every_rendition(self):
+        template = Template("{% load renditions %}{% ticket_picture ticket %}")
+        ticket = self.create_ticket("cover.jpg", image_content((1000, 1500)))
+        ticket.refresh_from_db()
+        html = template.render(Context({"ticket": ticket}))
+
+        renditions = ticket.renditions
+        for extension in ("webp", "jpeg"):
+            srcset = ", ".join(
+                f"{default_storage.url(renditions[label][extension])} "
+                f"{renditions[label]['width']}w"
+                for label in ("thumb", "card", "card_2x")
+            )
+            self.assertIn(f'srcset="{srcset}"', html)
+        self.assertIn(
+            f'src="{default_storage.url(renditions["card"]["jpeg"])}"', html)
+        self.assertIn('width="250" height="375"', html)
+
+        # Sans déclinaison (image en attente), l'original est affiché
+        ticket.renditions = {}
+        self.assertHTMLEqual(
+            template.render(Context({"ticket": ticket})),
+            f'<img src="{ticket.image.url}" alt="cover.jpg" '
+            f'class="img-fluid img-border">')
+
+        ticket.image = None
+        self.assertEqual(template.render(Context({"ticket": ticket})), "")
+
+    def test_picture_tag_without_default_size(self):
+        ticket = self.create_ticket("cover.jpg", image_content((1000, 1500)))
+        ticket.refresh_from_db()
+        # Déclinaisons produites avant un changement de RENDITION_SIZES
+        renditions = ticket.renditions
+        ticket.renditions = {
+            label: renditions[label] for label in ("thumb", "card_2x")}
+
+        html = Template("{% load renditions %}{% ticket_picture ticket %}"
+                        ).render(Context({"ticket": ticket}))
+        self.assertIn(
+            f'src="{default_storage.url(renditions["card_2x"]["jpeg"])}"',
+            html)
+        self.assertIn('width="500" height="750"', html)
+
+    def test_renditions_on_storage_without_local_paths(self):
+        path = os.path.join(default_storage.location, "original.jpg")
+        with open(path, "wb") as output:
+            output.write(image_content((400, 600)))
+
+        with mock.patch("review.images.default_storage", RemoteStorage()):
+            first = make_renditions(path, 40_000_000, None)
+            # Déclinaisons déjà enregistrées : réutilisées
+            self.assertEqual(make_renditions(path, 40_000_000, None), first)
+
+
+def png_header(width, height):
+    """Retourne un PNG qui annonce ``width`` x ``height`` pixels sans en
+    contenir aucun (« bombe de décompression » de quelques octets)."""
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data)))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(b"")) + chunk(b"IEND", b""))
+
+
+class ImageDecodingTests(MediaTestCase):
+    """Vérifie les limites du décodage des images, leur orientation EXIF
+    et le décodage réduit des JPEG."""
+
+    def write(self, name, content):
+        path = os.path.join(default_storage.location, name)
+        with open(path, "wb") as output:
+            output.write(content)
+        return path
+
+    def oriented_jpeg(self, size, orientation):
+        """JPEG dont la moitié gauche (telle que stockée) est rouge, avec
+        l'orientation EXIF ``orientation``."""
+
+        img = Image.new("RGB", size, "blue")
+        img.paste("red", (0, 0, size[0] // 2, size[1]))
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", exif=exif.tobytes())
+        return buffer.getvalue()
+
+    def test_oversized_images_are_rejected_before_decoding(self):
+        # Aucun pixel à décoder : seul l'en-tête peut provoquer le refus
+        for width, height in ((10_000, 10_000), (100_000, 100_000)):
+            with self.subTest(size=(width, height)):
+                path = self.write("bomb.png", png_header(width, height))
+                with self.assertRaises(ImageTooLarge), \
+                        warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    decode_image(path, (250, 375), 40_000_000)
+
+        path = self.write("big.jpg", image_content((40, 60)))
+        with self.assertRaises(ImageTooLarge):
+            decode_image(path, (250, 375), 40_000_000, max_bytes=100)
+
+        # Refus dès le formulaire d'envoi
+        with self.settings(IMAGE_MAX_PIXELS=1000):
+            form = TicketForm({"title": "Bombe"}, {
+                "image": SimpleUploadedFile(
+                    "bomb.png", image_content((40, 60), "PNG"))})
+            self.assertFalse(form.is_valid())
+        self.assertIn("too large", form.errors["image"][0])
+
+    def test_oversized_image_is_marked_failed(self):
+        with self.settings(IMAGE_MAX_PIXELS=1000), \
+                self.assertLogs("review.images", "ERROR"):
+            ticket = self.create_ticket(
+                "large.png", image_content((40, 60), "PNG"))
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.image_state, Ticket.ImageState.FAILED)
+
+    def test_exif_orientation_is_applied_and_stripped(self):
+        # Orientation 6 : l'image s'affiche tournée de 90° vers la droite,
+        # la moitié gauche stockée se retrouve en haut
+        ticket = self.create_ticket(
+            "rotated.jpg", self.oriented_jpeg((600, 400), 6))
+        ticket.refresh_from_db()
+
+        card = ticket.renditions["card"]
+        self.assertEqual((card["width"], card["height"]), (250, 375))
+        for extension in ("webp", "jpeg"):
+            with Image.open(default_storage.path(card[extension])) as img:
+                self.assertEqual(img.size, (250, 375))
+                self.assertNotIn(0x0112, img.getexif())
+                red, _, blue = img.convert("RGB").getpixel((125, 40))
+                self.assertGreater(red, blue)
+                red, _, blue = img.convert("RGB").getpixel((125, 335))
+                self.assertLess(red, blue)
+
+    def test_jpeg_is_decoded_at_reduced_size(self):
+        path = self.write(
+            "large.jpg", image_content((2000, 1600), quality=50))
+        # 1/4 de la taille : la plus petite réduction qui couvre 250x375
+        self.assertEqual(
+            decode_image(path, (250, 375), 40_000_000).size, (500, 400))
+
+        # Taille demandée transposée pour une image tournée
+        path = self.write("rotated.jpg", self.oriented_jpeg((2000, 1600), 6))
+        self.assertEqual(
+            decode_image(path, (250, 375), 40_000_000).size, (400, 500))
+
+        # Les autres formats sont décodés en entier
+        path = self.write("large.png", image_content((800, 600), "PNG"))
+        self.assertEqual(
+            decode_image(path, (250, 375), 40_000_000).size, (800, 600))
+
+
+class ImmediateExecutor:
+    """Pool de travailleurs factice : la tâche est exécutée dès sa
+    soumission et son résultat passe par un ``Future``, comme dans le pool.
+    Avec ``stalled``, les tâches ne se terminent jamais (travailleur
+    arrêté)."""
+
+    def __init__(self, stalled=False):
+        self.stalled = stalled
+
+    def submit(self, function, *args):
+        future = Future()
+        if not self.stalled:
+            try:
+                future.set_result(function(*args))
+            except Exception as error:
+                future.set_exception(error)
+        return future
+
+
+class ImageProcessingTests(MediaTestCase):
+    """Vérifie les états du traitement des images en arrière-plan et la
+    reprise des images perdues par leur travailleur."""
+
+    def setUp(self):
+        super().setUp()
+        settings = override_settings(IMAGE_PROCESSING="thread")
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Le rappel du pool s'exécute ici dans la transaction du test
+        patcher = mock.patch("review.images.close_old_connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_in_pool(self, executor, filename, content):
+        """Crée le billet et exécute le traitement programmé après la
+        validation de la transaction."""
+
+        with mock.patch("review.images._get_executor",
+                        return_value=executor):
+            with self.captureOnCommitCallbacks() as callbacks:
+                ticket = self.create_ticket(filename, content)
+            ticket.refresh_from_db()
+            self.assertTrue(ticket.image_pending)
+            self.assertIsNotNone(ticket.image_queued_at)
+            for callback in callbacks:
+                callback()
+        ticket.refresh_from_db()
+        return ticket
+
+    def test_pool_marks_ticket_ready(self):
+        ticket = self.create_in_pool(
+            ImmediateExecutor(), "cover.jpg", image_content((400, 600)))
+        self.assertEqual(ticket.image_state, Ticket.ImageState.READY)
+        self.assertFalse(ticket.image_pending)
+        self.assertEqual(set(ticket.renditions), set(RENDITION_SIZES))
+
+    def test_unreadable_image_is_marked_failed(self):
+        with self.assertLogs("review.images", "ERROR"):
+            ticket = self.create_in_pool(
+                ImmediateExecutor(), "broken.jpg", b"not an image")
+        self.assertEqual(ticket.image_state, Ticket.ImageState.FAILED)
+        self.assertEqual(ticket.renditions, {})
+
+        # Même résultat en mode synchrone
+        with self.settings(IMAGE_PROCESSING="sync"), \
+                self.assertLogs("review.images", "ERROR"):
+            ticket = self.create_ticket("broken-sync.jpg", b"not an image")
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.image_state, Ticket.ImageState.FAILED)
+
+    def test_stale_pending_images_are_requeued(self):
+        executor = ImmediateExecutor(stalled=True)
+        ready = self.create_in_pool(
+            executor, "cover.jpg", image_content((40, 60)))
+        failed = self.create_in_pool(executor, "broken.jpg", b"not an image")
+        fresh = self.create_in_pool(
+            executor, "fresh.jpg", image_content((40, 60), color="red"))
+
+        output = io.StringIO()
+        call_command("requeue_images", stdout=output)
+        self.assertIn("0 pending images processed.", output.getvalue())
+
+        Ticket.objects.filter(pk=ready.pk).update(
+            image_queued_at=ready.image_queued_at - timedelta(hours=1))
+        # Billet mis en attente avant l'ajout de la date
+        Ticket.objects.filter(pk=failed.pk).update(image_queued_at=None)
+        output = io.StringIO()
+        with self.assertLogs("review.images", "ERROR"):
+            call_command("requeue_images", stdout=output)
+        self.assertIn("2 pending images processed.", output.getvalue())
+
+        states = dict(Ticket.objects.values_list("pk", "image_state"))
+        self.assertEqual(states, {
+            ready.pk: Ticket.ImageState.READY,
+            failed.pk: Ticket.ImageState.FAILED,
+            fresh.pk: Ticket.ImageState.PENDING,
+        })
+
+
+class GarbageCollectMediaTests(MediaTestCase):
+    """Vérifie que ``gc_media`` ne supprime que les fichiers orphelins,
+    anciens et sans référence d'un envoi en cours."""
+
+    def media_files(self):
+        return {
+            os.path.relpath(os.path.join(directory, name),
+                            default_storage.location).replace(os.sep, "/")
+            for directory, _, names in os.walk(default_storage.location)
+            for name in names
+        }
+
+    def write(self, name, age_hours=48):
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as output:
+            output.write(b"orphan")
+        timestamp = time.time() - age_hours * 3600
+        os.utime(path, (timestamp, timestamp))
+
+    def test_only_old_orphans_are_deleted(self):
+        self.create_ticket("cover.jpg", image_content((400, 600)))
+        referenced = self.media_files()
+
+        orphans = {"images/aa/orphan.jpg", "renditions/bb/orphan.webp"}
+        for name in orphans:
+            self.write(name)
+        # Fichier récent (envoi en cours) et fichier d'un ImageBlob encore
+        # référencé : conservés
+        self.write("images/cc/recent.jpg", age_hours=1)
+        self.write("images/dd/uploading.jpg")
+        ImageBlob.objects.create(
+            name="images/dd/uploading.jpg", size=6, ref_count=1)
+        ImageBlob.objects.create(
+            name="images/aa/orphan.jpg", size=6, ref_count=0)
+        # Fichiers référencés anciens : conservés eux aussi
+        for name in referenced:
+            timestamp = time.time() - 48 * 3600
+            os.utime(default_storage.path(name), (timestamp, timestamp))
+        files = self.media_files()
+
+        output = io.StringIO()
+        call_command("gc_media", dry_run=True, stdout=output)
+        self.assertIn("2 would be deleted, 12 bytes", output.getvalue())
+        self.assertEqual(self.media_files(), files)
+
+        output = io.StringIO()
+        call_command("gc_media", stdout=output)
+        self.assertIn("2 deleted, 12 bytes", output.getvalue())
+        self.assertEqual(self.media_files(), files - orphans)
+        self.assertCountEqual(
+            ImageBlob.objects.values_list("name", flat=True),
+            [Ticket.objects.get().image.name, "images/dd/uploading.jpg"])
+
+
+class ReprocessImagesTests(MediaTestCase):
+    """Vérifie que ``reprocess_images`` produit à nouveau les déclinaisons
+    manquantes."""
+
+    def test_missing_renditions_are_regenerated(self):
+        content = image_content((400, 600))
+        first = self.create_ticket("cover.jpg", content)
+        # Même image : traitée une seule fois
+        second = self.create_ticket("same-cover.jpg", content)
+        with self.assertLogs("review.images", "ERROR"):
+            broken = self.create_ticket("broken.jpg", b"not an image")
+        first.refresh_from_db()
+        renditions = first.renditions
+
+        # Déclinaisons perdues (nouvelles tailles, stockage vidé...)
+        for rendition in renditions.values():
+            for extension in ("webp", "jpeg"):
+                if default_storage.exists(rendition[extension]):
+                    default_storage.delete(rendition[extension])
+        Ticket.objects.update(
+            renditions={}, image_state=Ticket.ImageState.PENDING)
+
+        output, errors = io.StringIO(), io.StringIO()
+        call_command("reprocess_images", workers=1, batch_size=2,
+                     stdout=output, stderr=errors)
+        self.assertIn("2 images processed, 1 failed", output.getvalue())
+        self.assertIn(f"Ticket {broken.pk}:", errors.getvalue())
+
+        for ticket in (first, second):
+            ticket.refresh_from_db()
+            self.assertEqual(ticket.image_state, Ticket.ImageState.READY)
+            self.assertEqual(ticket.renditions, renditions)
+        for rendition in renditions.values():
+            for extension in ("webp", "jpeg"):
+                self.assertTrue(default_storage.exists(rendition[extension]))
+        broken.refresh_from_db()
+        self.assertEqual(broken.renditions, {})
+
+        # Reprise après un identifiant
+        Ticket.objects.update(renditions={})
+        call_command("reprocess_images", workers=1, after_id=first.pk,
+                     stdout=io.StringIO(), stderr=io.StringIO())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.renditions, {})
+        self.assertEqual(second.renditions, renditions)
+
+
+class SearchTests(TestCase):
+    """Vérifie l'index de recherche plein texte et son classement."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="searcher")
+        self.title_match = Ticket.objects.create(
+            title="Mémoires d'une geisha", description="Un roman.",
+            user=self.user,
+        )
+        self.body_match = Ticket.objects.create(
+            title="Kyoto", description="Une geisha raconte sa vie.",
+            user=self.user,
+        )
+        self.review = Review.objects.create(
+            ticket=self.body_match, rating=4, headline="Superbe",
+            body="Le destin d'une geisha.", user=self.user,
+        )
+
+    def test_results_are_ranked_and_kept_in_sync(self):
+        posts = search("GEISHA").posts
+        self.assertEqual(posts[0], self.title_match)
+        self.assertCountEqual(
+            [(post.type_of_content, post.pk) for post in posts[1:]],
+            [("TICKET", self.body_match.pk), ("REVIEW", self.review.pk)],
+        )
+
+        # Accents ignorés, dernier mot complété
+        self.assertEqual(search("memoires gei").posts, [self.title_match])
+
+        self.review.body = "Un autre sujet."
+        self.review.save()
+        self.title_match.delete()
+        self.assertEqual(search("geisha").posts, [self.body_match])
+        self.assertEqual(search('"(*').posts, [])
+
+    def test_json_endpoint_is_paginated(self):
+        self.client.force_login(self.user)
+        with self.settings(SEARCH_PAGE_SIZE=2):
+            response = self.client.get(
+                reverse("review:search_json"), {"q": "geisha", "page": 2})
+
+        data = response.json()
+        self.assertEqual(data["page"], 2)
+        self.assertFalse(data["has_next"])
+        self.assertEqual(len(data["results"]), 1)
+
+
+class RatingAggregatesTests(TestCase):
+    """Vérifie les agrégats des notes tenus à jour sur les billets et la
+    page des billets les mieux notés."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="rater")
+        self.ticket = Ticket.objects.create(title="Noté", user=self.user)
+        self.reviews = [
+            Review.objects.create(
+                ticket=self.ticket, rating=rating, headline=f"Note {rating}",
+                user=self.user,
+            )
+            for rating in (5, 4, 4)
+        ]
+
+    def assertAggregates(self, ticket, distribution):
+        ticket.refresh_from_db()
+        count = sum(distribution)
+        total = sum(rating * n for rating, n in enumerate(distribution))
+        self.assertEqual(ticket.rating_distribution, distribution)
+        self.assertEqual(ticket.review_count, count)
+        self.assertEqual(ticket.rating_sum, total)
+        if count:
+            self.assertAlmostEqual(ticket.rating_avg, total / count)
+        else:
+            self.assertIsNone(ticket.rating_avg)
+
+    def test_aggregates_follow_review_writes(self):
+        self.assertAggregates(self.ticket, [0, 0, 0, 0, 2, 1])
+
+        # Modification de la note depuis le formulaire (valeur en chaîne)
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("review:posts_modify_review_page",
+                    args=[self.reviews[0].pk]),
+            {"headline": "Note 1", "rating": "1", "body": "",
+             "title": "Noté", "description": ""},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertAggregates(self.ticket, [0, 1, 0, 0, 2, 0])
+
+        other = Ticket.objects.create(title="Autre", user=self.user)
+        self.reviews[1].ticket = other
+        self.reviews[1].save()
+        self.assertAggregates(other, [0, 0, 0, 0, 1, 0])
+
+        for review in Review.objects.filter(ticket=self.ticket):
+            review.delete()
+        self.assertAggregates(self.ticket, [0, 0, 0, 0, 0, 0])
+
+    def test_moved_review_leaves_its_previous_ticket(self):
+        other = Ticket.objects.create(title="Autre", user=self.user)
+        # Instance relue : le billet d'origine vient de la base
+        review = Review.objects.get(pk=self.reviews[0].pk)
+        review.ticket = other
+        review.rating = 2
+        review.save()
+        self.assertAggregates(self.ticket, [0, 0, 0, 0, 2, 0])
+        self.assertAggregates(other, [0, 0, 1, 0, 0, 0])
+
+        # Retour vers le billet d'origine
+        review.ticket = self.ticket
+        review.save()
+        self.assertAggregates(self.ticket, [0, 0, 1, 0, 2, 0])
+        self.assertAggregates(other, [0, 0, 0, 0, 0, 0])
+
+    def test_ticket_cascade_keeps_other_aggregates(self):
+        other = Ticket.objects.create(title="Autre", user=self.user)
+        self.reviews[1].ticket = other
+        self.reviews[1].save()
+
+        # Les critiques du billet sont supprimées en cascade
+        self.ticket.delete()
+        self.assertFalse(Review.objects.filter(
+            pk__in=[self.reviews[0].pk, self.reviews[2].pk]).exists())
+        self.assertAggregates(other, [0, 0, 0, 0, 1, 0])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.review_count, 1)
+
+        other.delete()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.review_count, 0)
+
+    def test_recount_repairs_aggregates(self):
+        Ticket.objects.filter(pk=self.ticket.pk).update(
+            rating_sum=0, rating_avg=None, rating_4_count=7)
+        call_command("recount_reviews", stdout=io.StringIO())
+        self.assertAggregates(self.ticket, [0, 0, 0, 0, 2, 1])
+
+    def test_recount_covers_every_id_range(self):
+        tickets = [self.ticket] + [
+            Ticket.objects.create(title=f"Billet {index}", user=self.user)
+            for index in range(4)
+        ]
+        for ticket in tickets[1:]:
+            Review.objects.create(
+                ticket=ticket, rating=3, headline="Trois", user=self.user)
+        # Un billet supprimé laisse un trou dans les identifiants
+        tickets.pop(2).delete()
+        # Premier billet, billets de part et d'autre d'une limite de
+        # tranche et dernier billet faussés
+        Ticket.objects.filter(pk__in=[t.pk for t in tickets]).update(
+            review_count=9, rating_sum=0, rating_avg=None)
+
+        output = io.StringIO()
+        call_command("recount_reviews", batch_size=2, stdout=output)
+        self.assertIn("4 tickets repaired.", output.getvalue())
+        self.assertAggregates(tickets[0], [0, 0, 0, 0, 2, 1])
+        for ticket in tickets[1:]:
+            self.assertAggregates(ticket, [0, 0, 0, 1, 0, 0])
+
+        # Billets justes : aucun n'est réécrit
+        output = io.StringIO()
+        call_command("recount_reviews", batch_size=2, stdout=output)
+        self.assertIn("0 tickets repaired.", output.getvalue())
+
+    def test_top_rated_page_applies_minimum(self):
+        best = Ticket.objects.create(title="Meilleur", user=self.user)
+        Review.objects.create(
+            ticket=best, rating=5, headline="Parfait", user=self.user)
+
+        self.client.force_login(self.user)
+        with self.settings(TOP_RATED_MIN_REVIEWS=2):
+            response = self.client.get(reverse("review:top_rated_page"))
+        self.assertEqual(list(response.context["page"]), [self.ticket])
+
+        with self.settings(TOP_RATED_MIN_REVIEWS=1):
+            response = self.client.get(reverse("review:top_rated_page"))
+        self.assertEqual(list(response.context["page"]), [best, self.ticket])
+
+
+@override_settings(FEED_FANOUT_LIMIT=2)
+class PullAuthorFeedTests(TestCase):
+    """Vérifie les flux matérialisés en présence d'un auteur lu en mode
+    « pull »."""
+
+    def setUp(self):
+        follow_graph.reset()
+        self.owner = User.objects.create(username="owner")
+        self.popular = User.objects.create(username="popular")
+        fan = User.objects.create(username="fan")
+        for follower in (self.owner, fan):
+            UserFollows.objects.create(
+                user=follower, followed_user=self.popular)
+        ticket = Ticket.objects.create(title="Mon billet", user=self.owner)
+        self.review = Review.objects.create(
+            ticket=ticket, rating=4, headline="Pull", user=self.popular)
+        follow_graph.load()
+
+    def test_review_on_own_ticket_survives_rebuild_and_unfollow(self):
+        call_command("rebuild_feeds", "owner", stdout=io.StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            UserFollows.objects.get(
+                user=self.owner, followed_user=self.popular).delete()
+
+        self.assertTrue(FeedEntry.objects.filter(
+            owner=self.owner, object_id=self.review.pk,
+            author=self.popular).exists())
+        posts = get_feed_page(self.owner).posts
+        self.assertEqual(
+            [post.pk for post in posts if isinstance(post, Review)],
+            [self.review.pk])
+
+
+@override_settings(FEED_FANOUT_LIMIT=3)
+class FeedRebuildTests(TestCase):
+    """Vérifie les entrées écrites par la reconstruction des flux par
+    tranches, y compris en présence d'un auteur lu en mode « pull »."""
+
+    def setUp(self):
+        follow_graph.reset()
+        self.readers = [
+            User.objects.create(username=f"reader_{index}")
+            for index in range(2)
+        ]
+        for reader in self.readers:
+            seed_posts(reader, 3)
+
+        # Auteur lu en mode « pull » (3 abonnés), critique d'un billet d'un
+        # lecteur qui le suit
+        self.popular = User.objects.create(username="popular")
+        fan = User.objects.create(username="fan")
+        for follower in (*self.readers, fan):
+            UserFollows.objects.create(
+                user=follower, followed_user=self.popular)
+        self.popular_ticket = Ticket.objects.create(
+            title="Populaire", user=self.popular)
+        self.pull_review = Review.objects.create(
+            ticket=Ticket.objects.filter(user=self.readers[0]).first(),
+            rating=2, headline="Pull", user=self.popular,
+        )
+        follow_graph.load()
+
+    def entries(self):
+        return set(FeedEntry.objects.values_list(
+            "owner", "author", "content_type", "object_id", "time_created"))
+
+    def expected_entries(self):
+        """Entrées attendues, déduites des règles du flux : publications
+        du propriétaire et des auteurs suivis hors mode « pull », billets
+        sans critique seulement, et critiques des billets du propriétaire
+        quel que soit leur auteur."""
+
+        review_type = ContentType.objects.get_for_model(Review).pk
+        ticket_type = ContentType.objects.get_for_model(Ticket).pk
+        pull = {self.popular.pk}
+        expected = set()
+        for owner in User.objects.all():
+            authors = {owner.pk} | (set(
+                UserFollows.objects.filter(user=owner)
+                .values_list("followed_user", flat=True)) - pull)
+            for review in Review.objects.select_related("ticket"):
+                if (review.user_id in authors
+                        or review.ticket.user_id == owner.pk):
+                    expected.add((owner.pk, review.user_id, review_type,
+                                  review.pk, review.time_created))
+            for ticket in Ticket.objects.filter(review_count=0):
+                if ticket.user_id in authors:
+                    expected.add((owner.pk, ticket.user_id, ticket_type,
+                                  ticket.pk, ticket.time_created))
+        return expected
+
+    def test_bulk_rebuild_writes_expected_entries(self):
+        users = list(User.objects.order_by("pk"))
+        written = rebuild_feeds_in_bulk(users[0].pk, users[-1].pk)
+
+        expected = self.expected_entries()
+        self.assertEqual(self.entries(), expected)
+        self.assertEqual(written, len(expected))
+
+        owner = self.readers[0]
+        # La critique de l'auteur « pull » sur le billet du lecteur est
+        # matérialisée ; son billet sans critique ne l'est pas
+        self.assertTrue(FeedEntry.objects.filter(
+            owner=owner, object_id=self.pull_review.pk,
+            author=self.popular).exists())
+        self.assertFalse(FeedEntry.objects.filter(
+            owner=owner, author=self.popular,
+            object_id=self.popular_ticket.pk,
+            content_type=ContentType.objects.get_for_model(Ticket),
+        ).exists())
+
+    def test_rebuild_feed_writes_expected_entries(self):
+        written = sum(rebuild_feed(user) for user in User.objects.all())
+
+        expected = self.expected_entries()
+        self.assertEqual(self.entries(), expected)
+        self.assertEqual(written, len(expected))
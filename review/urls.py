@@ -9,12 +9,18 @@ from .views import (
     posts_modify_review_view,
     posts_delete_view,
     posts_modify_ticket_view,
+    search_page_view,
+    search_json_view,
+    top_rated_page_view,
 )
 
 app_name = "review"
 
 urlpatterns = [
     path("feeds/", feeds_page_view, name="feeds_page"),
+    path("search/", search_page_view, name="search_page"),
+    path("search/json/", search_json_view, name="search_json"),
+    path("top_rated/", top_rated_page_view, name="top_rated_page"),
     path("ask_review/", ask_review_view, name="ask_review"),
     path("create_review/", create_review_view, name="create_review"),
     path(
@@ -1,51 +1,130 @@
 from django.contrib import messages
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db.models import CharField, Q, Value
+from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from itertools import chain
 
+from utilities.routers import replica_reads
+
+from .feed_cache import get_feed_page
+from .feeds import REVIEW
 from .forms import (
     TicketForm,
     ReviewForm,
 )
 from .models import Ticket, Review
+from .ratings import top_rated_queryset
+from .search import search
 
 
 #  Vue de la page générale des flux
 @login_required
+@replica_reads
 def feeds_page_view(request):
     """"La page générale des flux affiche toutes les critiques des
     utilisateurs que je suis, mes propres critiques ainsi que les critiques
     des utilisateurs qui me suivent. Elle affiche également tous les billets
     sans aucune critique, des utilisateurs que je suis en train de suivre.
+
+    Le flux est paginé par curseur : `?before=<curseur>` affiche les
+    publications plus anciennes, `?after=<curseur>` les plus récentes.
     """
 
-    # Récupération des critiques et des billets associés à l'utilisateur
-    # connecté
-    reviews = (
-        Review.objects.filter(
-            Q(user__followed_by__user=request.user)
-            | Q(user=request.user)
-            | Q(ticket__user=request.user)
-        )
-        .distinct()
-        .annotate(type_of_content=Value("REVIEW", CharField()))
-    )
-    tickets = (
-        Ticket.objects.filter(reviews__isnull=True)
-        .filter(Q(user__followed_by__user=request.user) | Q(user=request.user))
-        .distinct()
-        .annotate(type_of_content=Value("TICKET", CharField()))
-    )
-
-    # Fusionner et trier les critiques et les billets par date de création
-    posts = sorted(
-        chain(reviews, tickets), key=lambda post: post.time_created,
-        reverse=True
-    )
+    # Récupération du curseur et du sens de lecture depuis l'URL
+    cursor = request.GET.get("before") or request.GET.get("after")
+    older = "after" not in request.GET
+
+    try:
+        page = get_feed_page(request.user, cursor=cursor, older=older)
+    except ValueError:
+        # Curseur invalide : retour à la première page
+        page = get_feed_page(request.user)
 
     # Rendre la page avec la liste des critiques et des billets
-    return render(request, "feeds/feeds_page.html", context={"posts": posts})
+    context = {
+        "posts": page.posts,
+        "older_cursor": page.older_cursor,
+        "newer_cursor": page.newer_cursor,
+    }
+    return render(request, "feeds/feeds_page.html", context=context)
+
+
+def _search_params(request):
+    """Retourne la recherche ``?q=`` et le numéro de page ``?page=``."""
+
+    query = request.GET.get("q", "").strip()
+    try:
+        page = int(request.GET.get("page", 1))
+    except ValueError:
+        page = 1
+    return query, page
+
+
+# Vue de la recherche dans les billets et les critiques
+@login_required
+def search_page_view(request):
+    """La page de recherche affiche les billets et les critiques dont le
+    titre ou le texte contient les mots recherchés, des plus pertinents aux
+    moins pertinents."""
+
+    query, page = _search_params(request)
+    results = search(query, page)
+
+    context = {
+        "query": query,
+        "posts": results.posts,
+        "page": results.page,
+        "has_next": results.has_next,
+    }
+    return render(request, "feeds/search_page.html", context=context)
+
+
+@login_required
+def search_json_view(request):
+    """Résultats de la recherche au format JSON (même paramètres que la
+    page de recherche)."""
+
+    query, page = _search_params(request)
+    results = search(query, page)
+
+    posts = []
+    for post in results.posts:
+        review = post.type_of_content == REVIEW
+        posts.append({
+            "type": post.type_of_content,
+            "id": post.pk,
+            "title": post.headline if review else post.title,
+            "text": (post.body if review else post.description) or "",
+            "user": post.user.username,
+            "time_created": post.time_created.isoformat(),
+            "ticket_id": post.ticket_id if review else post.pk,
+        })
+
+    return JsonResponse({
+        "query": query,
+        "page": results.page,
+        "has_next": results.has_next,
+        "results": posts,
+    })
+
+
+# Vue des billets les mieux notés
+@login_required
+def top_rated_page_view(request):
+    """La page des billets les mieux notés affiche, de la meilleure à la
+    moins bonne moyenne, les billets ayant au moins TOP_RATED_MIN_REVIEWS
+    critiques. Les moyennes sont lues sur les billets (review.ratings), sans
+    parcourir les critiques."""
+
+    paginator = Paginator(top_rated_queryset(), settings.TOP_RATED_PAGE_SIZE)
+    page = paginator.get_page(request.GET.get("page"))
+
+    context = {
+        "page": page,
+        "min_reviews": settings.TOP_RATED_MIN_REVIEWS,
+    }
+    return render(request, "feeds/top_rated_page.html", context=context)
 
 
 # Vue pour demander une critique
@@ -134,7 +213,7 @@ def create_review_for_ticket_view(request, pk):
     """
 
     # Récupération du ticket choisi
-    get_ticket = Ticket.objects.get(pk=pk)
+    get_ticket = Ticket.objects.select_related("user").get(pk=pk)
 
     if request.method == "POST":
         # Création d'un formulaire de critique avec les données de la requête
@@ -172,12 +251,15 @@ def create_review_for_ticket_view(request, pk):
 
 # Vue pour afficher tous les billets/critiques créés par l'utilisateur connecté
 @login_required
+@replica_reads
 def posts_page_view(request):
     """Affiche tous les billets/critiques créés par l'utilisateur connecté"""
 
-    # Récupération des critiques et des billets liés à l'utilisateur connecté
-    reviews = Review.objects.filter(user=request.user)
-    tickets = Ticket.objects.filter(user=request.user)
+    # Récupération des critiques et des billets liés à l'utilisateur connecté,
+    # avec leurs auteurs et billets chargés dans la même requête
+    reviews = Review.objects.filter(user=request.user).select_related(
+        "user", "ticket__user")
+    tickets = Ticket.objects.filter(user=request.user).select_related("user")
 
     # Contexte pour rendre la page
     context = {
@@ -199,7 +281,8 @@ def posts_modify_review_view(request, pk):
     """
 
     # Récupération des données de la critique à partir de la base de données:
-    instance_review = get_object_or_404(Review, pk=pk)
+    instance_review = get_object_or_404(
+        Review.objects.select_related("ticket__user"), pk=pk)
 
     # Vérification si l'auteur de la critique est également le créateur du
     # ticket:
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class UiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "utilities"
+
+    def ready(self):
+        # Réglages des nouvelles connexions (pragmas SQLite)
+        from .db import configure_connection
+
+        connection_created.connect(configure_connection)
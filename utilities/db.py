@@ -0,0 +1,20 @@
+"""Réglages des connexions à la base de données."""
+
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(cursor, pragmas):
+    """Applique ``pragmas`` (``{nom: valeur}``) à la connexion SQLite de
+    ``cursor``."""
+
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Récepteur de ``connection_created`` : applique ``SQLITE_PRAGMAS``
+    aux nouvelles connexions SQLite."""
+
+    if connection.vendor == "sqlite" and settings.SQLITE_PRAGMAS:
+        with connection.cursor() as cursor:
+            apply_sqlite_pragmas(cursor, settings.SQLITE_PRAGMAS)
@@ -0,0 +1,193 @@
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from litrevu.database import TUNED_SQLITE_PRAGMAS
+from utilities.db import apply_sqlite_pragmas
+
+SQLITE_MODES = [
+    ("rollback journal", {}),
+    ("WAL + pragmas", TUNED_SQLITE_PRAGMAS),
+]
+
+_SCHEMA = [
+    "CREATE TABLE post (id INTEGER PRIMARY KEY, owner INTEGER NOT NULL, "
+    "body TEXT NOT NULL, time_created REAL NOT NULL)",
+    "CREATE INDEX post_owner_idx ON post (owner, id)",
+]
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+    """Compare les modes de la base de données sous charge concurrente.
+
+    SQLite : des threads lecteurs et écrivains travaillent sur un fichier
+    temporaire, avec le journal par défaut puis avec le journal WAL et les
+    réglages de ``litrevu.database`` ; le module ``sqlite3`` libère le GIL
+    pendant les requêtes, les verrous du fichier sont donc bien mis en
+    concurrence.
+
+    PostgreSQL (si c'est la base configurée) : durée d'une requête simple
+    avec une connexion par requête (``CONN_MAX_AGE = 0``) puis avec une
+    connexion persistante.
+    """
+
+    help = "Benchmark SQLite journal modes and Postgres connection reuse."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--readers", type=int, default=4,
+            help="Number of reading threads (default: 4).",
+        )
+        parser.add_argument(
+            "--writers", type=int, default=2,
+            help="Number of writing threads (default: 2).",
+        )
+        parser.add_argument(
+            "--seconds", type=float, default=5,
+            help="Duration of each run (default: 5).",
+        )
+        parser.add_argument(
+            "--rows", type=int, default=50000,
+            help="Number of rows created before each run (default: 50000).",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"SQLite: {options['readers']} readers, {options['writers']} "
+            f"writers, {options['seconds']}s per mode")
+        self.stdout.write(
+            f"{'mode':<18} {'reads/s':>9} {'read p99 (ms)':>14} "
+            f"{'writes/s':>9} {'write p99 (ms)':>15} {'locked':>7}")
+        for label, pragmas in SQLITE_MODES:
+            with tempfile.TemporaryDirectory() as directory:
+                result = self.sqlite_run(
+                    Path(directory) / "bench.sqlite3", pragmas, options)
+            reads, writes, locked, seconds = result
+            self.stdout.write(
+                f"{label:<18} {len(reads) / seconds:>9.0f} "
+                f"{_percentile(reads, 99):>14.2f} "
+                f"{len(writes) / seconds:>9.0f} "
+                f"{_percentile(writes, 99):>15.2f} {locked:>7}")
+
+        if connection.vendor == "postgresql":
+            self.postgres_run()
+
+    # SQLite
+
+    def sqlite_run(self, path, pragmas, options):
+        """Retourne ``(latences des lectures, latences des écritures,
+        nombre d'erreurs « database is locked », durée)``."""
+
+        rng = random.Random(options["seed"])
+        db = self.sqlite_connect(path, pragmas)
+        for statement in _SCHEMA:
+            db.execute(statement)
+        db.executemany(
+            "INSERT INTO post (owner, body, time_created) VALUES (?, ?, ?)",
+            [(rng.randrange(1000), "x" * 200, time.time())
+             for _ in range(options["rows"])],
+        )
+        db.commit()
+        db.close()
+
+        stop = threading.Event()
+        reads, writes, errors = [], [], []
+        threads = [
+            threading.Thread(target=self.sqlite_worker, args=(
+                path, pragmas, self.sqlite_read, stop, reads, errors, seed))
+            for seed in range(options["readers"])
+        ] + [
+            threading.Thread(target=self.sqlite_worker, args=(
+                path, pragmas, self.sqlite_write, stop, writes, errors,
+                seed))
+            for seed in range(options["writers"])
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options["seconds"])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return reads, writes, len(errors), time.perf_counter() - start
+
+    @staticmethod
+    def sqlite_connect(path, pragmas):
+        # Même attente d'un verrou que la configuration de Django
+        db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        apply_sqlite_pragmas(db.cursor(), pragmas)
+        return db
+
+    def sqlite_worker(self, path, pragmas, operation, stop, latencies,
+                      errors, seed):
+        rng = random.Random(seed)
+        db = self.sqlite_connect(path, pragmas)
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    operation(db, rng)
+                except sqlite3.OperationalError:
+                    db.rollback()
+                    errors.append(1)
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            db.close()
+
+    @staticmethod
+    def sqlite_read(db, rng):
+        """Une page de flux : les 20 dernières publications d'un auteur."""
+
+        db.execute(
+            "SELECT id, owner, body, time_created FROM post WHERE owner = ? "
+            "ORDER BY id DESC LIMIT 20", [rng.randrange(1000)],
+        ).fetchall()
+
+    @staticmethod
+    def sqlite_write(db, rng):
+        """Une publication et son entrée de flux, dans une transaction."""
+
+        owner = rng.randrange(1000)
+        db.executemany(
+            "INSERT INTO post (owner, body, time_created) VALUES (?, ?, ?)",
+            [(owner, "x" * 200, time.time()) for _ in range(2)],
+        )
+        db.commit()
+
+    # PostgreSQL
+
+    def postgres_run(self, requests=200):
+        """Compare une connexion par requête à une connexion persistante
+        (vérifiée entre deux requêtes, comme à la fin d'une requête HTTP)."""
+
+        self.stdout.write(f"\nPostgreSQL: {requests} requests per mode")
+        for label, close in (
+            ("CONN_MAX_AGE = 0", connection.close),
+            ("persistent", connection.close_if_unusable_or_obsolete),
+        ):
+            durations = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+                close()
+                durations.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f"{label:<18} p50 {_percentile(durations, 50):.2f} ms, "
+                f"p99 {_percentile(durations, 99):.2f} ms")
@@ -0,0 +1,144 @@
+import re
+from importlib import import_module
+
+from django.conf import global_settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from authentification.models import User, UserFollows
+from review.models import Review, Ticket
+
+# Réglages du profil de production comparés à ceux de litrevu.settings
+PROFILE_SETTINGS = (
+    "SESSION_ENGINE", "MESSAGE_STORAGE", "AUTHENTICATION_BACKENDS")
+
+# Lecture de l'utilisateur connecté par AuthenticationMiddleware
+_USER_QUERY = re.compile(
+    r'FROM "authentification_user" WHERE "authentification_user"."id" = ')
+
+
+def _profile(module):
+    """Retourne les réglages ``PROFILE_SETTINGS`` du module ``module`` (ou
+    leurs valeurs par défaut)."""
+
+    settings = import_module(module)
+    return {
+        name: getattr(settings, name, getattr(global_settings, name))
+        for name in PROFILE_SETTINGS
+    }
+
+
+class Command(BaseCommand):
+    """Compte les requêtes SQL par page (total, session, utilisateur
+    connecté) avec ``litrevu.settings`` puis avec le profil de production,
+    sur un parcours type : flux, publications, abonnements, modification
+    d'une critique (message de succès) et retour aux publications.
+
+    Les données sont créées dans une transaction annulée à la fin de la
+    mesure : la base n'est pas modifiée.
+    """
+
+    help = ("Count the SQL queries per request with the default and the "
+            "production settings.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile", default="litrevu.settings_production",
+            help="Settings module compared with litrevu.settings "
+                 "(default: litrevu.settings_production).",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3,
+            help="Number of runs of the scenario; the first one fills the "
+                 "caches (default: 3).",
+        )
+
+    def handle(self, *args, **options):
+        profiles = [
+            ("litrevu.settings", _profile("litrevu.settings")),
+            (options["profile"], _profile(options["profile"])),
+        ]
+        with transaction.atomic():
+            user, review = self.seed()
+            totals = []
+            for name, overrides in profiles:
+                with override_settings(**overrides):
+                    totals.append(
+                        self.measure(name, user, review, options["repeat"]))
+            transaction.set_rollback(True)
+
+        (before, requests), (after, _) = totals
+        self.stdout.write(self.style.SUCCESS(
+            f"{before / requests:.1f} -> {after / requests:.1f} queries per "
+            f"request ({before - after} fewer over {requests} requests)."))
+
+    def seed(self):
+        """Crée un lecteur qui suit quelques auteurs, et une critique du
+        lecteur à modifier."""
+
+        user = User.objects.create(username=f"bench_requests_{id(self)}")
+        for index in range(3):
+            author = User.objects.create(
+                username=f"{user.username}_author_{index}")
+            UserFollows.objects.create(user=user, followed_user=author)
+            ticket = Ticket.objects.create(
+                title=f"Ticket {index}", user=author)
+            Review.objects.create(
+                ticket=ticket, rating=index, headline=f"Review {index}",
+                user=author,
+            )
+        ticket = Ticket.objects.create(title="Own ticket", user=user)
+        review = Review.objects.create(
+            ticket=ticket, rating=3, headline="Own review", user=user)
+        return user, review
+
+    def scenario(self, user, review, run):
+        """Retourne les requêtes HTTP du parcours ``(libellé, appel)``."""
+
+        modify_url = reverse(
+            "review:posts_modify_review_page", args=[review.pk])
+        data = {
+            "headline": review.headline, "rating": str(run % 6), "body": "",
+            "title": review.ticket.title, "description": "",
+        }
+        return [
+            ("GET feeds", lambda client: client.get(
+                reverse("review:feeds_page"))),
+            ("GET posts", lambda client: client.get(
+                reverse("review:posts_page"))),
+            ("GET abo", lambda client: client.get(
+                reverse("authentification:abo_page", args=[user.username]))),
+            ("POST modify review", lambda client: client.post(
+                modify_url, data)),
+            ("GET posts (message)", lambda client: client.get(
+                reverse("review:posts_page"))),
+        ]
+
+    def measure(self, name, user, review, repeat):
+        """Affiche les requêtes de la dernière exécution du parcours et
+        retourne ``(nombre total de requêtes, nombre de pages)``."""
+
+        client = Client(HTTP_HOST="127.0.0.1")
+        client.force_login(user)
+        for run in range(repeat):
+            rows = []
+            for label, request in self.scenario(user, review, run):
+                with CaptureQueriesContext(connection) as queries:
+                    request(client)
+                sql = [query["sql"] for query in queries]
+                rows.append((
+                    label, len(sql),
+                    sum("django_session" in query for query in sql),
+                    sum(bool(_USER_QUERY.search(query)) for query in sql),
+                ))
+
+        self.stdout.write(f"\n{name} (run {repeat} of {repeat})")
+        self.stdout.write(
+            f"{'request':<22} {'queries':>8} {'session':>8} {'user':>8}")
+        for label, total, session, auth in rows:
+            self.stdout.write(
+                f"{label:<22} {total:>8} {session:>8} {auth:>8}")
+        return sum(row[1] for row in rows), len(rows)
@@ -0,0 +1,266 @@
+import io
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+
+from authentification.graph import follow_graph
+from authentification.models import User
+from review.models import Review, Ticket
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _commit():
+    """Retourne le commit courant du dépôt (None hors d'un dépôt git)."""
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class RowCounter:
+    """Compte les requêtes et les lignes lues par les curseurs de la
+    connexion (à installer avec ``connection.execute_wrapper``)."""
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        cursor = context["cursor"]
+        # Les méthodes de lecture sont remplacées sur l'instance du curseur
+        # pour compter les lignes effectivement renvoyées à Django
+        fetchone, fetchmany, fetchall = (
+            cursor.fetchone, cursor.fetchmany, cursor.fetchall)
+        cursor.fetchone = lambda: self.count_one(fetchone())
+        cursor.fetchmany = lambda *args: self.count_many(fetchmany(*args))
+        cursor.fetchall = lambda: self.count_many(fetchall())
+        return execute(sql, params, many, context)
+
+    def count_one(self, row):
+        if row is not None:
+            self.rows += 1
+        return row
+
+    def count_many(self, rows):
+        self.rows += len(rows)
+        return rows
+
+
+@contextmanager
+def _rolled_back():
+    """Exécute le bloc dans une transaction annulée à la sortie ; l'index
+    en mémoire des abonnements est vidé avant et après."""
+
+    follow_graph.reset()
+    try:
+        with transaction.atomic():
+            yield
+            transaction.set_rollback(True)
+    finally:
+        follow_graph.reset()
+        cache.clear()
+
+
+class Command(BaseCommand):
+    """Mesure les pages principales sur des jeux de données de tailles
+    croissantes et écrit les résultats en JSON.
+
+    Pour chaque taille, les données sont générées par ``seed_litrevu``
+    dans une transaction annulée à la fin de la mesure. Chaque vue est
+    appelée par le client de test au nom du lecteur qui suit le plus
+    d'utilisateurs (le flux le plus chargé) :
+
+    * une première passe chronométrée donne les latences p50 et p95 ;
+    * une seconde passe, plus lente, compte les requêtes et les lignes lues
+      et mesure le pic de mémoire Python (``tracemalloc``).
+
+    Le cache est vidé avant chaque appel, sauf avec ``--warm-cache``.
+    """
+
+    help = ("Benchmark the main views on seeded datasets of several sizes "
+            "and write the results to JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[100, 1000],
+            help="Numbers of users of the seeded datasets "
+                 "(default: 100 1000).",
+        )
+        parser.add_argument(
+            "--reviews-per-user", type=float, default=10,
+            help="Number of reviews per user (default: 10).",
+        )
+        parser.add_argument(
+            "--follows-per-user", type=float, default=20,
+            help="Mean number of users followed by each user (default: 20).",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20,
+            help="Number of timed calls of each view (default: 20).",
+        )
+        parser.add_argument(
+            "--warm-cache", action="store_true",
+            help="Keep the cache between calls instead of clearing it.",
+        )
+        parser.add_argument(
+            "--output", default="bench_views.json",
+            help="Path of the JSON results (default: bench_views.json).",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        results = []
+        self.stdout.write(
+            f"{'users':>7} {'view':<20} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+            f"{'queries':>8} {'rows':>8} {'peak (KiB)':>11}")
+        for size in options["sizes"]:
+            with _rolled_back():
+                reader, dataset = self.seed(size, options)
+                for label, request in self.scenario(reader):
+                    result = {
+                        "users": size, **dataset, "view": label,
+                        **self.measure(reader, request, options),
+                    }
+                    results.append(result)
+                    self.stdout.write(
+                        f"{size:>7} {label:<20} {result['p50_ms']:>9.2f} "
+                        f"{result['p95_ms']:>9.2f} {result['queries']:>8} "
+                        f"{result['rows']:>8} "
+                        f"{result['peak_memory_kib']:>11.0f}")
+
+        report = {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "options": {
+                name: options[name] for name in (
+                    "sizes", "reviews_per_user", "follows_per_user",
+                    "repeat", "warm_cache", "seed")
+            },
+            "results": results,
+        }
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"Results written to {options['output']}."))
+
+    def seed(self, size, options):
+        """Génère un jeu de données de ``size`` utilisateurs.
+
+        Returns:
+            tuple: Le lecteur mesuré et la description du jeu de données.
+        """
+
+        prefix = f"bench_views_{size}"
+        call_command(
+            "seed_litrevu", users=size,
+            follows_per_user=options["follows_per_user"],
+            reviews=round(size * options["reviews_per_user"]),
+            prefix=prefix, seed=options["seed"], stdout=io.StringIO(),
+        )
+        users = User.objects.filter(username__startswith=f"{prefix}_")
+        reader = users.order_by("-following_count", "pk").first()
+        dataset = {
+            "tickets": Ticket.objects.filter(user__in=users).count(),
+            "reviews": Review.objects.filter(user__in=users).count(),
+            "reader_following": reader.following_count,
+        }
+        return reader, dataset
+
+    def scenario(self, reader):
+        """Retourne les appels mesurés ``(libellé, appel)`` ; les écritures
+        sont annulées avec le jeu de données."""
+
+        ticket = Ticket.objects.create(title="Bench ticket", user=reader)
+        review = Review.objects.create(
+            ticket=ticket, rating=3, headline="Bench review", user=reader)
+        modify_url = reverse(
+            "review:posts_modify_review_page", args=[review.pk])
+        ticket_data = {"title": "Bench", "description": "Bench"}
+        review_data = {"headline": "Bench", "rating": "4", "body": "Bench"}
+
+        return [
+            ("GET feeds", lambda client: client.get(
+                reverse("review:feeds_page"))),
+            ("GET posts", lambda client: client.get(
+                reverse("review:posts_page"))),
+            ("GET abo", lambda client: client.get(
+                reverse("authentification:abo_page",
+                        args=[reader.username]))),
+            ("POST ask review", lambda client: client.post(
+                reverse("review:ask_review"), ticket_data)),
+            ("POST create review", lambda client: client.post(
+                reverse("review:create_review"),
+                {**ticket_data, **review_data})),
+            ("POST modify review", lambda client: client.post(
+                modify_url, {**review_data, "title": ticket.title,
+                             "description": ""})),
+        ]
+
+    def call(self, client, request, warm_cache):
+        """Appelle la vue et retourne la durée de l'appel, en millisecondes
+        (le vidage du cache n'est pas compté)."""
+
+        if not warm_cache:
+            cache.clear()
+        start = time.perf_counter()
+        response = request(client)
+        duration = (time.perf_counter() - start) * 1000
+        if response.status_code >= 400:
+            raise CommandError(
+                f"Unexpected status {response.status_code}")
+        return duration
+
+    def measure(self, reader, request, options):
+        client = Client(HTTP_HOST="127.0.0.1")
+        client.force_login(reader)
+        warm_cache = options["warm_cache"]
+
+        # Un premier appel, non mesuré, charge les modules et les gabarits
+        self.call(client, request, warm_cache)
+        durations = [
+            self.call(client, request, warm_cache)
+            for _ in range(options["repeat"])
+        ]
+
+        counter = RowCounter()
+        tracemalloc.start()
+        try:
+            with connection.execute_wrapper(counter):
+                self.call(client, request, warm_cache)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "p50_ms": round(_percentile(durations, 50), 3),
+            "p95_ms": round(_percentile(durations, 95), 3),
+            "queries": counter.queries,
+            "rows": counter.rows,
+            "peak_memory_kib": round(peak / 1024, 1),
+        }
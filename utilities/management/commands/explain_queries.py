@@ -0,0 +1,109 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from authentification.models import User, UserFollows
+from authentification.suggestions import suggestions_queryset
+from review.feeds import TICKET, feed_rows_queryset, pull_authors_queryset
+from review.models import Review, Ticket
+from review.ratings import top_rated_queryset
+
+# Lignes de plan signalant un parcours complet de table
+FULL_SCAN_PATTERNS = {
+    # SQLite : « SCAN review_ticket » sans « USING INDEX »
+    "sqlite": re.compile(r"^SCAN (?!.*\bUSING\b)\S+$"),
+    # PostgreSQL : « Seq Scan on review_ticket »
+    "postgresql": re.compile(r"\bSeq Scan on\b"),
+}
+
+
+def hot_querysets(user):
+    """Retourne les requêtes des pages flux, publications et abonnements
+    pour ``user``, sous la forme ``(libellé, queryset)``."""
+
+    # Les branches « pull » sont incluses en se prenant comme auteur ; la
+    # page suivante est lue après un curseur
+    cursor = (timezone.now(), TICKET, 0)
+    return [
+        ("feed: page", feed_rows_queryset(user, authors=[user.pk])),
+        ("feed: next page", feed_rows_queryset(
+            user, key=cursor, authors=[user.pk])),
+        # Chargement des publications de la page (review.feeds._hydrate)
+        ("feed: page reviews", Review.objects.select_related(
+            "user", "ticket__user").filter(pk__in=[0])),
+        ("feed: page tickets", Ticket.objects.select_related(
+            "user").filter(pk__in=[0])),
+        # Lus dans l'index des abonnements, sauf juste après une écriture
+        # de l'utilisateur (voir review.feeds.pull_authors)
+        ("feed: pull authors (after a write)", pull_authors_queryset(user)),
+        ("posts: reviews", Review.objects.filter(user=user).select_related(
+            "user", "ticket__user")),
+        ("posts: tickets", Ticket.objects.filter(user=user).select_related(
+            "user")),
+        ("abo: following", UserFollows.objects.filter(
+            user=user).select_related("followed_user")),
+        ("abo: followers", UserFollows.objects.filter(
+            followed_user=user).select_related("user")),
+        ("abo: suggestions", suggestions_queryset(user)),
+        ("top rated", top_rated_queryset()[:20]),
+    ]
+
+
+def explain(queryset):
+    """Retourne les lignes du plan d'exécution de ``queryset``."""
+
+    sql, params = queryset.query.sql_with_params()
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+
+        # Sur de petites tables, PostgreSQL préfère un parcours séquentiel :
+        # on le désactive pour vérifier qu'un chemin par index existe
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(f"EXPLAIN {sql}", params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+class Command(BaseCommand):
+    """Affiche le plan d'exécution des requêtes des pages principales et
+    échoue si l'une d'elles parcourt une table entière."""
+
+    help = ("Run EXPLAIN on the feed, posts and abo queries and fail on "
+            "full table scans.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", help="Username used to build the queries "
+                           "(default: first user).",
+        )
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f"Unsupported database vendor: {connection.vendor}")
+
+        users = User.objects.order_by("pk")
+        if options["user"]:
+            users = users.filter(username=options["user"])
+        user = users.first()
+        if user is None:
+            raise CommandError("No user found to build the queries.")
+
+        failures = []
+        for label, queryset in hot_querysets(user):
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            for line in explain(queryset):
+                if pattern.search(line.strip()):
+                    failures.append(label)
+                    self.stdout.write(self.style.ERROR(f"  {line}"))
+                else:
+                    self.stdout.write(f"  {line}")
+
+        if failures:
+            raise CommandError(
+                "Full table scan in: " + ", ".join(sorted(set(failures))))
+        self.stdout.write(self.style.SUCCESS("No full table scan."))
@@ -0,0 +1,358 @@
+import io
+import os
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image, ImageDraw
+
+from authentification.models import User, UserFollows
+from review.models import Review, Ticket
+
+# Les dates générées précèdent cette date : un même --seed produit les mêmes
+# données quel que soit le jour du lancement
+REFERENCE_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+WORDS = (
+    "roman policier fantastique histoire amour guerre paix voyage mer "
+    "montagne enfance mémoires poésie fleurs mal geisha trône verre dieu "
+    "étoiles egypte trilogie prince sang portrait femme suspense enquête "
+    "dragon royaume secret lettre jardin hiver été nuit lumière ombre "
+    "philosophie science ville campagne famille exil révolution empire"
+).split()
+
+# Répartition des notes des critiques, de 0 à 5
+RATING_WEIGHTS = (2, 3, 8, 20, 35, 32)
+
+COVER_SIZE = (500, 750)
+
+
+def _zipf_weights(size, exponent):
+    """Poids cumulés d'une loi de Zipf sur ``size`` rangs."""
+
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, size + 1)))
+
+
+def _sentence(rng, size):
+    return " ".join(rng.choices(WORDS, k=size)).capitalize()
+
+
+def _cover(seed, title):
+    """Dessine une couverture factice (dégradé et titre) dans un processus
+    du pool.
+
+    Returns:
+        bytes: L'image au format JPEG.
+    """
+
+    rng = random.Random(seed)
+    top = [rng.randrange(256) for _ in range(3)]
+    bottom = [rng.randrange(256) for _ in range(3)]
+    width, height = COVER_SIZE
+    image = Image.new("RGB", COVER_SIZE)
+    draw = ImageDraw.Draw(image)
+    for y in range(height):
+        color = tuple(
+            a + (b - a) * y // height for a, b in zip(top, bottom))
+        draw.line([(0, y), (width, y)], fill=color)
+    draw.rectangle([30, 280, width - 30, 400], fill=(255, 255, 255))
+    draw.text((50, 320), title[:40], fill=(0, 0, 0))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=80)
+    return output.getvalue()
+
+
+@contextmanager
+def _explicit_timestamps(*models):
+    """Désactive ``auto_now_add`` sur ``time_created`` : les dates générées
+    sont écrites telles quelles par ``bulk_create``."""
+
+    fields = [model._meta.get_field("time_created") for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    """Génère un jeu de données réaliste pour les tests de charge.
+
+    Les utilisateurs suivis sont tirés selon une loi de Zipf (quelques
+    comptes très suivis), de même que les billets critiqués (beaucoup de
+    billets restent sans critique). Les lignes sont écrites par
+    ``bulk_create``, par lots dans des transactions, et les couvertures
+    factices sont dessinées par un pool de processus. Un même ``--seed``
+    produit les mêmes données.
+
+    ``bulk_create`` n'envoie pas de signal : les compteurs, les agrégats
+    des notes et les flux matérialisés sont calculés à la fin par
+    ``recount_reviews``, ``recount_users`` et ``rebuild_feeds`` (par
+    ``INSERT … SELECT``, sans charger les entrées en Python) ; l'index de
+    recherche est tenu à jour par la base.
+    """
+
+    help = "Generate a large, deterministic dataset for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, default=1000,
+            help="Number of users (default: 1000).",
+        )
+        parser.add_argument(
+            "--follows-per-user", type=float, default=20,
+            help="Mean number of users followed by each user (default: 20).",
+        )
+        parser.add_argument(
+            "--tickets-per-user", type=float, default=3,
+            help="Mean number of tickets per user (default: 3).",
+        )
+        parser.add_argument(
+            "--reviews", type=int, default=10000,
+            help="Total number of reviews (default: 10000).",
+        )
+        parser.add_argument(
+            "--covers", type=int, default=0,
+            help="Number of tickets given a placeholder cover image "
+                 "(default: 0).",
+        )
+        parser.add_argument(
+            "--skew", type=float, default=1.0,
+            help="Exponent of the Zipf laws of popularity (default: 1.0).",
+        )
+        parser.add_argument(
+            "--days", type=int, default=365,
+            help="Time span of the generated posts, in days (default: 365).",
+        )
+        parser.add_argument(
+            "--prefix", default="seed",
+            help="Prefix of the generated usernames (default: seed).",
+        )
+        parser.add_argument(
+            "--password", default="litrevu-seed",
+            help="Password of every generated user (default: litrevu-seed).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=10000,
+            help="Number of rows written per transaction (default: 10000).",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="Number of processes drawing the covers "
+                 "(default: CPU count).",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.batch_size = options["batch_size"]
+        self.rng = random.Random(options["seed"])
+        self.start = time.perf_counter()
+
+        with _explicit_timestamps(Ticket, Review):
+            user_ids = self.seed_users()
+            self.seed_follows(user_ids)
+            ticket_ids, ticket_times = self.seed_tickets(user_ids)
+            self.seed_reviews(user_ids, ticket_ids, ticket_times)
+        if options["covers"]:
+            self.seed_covers(ticket_ids)
+
+        # Données dérivées, écrites par les signaux hors bulk_create
+        for command in ("recount_reviews", "recount_users", "rebuild_feeds"):
+            call_command(command, stdout=io.StringIO())
+            self.progress(f"{command} done")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Dataset generated in {time.perf_counter() - self.start:.1f}s."))
+
+    def progress(self, message):
+        elapsed = time.perf_counter() - self.start
+        self.stdout.write(f"[{elapsed:7.1f}s] {message}")
+
+    def write(self, model, rows):
+        """Écrit les objets de ``rows`` (itérable) par lots, un lot par
+        transaction.
+
+        Returns:
+            list: Les identifiants créés, dans l'ordre de ``rows``.
+        """
+
+        ids = array("q")
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                ids.extend(self.write_batch(model, batch))
+                batch = []
+        if batch:
+            ids.extend(self.write_batch(model, batch))
+        return ids
+
+    def write_batch(self, model, batch):
+        with transaction.atomic():
+            # Les identifiants sont retournés par l'INSERT (RETURNING, sous
+            # SQLite 3.35+ et PostgreSQL)
+            return [obj.pk for obj in model.objects.bulk_create(batch)]
+
+    def random_time(self, after=None):
+        """Date au hasard sur ``--days`` jours avant ``REFERENCE_DATE``
+        (après ``after``, un horodatage, si donné)."""
+
+        end = REFERENCE_DATE.timestamp()
+        start = after or end - self.options["days"] * 86400
+        return start + self.rng.random() * (end - start)
+
+    def seed_users(self):
+        # Un seul hachage pour tous les utilisateurs
+        password = make_password(self.options["password"])
+        prefix = self.options["prefix"]
+        user_ids = self.write(User, (
+            User(username=f"{prefix}_{index}", password=password)
+            for index in range(self.options["users"])
+        ))
+        self.progress(f"{len(user_ids)} users")
+        return user_ids
+
+    def seed_follows(self, user_ids):
+        """Chaque utilisateur suit en moyenne ``--follows-per-user``
+        utilisateurs, tirés selon leur popularité."""
+
+        rng = self.rng
+        by_popularity = list(user_ids)
+        rng.shuffle(by_popularity)
+        weights = _zipf_weights(len(by_popularity), self.options["skew"])
+        mean = self.options["follows_per_user"]
+
+        def follows():
+            for user_id in user_ids:
+                wanted = min(len(user_ids) - 1,
+                             round(rng.expovariate(1 / mean)) if mean else 0)
+                followed = set()
+                # Les tirages déjà obtenus sont refaits : quelques essais
+                # suffisent, sauf pour un utilisateur qui suit presque tous
+                # les autres
+                for _ in range(4):
+                    if len(followed) >= wanted:
+                        break
+                    followed.update(rng.choices(
+                        by_popularity, cum_weights=weights,
+                        k=wanted - len(followed)))
+                    followed.discard(user_id)
+                for followed_id in sorted(followed)[:wanted]:
+                    yield UserFollows(
+                        user_id=user_id, followed_user_id=followed_id)
+
+        total = len(self.write(UserFollows, follows()))
+        self.progress(f"{total} follows")
+
+    def seed_tickets(self, user_ids):
+        rng = self.rng
+        mean = self.options["tickets_per_user"]
+        times = array("d")
+
+        def tickets():
+            for user_id in user_ids:
+                count = round(rng.expovariate(1 / mean)) if mean else 0
+                for _ in range(count):
+                    created = self.random_time()
+                    times.append(created)
+                    yield Ticket(
+                        title=_sentence(rng, rng.randint(2, 5)),
+                        description=_sentence(rng, rng.randint(10, 60)),
+                        user_id=user_id,
+                        time_created=datetime.fromtimestamp(
+                            created, timezone.utc),
+                    )
+
+        ticket_ids = self.write(Ticket, tickets())
+        self.progress(f"{len(ticket_ids)} tickets")
+        return ticket_ids, times
+
+    def seed_reviews(self, user_ids, ticket_ids, ticket_times):
+        """Les billets critiqués sont tirés selon leur popularité ; chaque
+        critique est postérieure à son billet."""
+
+        if not ticket_ids:
+            return
+        rng = self.rng
+        by_popularity = list(range(len(ticket_ids)))
+        rng.shuffle(by_popularity)
+        weights = _zipf_weights(len(by_popularity), self.options["skew"])
+
+        def reviews():
+            remaining = self.options["reviews"]
+            while remaining:
+                size = min(remaining, self.batch_size)
+                remaining -= size
+                picks = rng.choices(by_popularity, cum_weights=weights, k=size)
+                ratings = rng.choices(range(6), weights=RATING_WEIGHTS, k=size)
+                for index, rating in zip(picks, ratings):
+                    created = self.random_time(after=ticket_times[index])
+                    yield Review(
+                        ticket_id=ticket_ids[index],
+                        rating=rating,
+                        headline=_sentence(rng, rng.randint(2, 6)),
+                        body=_sentence(rng, rng.randint(20, 120)),
+                        user_id=rng.choice(user_ids),
+                        time_created=datetime.fromtimestamp(
+                            created, timezone.utc),
+                    )
+
+        total = len(self.write(Review, reviews()))
+        self.progress(f"{total} reviews")
+
+    def seed_covers(self, ticket_ids):
+        """Dessine ``--covers`` couvertures en parallèle, les enregistre
+        (``review.storage``) et les associe à des billets tirés au hasard ;
+        les déclinaisons sont produites par ``reprocess_images``."""
+
+        covers = min(self.options["covers"], len(ticket_ids))
+        chosen = sorted(self.rng.sample(range(len(ticket_ids)), covers))
+        seeds = [self.rng.getrandbits(32) for _ in chosen]
+        titles = dict(
+            Ticket.objects.filter(
+                pk__in=[ticket_ids[index] for index in chosen])
+            .values_list("pk", "title"))
+        storage = Ticket.image.field.storage
+
+        with ProcessPoolExecutor(max_workers=self.options["workers"]) as pool:
+            tickets = []
+            images = pool.map(
+                _cover, seeds,
+                [titles[ticket_ids[index]] for index in chosen],
+                chunksize=16,
+            )
+            for index, data in zip(chosen, images):
+                ticket_id = ticket_ids[index]
+                with transaction.atomic():
+                    name = storage.save(
+                        f"images/cover_{ticket_id}.jpg", ContentFile(data))
+                tickets.append(Ticket(
+                    pk=ticket_id, image=name,
+                    image_state=Ticket.ImageState.PENDING))
+                if len(tickets) == self.batch_size:
+                    self.save_covers(tickets)
+                    tickets = []
+            self.save_covers(tickets)
+        self.progress(f"{covers} covers")
+
+        call_command("reprocess_images", workers=self.options["workers"],
+                     stdout=io.StringIO())
+        self.progress("cover renditions done")
+
+    @staticmethod
+    def save_covers(tickets):
+        with transaction.atomic():
+            Ticket.objects.bulk_update(tickets, ["image", "image_state"])
@@ -0,0 +1,26 @@
+from django.conf import settings
+
+from .routers import STICKY_COOKIE
+
+
+class PrimaryStickinessMiddleware:
+    """Pose le cookie ``STICKY_COOKIE`` après toute requête qui peut écrire
+    (autre que GET, HEAD, OPTIONS, TRACE) : les pages lues pendant
+    ``REPLICA_STICKY_SECONDS`` secondes le sont sur la base principale (voir
+    ``utilities.routers``)."""
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (settings.DATABASE_REPLICAS
+                and request.method not in self.SAFE_METHODS):
+            response.set_cookie(
+                STICKY_COOKIE, "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite="Lax",
+            )
+        return response
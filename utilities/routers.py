@@ -0,0 +1,111 @@
+"""Répartition des requêtes entre la base principale et ses réplicas.
+
+Les écritures vont toujours à la base principale (``default``). Les
+lectures n'y vont aussi, sauf pendant les vues décorées par
+``replica_reads`` (pages flux, publications et abonnements, en GET) : elles
+sont alors envoyées à l'un des réplicas de ``DATABASE_REPLICAS``.
+
+Un utilisateur qui vient d'écrire (requête POST, etc.) reçoit un cookie
+de courte durée (voir ``utilities.middleware``) : tant qu'il est présent,
+ses lectures vont à la base principale et il voit ses propres écritures,
+même si les réplicas sont en retard. Les données gardées hors de la base
+suivent la même règle :
+
+* les pages du flux mises en cache (``review.feed_cache``) sont calculées
+  sur un réplica, mais n'y restent pas plus que ``REPLICA_STICKY_SECONDS``
+  (une page en retard n'est pas servie plus longtemps que le délai de
+  réplication) ; pendant la durée du cookie, elles sont calculées sur la
+  base principale et gardées ``FEED_CACHE_TIMEOUT`` ;
+* l'index en mémoire des abonnements (``authentification.graph``) est
+  chargé depuis la base principale, mais n'est qu'à jour de ce processus :
+  pendant la durée du cookie (``reads_own_writes``), les abonnements de
+  l'utilisateur sont lus dans la base.
+"""
+
+import contextlib
+import contextvars
+import functools
+import random
+
+from django.conf import settings
+
+# Cookie posé après une écriture, durée : REPLICA_STICKY_SECONDS
+STICKY_COOKIE = "litrevu_primary"
+
+PRIMARY = "default"
+
+_read_from_replica = contextvars.ContextVar(
+    "read_from_replica", default=False)
+_recent_write = contextvars.ContextVar("recent_write", default=False)
+
+
+def replica_reads(view):
+    """Décorateur de vue : les lectures d'une requête GET (ou HEAD) sans
+    cookie ``STICKY_COOKIE`` sont envoyées aux réplicas."""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        sticky = STICKY_COOKIE in request.COOKIES
+        use_replica = request.method in ("GET", "HEAD") and not sticky
+        token = _read_from_replica.set(use_replica)
+        recent_token = _recent_write.set(sticky)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _recent_write.reset(recent_token)
+            _read_from_replica.reset(token)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Envoie les lectures du bloc à la base principale, y compris dans une
+    vue ``replica_reads``."""
+
+    token = _read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def reads_from_replica():
+    """Indique si les lectures de la requête en cours vont à un réplica."""
+
+    return bool(settings.DATABASE_REPLICAS) and _read_from_replica.get()
+
+
+def reads_own_writes():
+    """Indique si la requête en cours vient d'un utilisateur qui a écrit
+    il y a moins de ``REPLICA_STICKY_SECONDS`` secondes (cookie
+    ``STICKY_COOKIE``, vues ``replica_reads``)."""
+
+    return _recent_write.get()
+
+
+class PrimaryReplicaRouter:
+    """Routeur de base de données : écritures et migrations sur la base
+    principale, lectures des vues ``replica_reads`` sur un réplica."""
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if replicas and _read_from_replica.get():
+            return random.choice(replicas)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Les réplicas contiennent les mêmes lignes que la base principale
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Les réplicas reçoivent le schéma par la réplication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
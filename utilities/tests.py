@@ -1,3 +1,206 @@
-from django.test import TestCase
+import io
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, router
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from litrevu.database import (
+    TUNED_SQLITE_PRAGMAS, database_config, replica_configs, sqlite_pragmas)
+from authentification.graph import follow_graph
+from authentification.models import User, UserFollows
+from review import feed_cache, feeds
+from review.models import FeedEntry, Review, Ticket
+
+from .middleware import PrimaryStickinessMiddleware
+from .routers import STICKY_COOKIE, replica_reads
+
+
+class DatabaseConfigTests(TestCase):
+    """Vérifie la configuration de la base par l'environnement et les
+    réglages appliqués aux connexions SQLite."""
+
+    def test_config_from_environment(self):
+        config = database_config({}, Path("/srv"))
+        self.assertEqual(config["ENGINE"], "django.db.backends.sqlite3")
+        self.assertEqual(config["NAME"], Path("/srv/db.sqlite3"))
+
+        config = database_config({
+            "LITREVU_DB_ENGINE": "postgresql",
+            "LITREVU_DB_NAME": "reviews",
+            "LITREVU_DB_CONN_MAX_AGE": "60",
+        }, Path("/srv"))
+        self.assertEqual(config["NAME"], "reviews")
+        self.assertEqual(config["CONN_MAX_AGE"], 60)
+        self.assertTrue(config["CONN_HEALTH_CHECKS"])
+        self.assertFalse(config["DISABLE_SERVER_SIDE_CURSORS"])
+
+        with self.assertRaises(ValueError):
+            database_config({"LITREVU_DB_ENGINE": "oracle"}, Path("/srv"))
+
+        self.assertEqual(sqlite_pragmas({}), TUNED_SQLITE_PRAGMAS)
+        self.assertEqual(sqlite_pragmas({"LITREVU_SQLITE_TUNING": "0"}), {})
+
+    def test_pragmas_applied_to_connections(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"])
+class PrimaryReplicaRouterTests(TestCase):
+    """Vérifie le choix de la base des lectures et le cookie posé après une
+    écriture."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        @replica_reads
+        def view(request):
+            return HttpResponse(router.db_for_read(Ticket))
+
+        self.view = PrimaryStickinessMiddleware(view)
+
+    def read_from(self, request):
+        return self.view(request).content.decode()
+
+    def test_reads_go_to_replica_unless_sticky(self):
+        self.assertEqual(self.read_from(self.factory.get("/")), "replica_1")
+        self.assertEqual(router.db_for_read(Ticket), "default")
+        self.assertEqual(router.db_for_write(Ticket), "default")
+
+        response = self.view(self.factory.post("/"))
+        self.assertEqual(response.content.decode(), "default")
+        self.assertEqual(response.cookies[STICKY_COOKIE]["max-age"], 10)
+
+        request = self.factory.get("/")
+        request.COOKIES[STICKY_COOKIE] = "1"
+        self.assertEqual(self.read_from(request), "default")
+
+        self.assertFalse(router.allow_migrate("replica_1", "review"))
+
+    def test_feed_cache_misses_are_read_on_replica_unless_sticky(self):
+        cache.clear()
+        user = User.objects.create(username="reader")
+        misses = []
+
+        def get_feed_page(user, *args, **kwargs):
+            # Base des requêtes de la page (entrées du flux et publications)
+            misses.append((FeedEntry.objects.filter(owner=user).db,
+                           Review.objects.all().db))
+            return feeds.FeedPage([], None, None)
+
+        @replica_reads
+        def view(request):
+            feed_cache.get_feed_page(user)
+            feed_cache.get_feed_page(user)
+            return HttpResponse()
+
+        sticky = self.factory.get("/")
+        sticky.COOKIES[STICKY_COOKIE] = "1"
+        with mock.patch("review.feeds.get_feed_page", get_feed_page), \
+                mock.patch.object(
+                    feed_cache.cache, "set", wraps=cache.set) as cache_set:
+            self.factory_view(view)
+            self.factory_view(view, sticky)
+
+        # Une page par base : la page du réplica n'est pas servie aux
+        # requêtes qui doivent voir les écritures de l'utilisateur
+        self.assertEqual(misses, [("replica_1", "replica_1"),
+                                  ("default", "default")])
+        self.assertEqual(
+            [call.kwargs["timeout"] for call in cache_set.call_args_list
+             if call.args[0].startswith("feed:page:")],
+            [10, 300])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_sticky_requests_read_own_follows_from_database(self):
+        reader = User.objects.create(username="reader")
+        author = User.objects.create(username="author")
+        follow_graph.load()
+        # Abonnement enregistré par un autre processus : l'index en mémoire
+        # de celui-ci ne le voit pas avant son prochain rechargement
+        UserFollows.objects.create(user=reader, followed_user=author)
+
+        @replica_reads
+        def view(request):
+            return HttpResponse(",".join(
+                str(list(ids)) for ids in (
+                    follow_graph.following(reader.pk),
+                    feeds.pull_authors(reader),
+                )))
+
+        sticky = self.factory.get("/")
+        sticky.COOKIES[STICKY_COOKIE] = "1"
+        self.assertEqual(
+            self.factory_view(view, sticky),
+            f"[{author.pk}],[{author.pk}]")
+        self.assertEqual(self.factory_view(view), "[],[]")
+        follow_graph.reset()
+
+    def factory_view(self, view, request=None):
+        request = request or self.factory.get("/")
+        return view(request).content.decode()
+
+    def test_replica_config(self):
+        primary = database_config({}, Path("/srv"))
+        replicas = replica_configs(
+            {"LITREVU_DB_REPLICAS": "/srv/r1.sqlite3, /srv/r2.sqlite3"},
+            primary)
+        self.assertEqual(list(replicas), ["replica_1", "replica_2"])
+        self.assertEqual(replicas["replica_2"]["NAME"], "/srv/r2.sqlite3")
+        self.assertEqual(replicas["replica_1"]["TEST"], {"MIRROR": "default"})
+
+
+class ExplainQueriesTests(TestCase):
+    """Vérifie que les requêtes du flux passent par des index."""
+
+    def test_feed_queries_use_indexes(self):
+        User.objects.create(username="explained")
+        output = io.StringIO()
+        call_command("explain_queries", stdout=output)
+
+        output = output.getvalue()
+        for label in ("feed: page", "feed: next page", "feed: page reviews",
+                      "feed: page tickets",
+                      "feed: pull authors (after a write)"):
+            self.assertIn(f"{label}\n", output)
+        self.assertIn("No full table scan.", output)
+
+
+class SeedTests(TestCase):
+    """Vérifie que le jeu de données généré est reproductible et que ses
+    données dérivées (compteurs, flux) sont calculées."""
+
+    def seed(self, prefix):
+        call_command(
+            "seed_litrevu", users=30, reviews=120, prefix=prefix, seed=7,
+            batch_size=50, stdout=io.StringIO(),
+        )
+        return list(
+            Review.objects.filter(user__username__startswith=f"{prefix}_")
+            .order_by("pk")
+            .values_list("headline", "rating", "time_created")
+        )
+
+    def test_same_seed_same_data(self):
+        first = self.seed("first")
+        self.assertEqual(len(first), 120)
+        self.assertEqual(self.seed("second"), first)
+
+    def test_derived_data(self):
+        self.seed("derived")
+        for ticket in Ticket.objects.annotate(reviews_total=Count("reviews")):
+            self.assertEqual(ticket.review_count, ticket.reviews_total)
+        for user in User.objects.annotate(followers=Count("followed_by")):
+            self.assertEqual(user.follower_count, user.followers)
+        self.assertTrue(FeedEntry.objects.exists())